@@ -0,0 +1,319 @@
+"""
+Нагрузочный тест бота целиком, без Telegram и без сети.
+
+Поднимает заглушку Bot API (benchmarks.stub_bot_api) и сервер
+тестовых источников (benchmarks.fixture_server), запускает
+VideoDownloaderBot против них и кладет в getUpdates синтетические
+сообщения со ссылками TikTok, Instagram и YouTube. Ссылки платформ
+перенаправляются на тестовые источники: TikTok — файл mp4 (загрузка
+в память), Instagram — ответ API со ссылкой (Telegram скачивает сам),
+YouTube — HLS (загрузка фрагментов на диск). Популярность видео
+распределена по Ципфу, поэтому часть ссылок попадает в кэш file_id.
+
+Задержка сообщения — от появления обновления в getUpdates до ответа
+бота со всеми видео сообщения. Пиковая память — ru_maxrss процесса,
+в котором вместе с ботом работают заглушки.
+
+Запуск из корня проекта:
+    python -m benchmarks.bot_load --messages 500 --chats 100
+    python -m benchmarks.bot_load --save-baseline   # записать benchmarks/baseline.json
+
+Если сохраненный базовый результат получен с теми же параметрами,
+результат сравнивается с ним, и при регрессии больше --tolerance
+скрипт завершается с кодом 1.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import resource
+import shutil
+import signal
+import statistics
+import sys
+import tempfile
+import time
+from benchmarks.fixture_server import FixtureServer
+from benchmarks.stub_bot_api import RecordedCall, StubBotApi
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+PLATFORMS = ('tiktok', 'instagram', 'youtube')
+RESULTS = ('cache_hit', 'sent', 'shared', 'failed', 'known_failure')
+
+
+def configure_environment(data_path: str) -> None:
+    """
+    Настройки бота читаются при импорте config.settings, поэтому
+    окружение задается до импорта бота
+    """
+    os.environ['DATA_PATH'] = data_path
+    os.environ['METRICS_PORT'] = '0'
+    os.environ['UPDATE_MODE'] = 'polling'
+    os.environ['DOWNLOAD_MODE'] = 'local'
+    os.environ.pop('BOT_API_LOCAL_MODE', None)
+    os.environ.setdefault('BOT_TOKEN', '123456:benchmark')
+    os.environ.setdefault('AUTH_CHAT_ID', '1')
+    os.environ.setdefault('COOKIES', '')
+    os.environ.setdefault('USER_AGENT', 'benchmark')
+    os.environ.setdefault('X_IG_APP_ID', '0')
+
+
+def video_link(platform: str, index: int) -> str:
+    if platform == 'tiktok':
+        return f'https://www.tiktok.com/@load/video/{7000000000000000000 + index}'
+    if platform == 'instagram':
+        return f'https://www.instagram.com/reel/Load{index:07d}/'
+    return f'https://youtube.com/shorts/load{index:07d}'
+
+
+def build_workload(args) -> list:
+    """Сообщения: (chat_id, [ссылки]); видео выбираются по закону Ципфа"""
+    rng = random.Random(args.seed)
+    videos = [video_link(PLATFORMS[i % len(PLATFORMS)], i) for i in range(args.videos)]
+    weights = [1 / (rank + 1) ** args.zipf for rank in range(args.videos)]
+    chats = [-1000000000000 - i for i in range(args.chats)]
+
+    messages = []
+    for _ in range(args.messages):
+        links = set()
+        while len(links) < min(args.links, args.videos):
+            links.add(rng.choices(videos, weights)[0])
+        messages.append((rng.choice(chats), sorted(links)))
+    return messages
+
+
+def synthetic_update(update_id: int, chat_id: int, links: list) -> dict:
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'supergroup', 'title': 'load'},
+            'from': {'id': update_id % 1000 + 1, 'is_bot': False, 'first_name': 'load'},
+            'text': ' '.join(links),
+        },
+    }
+
+
+def route_sources(bot, fixtures: FixtureServer) -> None:
+    """Перенаправляет запросы бота к платформам на тестовые источники"""
+    backends = bot.dispatcher.backends
+    downloader = backends['tiktok'].downloader
+    extract_info = downloader.extract_info
+
+    async def routed_extract_info(url: str, platform: str = 'default') -> dict:
+        backend = backends.get(platform)
+        video_id = (backend.get_video_id(url) if backend else None) or 'unknown'
+        return await extract_info(fixtures.source_url(platform, video_id), platform)
+
+    downloader.extract_info = routed_extract_info
+
+    get_json = bot.http_client.get_json
+
+    async def routed_get_json(url: str, **kwargs) -> dict:
+        return await get_json(url.replace('https://www.instagram.com', f'{fixtures.base_url}/instagram', 1), **kwargs)
+
+    bot.http_client.get_json = routed_get_json
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[int(q) - 1]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss: килобайты в Linux, байты в macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+async def run(args) -> dict:
+    from core.bot import VideoDownloaderBot
+    from services.metrics import LINKS
+
+    messages = build_workload(args)
+    # Сообщение (chat_id, message_id) -> [время появления, сколько видео осталось]
+    pending = {}
+    latencies = []
+    done = asyncio.Event()
+
+    def on_send(call: RecordedCall) -> None:
+        entry = pending.get((call.chat_id, call.reply_to))
+        if entry is None:
+            return
+        entry[1] -= call.items
+        if entry[1] <= 0:
+            latencies.append(call.at - entry[0])
+            del pending[(call.chat_id, call.reply_to)]
+            if not pending:
+                done.set()
+
+    stub = StubBotApi(latency=args.api_latency, on_send=on_send)
+    fixtures = FixtureServer(video_size=args.video_size, segments=args.segments, latency=args.source_latency)
+    await stub.start()
+    await fixtures.start()
+    rss_before = peak_rss_mb()
+
+    bot = VideoDownloaderBot(base_url=stub.base_url)
+    route_sources(bot, fixtures)
+    bot.dispatcher.chat_manager.allowed_chats.update(chat_id for chat_id, _ in messages)
+
+    serving = asyncio.create_task(bot._serve())
+    while not stub.methods['getUpdates']:
+        if serving.done():
+            serving.result()
+        await asyncio.sleep(0.01)
+
+    started = time.perf_counter()
+    for update_id, (chat_id, links) in enumerate(messages, 1):
+        pending[(chat_id, update_id)] = [time.perf_counter(), len(links)]
+        stub.push_update(synthetic_update(update_id, chat_id, links))
+        if args.rate:
+            await asyncio.sleep(1 / args.rate)
+
+    try:
+        await asyncio.wait_for(done.wait(), args.timeout)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - started
+
+    # Бот останавливается так же, как по Ctrl+C
+    os.kill(os.getpid(), signal.SIGTERM)
+    await serving
+    await stub.stop()
+    await fixtures.stop()
+
+    links = {
+        result: sum(LINKS.value(platform=platform, result=result) for platform in PLATFORMS)
+        for result in RESULTS
+    }
+    total_links = sum(links.values()) or 1
+    latencies.sort()
+    return {
+        'messages': len(messages),
+        'delivered': len(latencies),
+        'elapsed': round(elapsed, 3),
+        'messages_per_sec': round(len(latencies) / elapsed, 2),
+        'latency_p50': round(percentile(latencies, 50), 4),
+        'latency_p95': round(percentile(latencies, 95), 4),
+        'latency_p99': round(percentile(latencies, 99), 4),
+        'cache_hit_rate': round(links['cache_hit'] / total_links, 4),
+        'shared_rate': round(links['shared'] / total_links, 4),
+        'failed': links['failed'] + links['known_failure'],
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'rss_before_bot_mb': round(rss_before, 1),
+        'bot_api_calls': dict(stub.methods),
+        'uploaded_mb': round(stub.bytes_uploaded / 1024 ** 2, 1),
+        'fetched_by_url_mb': round(stub.bytes_fetched / 1024 ** 2, 1),
+        'source_requests': fixtures.requests,
+    }
+
+
+def params_of(args) -> dict:
+    return {
+        name: getattr(args, name)
+        for name in ('messages', 'chats', 'videos', 'links', 'zipf', 'seed', 'rate',
+                     'api_latency', 'source_latency', 'video_size', 'segments')
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Возвращает описания регрессий относительно базового результата"""
+    regressions = []
+    if results['messages_per_sec'] < baseline['messages_per_sec'] * (1 - tolerance):
+        regressions.append('пропускная способность')
+    for name in ('latency_p50', 'latency_p95', 'latency_p99', 'peak_rss_mb'):
+        if results[name] > baseline[name] * (1 + tolerance):
+            regressions.append(name)
+    if results['cache_hit_rate'] < baseline['cache_hit_rate'] - 0.05:
+        regressions.append('cache_hit_rate')
+    if results['delivered'] < baseline['delivered']:
+        regressions.append('delivered')
+    return regressions
+
+
+def report(results: dict, baseline: dict | None) -> None:
+    def line(name: str, title: str, unit: str = ''):
+        value = results[name]
+        text = f'{title}: {value}{unit}'
+        if baseline and isinstance(baseline.get(name), (int, float)) and baseline[name]:
+            text += f' (база {baseline[name]}{unit}, {(value / baseline[name] - 1) * 100:+.1f}%)'
+        print(text)
+
+    print(f"Доставлено сообщений: {results['delivered']} из {results['messages']} за {results['elapsed']} с")
+    line('messages_per_sec', 'Сообщений в секунду')
+    line('latency_p50', 'Задержка p50', ' с')
+    line('latency_p95', 'Задержка p95', ' с')
+    line('latency_p99', 'Задержка p99', ' с')
+    line('cache_hit_rate', 'Доля попаданий в кэш')
+    line('shared_rate', 'Доля общих загрузок')
+    line('failed', 'Ошибок')
+    line('peak_rss_mb', 'Пиковая память', ' MB')
+    print(f"Память до запуска бота: {results['rss_before_bot_mb']} MB")
+    print(f"Вызовы Bot API: {results['bot_api_calls']}")
+    print(f"Загружено в Telegram: {results['uploaded_mb']} MB, скачано Telegram по ссылкам: "
+          f"{results['fetched_by_url_mb']} MB, запросов к источникам: {results['source_requests']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=300)
+    parser.add_argument('--chats', type=int, default=60)
+    parser.add_argument('--videos', type=int, default=90, help='различных видео')
+    parser.add_argument('--links', type=int, default=1, help='ссылок в сообщении')
+    parser.add_argument('--zipf', type=float, default=1.0, help='показатель распределения популярности видео')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--rate', type=float, default=0, help='сообщений в секунду (0 — все сразу)')
+    parser.add_argument('--api-latency', type=float, default=0.05, help='задержка Bot API, с')
+    parser.add_argument('--source-latency', type=float, default=0.02, help='задержка источников, с')
+    parser.add_argument('--video-size', type=int, default=1024 * 1024, help='размер видео, байт')
+    parser.add_argument('--segments', type=int, default=8, help='фрагментов HLS')
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='сохранить результат как базовый')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='допустимое ухудшение относительно базы')
+    parser.add_argument('--verbose', action='store_true', help='показывать логи бота')
+    args = parser.parse_args()
+
+    data_path = tempfile.mkdtemp(prefix='bot_load_')
+    configure_environment(data_path)
+    try:
+        with contextlib.ExitStack() as stack:
+            if not args.verbose:
+                devnull = stack.enter_context(open(os.devnull, 'w'))
+                stack.enter_context(contextlib.redirect_stdout(devnull))
+                stack.enter_context(contextlib.redirect_stderr(devnull))
+            results = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(data_path, ignore_errors=True)
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            saved = json.load(file)
+        if saved.get('params') == params_of(args):
+            baseline = saved['results']
+        else:
+            print('Базовый результат получен с другими параметрами, сравнение пропущено')
+
+    report(results, baseline)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump({'params': params_of(args), 'results': results}, file, ensure_ascii=False, indent=2)
+            file.write('\n')
+        print(f'Базовый результат сохранен: {args.baseline}')
+    elif baseline:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"Регрессия относительно базы: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
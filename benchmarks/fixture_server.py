@@ -0,0 +1,170 @@
+"""
+Локальный сервер тестовых источников видео для нагрузочных тестов.
+
+Отдает:
+    /video/<id>.mp4               — файл mp4 (один и тот же для всех id)
+    /hls/<id>/playlist.m3u8       — HLS-плейлист из нескольких фрагментов
+    /hls/<id>/seg<N>.ts           — фрагменты HLS
+    /thumb/<id>.jpg               — превью
+    /instagram/p/<id>?__a=1       — ответ API Instagram со ссылкой на /video/<id>.mp4
+
+Байты видео разных id различаются (иначе бот отправлял бы их по file_id
+как дубликаты). Каждый ответ задерживается на latency секунд, имитируя
+задержку CDN.
+
+Запуск отдельно от бота (например, для ручной проверки):
+    python -m benchmarks.fixture_server --port 8090
+"""
+import argparse
+import asyncio
+import os
+from aiohttp import web
+
+# Начало mp4: ftyp-бокс, чтобы файл определялся как видео
+MP4_HEADER = b'\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom'
+# Минимальный JPEG (SOI ... EOI)
+JPEG_STUB = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00\xff\xd9'
+
+
+class FixtureServer:
+    """Сервер источников видео; base_url доступен после start()"""
+
+    def __init__(
+        self,
+        video_size: int = 2 * 1024 * 1024,
+        segments: int = 10,
+        latency: float = 0.0,
+        listen: str = '127.0.0.1',
+        port: int = 0
+    ):
+        self.video = MP4_HEADER + os.urandom(max(0, video_size - len(MP4_HEADER)))
+        self.segments = segments
+        self.segment = os.urandom(max(1, video_size // max(1, segments)))
+        self.latency = latency
+        self.listen = listen
+        self.port = port
+        self.requests = 0
+        self.bytes_sent = 0
+        self._runner: web.AppRunner | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.listen}:{self.bound_port}'
+
+    @property
+    def bound_port(self) -> int:
+        if self._runner is None or not self._runner.addresses:
+            return self.port
+        return self._runner.addresses[0][1]
+
+    def source_url(self, platform: str, video_id: str) -> str:
+        """Адрес источника видео платформы: YouTube отдается как HLS, остальные — файлом mp4"""
+        if platform == 'youtube':
+            return f'{self.base_url}/hls/{video_id}/playlist.m3u8'
+        return f'{self.base_url}/video/{video_id}.mp4'
+
+    @staticmethod
+    def _tagged(body: bytes, video_id: str, offset: int = 0) -> tuple:
+        """
+        Тело ответа с id видео внутри: размер тот же, содержимое уникально.
+        Части отдаются без копирования общего тела.
+        """
+        tag = f'{video_id}\n'.encode()
+        view = memoryview(body)
+        return view[:offset], tag, view[offset + len(tag):]
+
+    async def _respond(self, request: web.Request, content_type: str, *parts) -> web.StreamResponse:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.requests += 1
+        response = web.StreamResponse(headers={'Content-Type': content_type})
+        response.content_length = sum(len(part) for part in parts)
+        await response.prepare(request)
+        if request.method != 'HEAD':
+            self.bytes_sent += response.content_length
+            for part in parts:
+                await response.write(part)
+        await response.write_eof()
+        return response
+
+    async def video_file(self, request: web.Request) -> web.StreamResponse:
+        parts = self._tagged(self.video, request.match_info['video_id'], len(MP4_HEADER))
+        return await self._respond(request, 'video/mp4', *parts)
+
+    async def playlist(self, request: web.Request) -> web.StreamResponse:
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:2', '#EXT-X-MEDIA-SEQUENCE:0']
+        for i in range(self.segments):
+            lines += ['#EXTINF:2.0,', f'seg{i}.ts']
+        lines.append('#EXT-X-ENDLIST')
+        return await self._respond(request, 'application/vnd.apple.mpegurl', ('\n'.join(lines) + '\n').encode())
+
+    async def segment_file(self, request: web.Request) -> web.StreamResponse:
+        parts = self._tagged(self.segment, request.match_info['video_id'])
+        return await self._respond(request, 'video/mp2t', *parts)
+
+    async def thumbnail(self, request: web.Request) -> web.StreamResponse:
+        return await self._respond(request, 'image/jpeg', JPEG_STUB)
+
+    async def instagram_api(self, request: web.Request) -> web.Response:
+        video_id = request.match_info['video_id']
+        if request.query.get('__a') != '1':
+            return await self._respond(request, 'text/html', b'<html></html>')
+        item = {
+            'video_versions': [{
+                'url': f'{self.base_url}/video/{video_id}.mp4',
+                'width': 720,
+                'height': 1280,
+            }],
+            'video_duration': 15.0,
+            'image_versions2': {'candidates': [{'url': f'{self.base_url}/thumb/{video_id}.jpg', 'width': 360}]},
+        }
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self.requests += 1
+        return web.json_response({'items': [item]})
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/video/{video_id}.mp4', self.video_file)
+        app.router.add_get('/hls/{video_id}/playlist.m3u8', self.playlist)
+        app.router.add_get('/hls/{video_id}/seg{n}.ts', self.segment_file)
+        app.router.add_get('/thumb/{video_id}.jpg', self.thumbnail)
+        app.router.add_get('/instagram/p/{video_id}', self.instagram_api)
+        return app
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def serve(args) -> None:
+    server = FixtureServer(args.video_size, args.segments, args.latency, args.listen, args.port)
+    await server.start()
+    print(f'Источники видео: {server.base_url}')
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--listen', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--video-size', type=int, default=2 * 1024 * 1024, help='размер видео, байт')
+    parser.add_argument('--segments', type=int, default=10, help='фрагментов в HLS-плейлисте')
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа, с')
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Время загрузки HLS-видео в зависимости от числа одновременно
+загружаемых фрагментов.
+
+Локальный сервер отдает плейлист из SEGMENTS фрагментов; каждый ответ
+задерживается на LATENCY секунд, имитируя задержку CDN. Для каждого
+значения concurrent_fragment_downloads видео скачивается через yt-dlp
+с опциями из profile_options, как это делает бот.
+
+Запуск из корня проекта:
+    python -m benchmarks.fragment_concurrency --segments 40 --latency 0.1
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import yt_dlp
+from benchmarks.bot_load import configure_environment
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Отдает playlist.m3u8 и фрагменты seg<N>.ts со случайными байтами"""
+
+    segments = 0
+    segment_data = b''
+    latency = 0.0
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if self.path == '/playlist.m3u8':
+            lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:2', '#EXT-X-MEDIA-SEQUENCE:0']
+            for i in range(self.segments):
+                lines += ['#EXTINF:2.0,', f'seg{i}.ts']
+            lines.append('#EXT-X-ENDLIST')
+            self._send(('\n'.join(lines) + '\n').encode(), 'application/vnd.apple.mpegurl')
+        elif self.path.startswith('/seg') and self.path.endswith('.ts'):
+            self._send(self.segment_data, 'video/mp2t')
+        else:
+            self.send_error(404)
+
+    def _send(self, body: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(segments: int, segment_size: int, latency: float) -> ThreadingHTTPServer:
+    FixtureHandler.segments = segments
+    FixtureHandler.segment_data = os.urandom(segment_size)
+    FixtureHandler.latency = latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def time_to_file(url: str, concurrency: int, output_dir: str, external_downloader: str) -> float:
+    from services.downloader import profile_options
+
+    profile = {
+        'concurrent_fragment_downloads': concurrency,
+        'external_downloader': external_downloader,
+    }
+    opts = {
+        **profile_options(profile),
+        'outtmpl': os.path.join(output_dir, f'video_{concurrency}_{time.monotonic_ns()}.%(ext)s'),
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True,
+    }
+    started = time.perf_counter()
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        ydl.download([url])
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--segments', type=int, default=40)
+    parser.add_argument('--segment-size', type=int, default=256 * 1024)
+    parser.add_argument('--latency', type=float, default=0.1, help='задержка ответа сервера, с')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--external-downloader', default='', help='например, aria2c')
+    args = parser.parse_args()
+
+    # Настройки бота читаются при импорте services.downloader
+    data_path = tempfile.mkdtemp(prefix='fragment_bench_data_')
+    configure_environment(data_path)
+    server = start_server(args.segments, args.segment_size, args.latency)
+    url = f'http://127.0.0.1:{server.server_port}/playlist.m3u8'
+    output_dir = tempfile.mkdtemp(prefix='fragment_bench_')
+    total_mb = args.segments * args.segment_size / 1024 / 1024
+
+    print(f'{args.segments} фрагментов по {args.segment_size // 1024} KB, задержка {args.latency} с')
+    print(f'{"фрагментов":>10} {"медиана, с":>11} {"мин, с":>8} {"MB/s":>7}')
+    try:
+        for concurrency in args.concurrency:
+            times = [
+                time_to_file(url, concurrency, output_dir, args.external_downloader)
+                for _ in range(args.runs)
+            ]
+            median = statistics.median(times)
+            print(f'{concurrency:>10} {median:>11.2f} {min(times):>8.2f} {total_mb / median:>7.1f}')
+    finally:
+        server.shutdown()
+        shutil.rmtree(output_dir, ignore_errors=True)
+        shutil.rmtree(data_path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
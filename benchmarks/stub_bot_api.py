@@ -0,0 +1,242 @@
+"""
+Локальная заглушка Telegram Bot API для нагрузочных тестов.
+
+Отвечает на запросы python-telegram-bot так, как ответил бы Telegram:
+getMe, getUpdates (long polling из очереди синтетических обновлений),
+sendVideo, sendMediaGroup, sendMessage, getFile, deleteMessage и т.д. Вызовы
+отправки записываются вместе с сообщением, на которое бот ответил.
+Каждый вызов задерживается на latency секунд; видео, переданные
+ссылкой, заглушка скачивает сама, как Telegram, а переданные путем
+file:// читает с диска, как сервер Bot API в режиме --local.
+
+Запуск отдельно, чтобы подключить к нему бота через BOT_API_BASE_URL:
+    python -m benchmarks.stub_bot_api --port 8081
+    BOT_API_BASE_URL=http://127.0.0.1:8081/bot python main.py
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from typing import Callable, List, Optional
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+import aiohttp
+from aiohttp import web
+
+# Методы, которые доставляют пользователю видео или текст
+SEND_METHODS = ('sendVideo', 'sendMediaGroup', 'sendMessage')
+
+
+class RecordedCall:
+    """Вызов метода отправки: когда, в какой чат и в ответ на какое сообщение"""
+
+    def __init__(self, method: str, chat_id: int, reply_to: Optional[int], items: int, at: float):
+        self.method = method
+        self.chat_id = chat_id
+        self.reply_to = reply_to
+        self.items = items  # Видео в альбоме (1 для sendVideo и sendMessage)
+        self.at = at
+
+
+class StubBotApi:
+    """
+    Заглушка Bot API. on_send вызывается для каждого вызова из
+    SEND_METHODS после задержки latency — в момент, когда Telegram
+    доставил бы сообщение.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        fetch_urls: bool = True,
+        listen: str = '127.0.0.1',
+        port: int = 0,
+        on_send: Optional[Callable[[RecordedCall], None]] = None
+    ):
+        self.latency = latency
+        self.fetch_urls = fetch_urls
+        self.listen = listen
+        self.port = port
+        self.on_send = on_send
+        self.calls: List[RecordedCall] = []
+        self.methods: Counter = Counter()
+        self.bytes_uploaded = 0
+        self.bytes_fetched = 0
+        self.bytes_local = 0
+        self._message_ids = itertools.count(1)
+        self._file_ids = itertools.count(1)
+        self._updates: List[dict] = []
+        self._new_updates = asyncio.Event()
+        self._runner: web.AppRunner | None = None
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def bound_port(self) -> int:
+        if self._runner is None or not self._runner.addresses:
+            return self.port
+        return self._runner.addresses[0][1]
+
+    @property
+    def base_url(self) -> str:
+        """Значение для BOT_API_BASE_URL"""
+        return f'http://{self.listen}:{self.bound_port}/bot'
+
+    def push_update(self, update: dict) -> None:
+        """Кладет обновление в очередь getUpdates"""
+        self._updates.append(update)
+        self._new_updates.set()
+
+    # Ответы Bot API
+
+    def _message(self, chat_id: int, **fields) -> dict:
+        return {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'supergroup' if chat_id < 0 else 'private', 'title': 'stub'},
+            **fields,
+        }
+
+    def _video(self, file_id: str) -> dict:
+        return {
+            'file_id': file_id,
+            'file_unique_id': file_id,
+            'width': 720,
+            'height': 1280,
+            'duration': 15,
+        }
+
+    async def _store(self, media, form) -> str:
+        """Принимает видео (file_id, ссылку или файл) и возвращает его file_id"""
+        if isinstance(media, str) and media.startswith('attach://'):
+            media = form.get(media[len('attach://'):])
+        if isinstance(media, web.FileField):
+            self.bytes_uploaded += len(media.file.read())
+        elif isinstance(media, str) and media.startswith('file://'):
+            # Локальный сервер Bot API читает файл сам
+            with open(url2pathname(urlparse(media).path), 'rb') as file:
+                self.bytes_local += len(file.read())
+        elif isinstance(media, str) and media.startswith(('http://', 'https://')):
+            if self.fetch_urls:
+                async with self._session.get(media) as response:
+                    response.raise_for_status()
+                    self.bytes_fetched += len(await response.read())
+        elif isinstance(media, str):
+            # Повторная отправка по file_id
+            return media
+        return f'stub-video-{next(self._file_ids)}'
+
+    async def _get_updates(self, form) -> list:
+        offset = int(form.get('offset') or 0)
+        timeout = float(form.get('timeout') or 0)
+        limit = int(form.get('limit') or 100)
+        # Подтвержденные ботом обновления больше не нужны
+        self._updates = [update for update in self._updates if update['update_id'] >= offset]
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:limit]
+
+    async def _send(self, method: str, form) -> object:
+        chat_id = int(form['chat_id'])
+        reply = json.loads(form['reply_parameters']) if form.get('reply_parameters') else {}
+        reply_to = reply.get('message_id') or (int(form['reply_to_message_id']) if form.get('reply_to_message_id') else None)
+
+        if method == 'sendVideo':
+            result = self._message(chat_id, video=self._video(await self._store(form['video'], form)))
+            items = 1
+        elif method == 'sendMediaGroup':
+            media = json.loads(form['media'])
+            result = [
+                self._message(chat_id, video=self._video(await self._store(item['media'], form)))
+                for item in media
+            ]
+            items = len(media)
+        else:
+            result = self._message(chat_id, text=form.get('text', ''))
+            items = 1
+
+        call = RecordedCall(method, chat_id, reply_to, items, time.perf_counter())
+        self.calls.append(call)
+        if self.on_send is not None:
+            self.on_send(call)
+        return result
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        if request.content_type == 'application/json':
+            form = await request.json()
+        else:
+            form = await request.post()
+        self.methods[method] += 1
+
+        if method == 'getUpdates':
+            return web.json_response({'ok': True, 'result': await self._get_updates(form)})
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'stub', 'username': 'stub_bot'}
+        elif method == 'getFile':
+            # Все выданные заглушкой file_id действительны
+            result = {'file_id': form['file_id'], 'file_unique_id': form['file_id'], 'file_size': 0}
+        elif method in SEND_METHODS:
+            result = await self._send(method, form)
+        else:
+            # deleteMessage, deleteWebhook, setWebhook и прочие
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    def create_app(self) -> web.Application:
+        app = web.Application(client_max_size=2 * 1024 ** 3)
+        app.router.add_route('*', '/bot{token}/{method}', self.handle)
+        return app
+
+    async def start(self) -> None:
+        self._session = aiohttp.ClientSession()
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+
+    async def stop(self) -> None:
+        # Ожидающий getUpdates завершается, чтобы сервер не ждал его
+        self._new_updates.set()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+async def serve(args) -> None:
+    def report(call: RecordedCall):
+        print(f'{call.method} chat={call.chat_id} reply_to={call.reply_to} items={call.items}')
+
+    stub = StubBotApi(args.latency, not args.no_fetch, args.listen, args.port, on_send=report)
+    await stub.start()
+    print(f'Bot API: {stub.base_url}')
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stub.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--listen', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='задержка ответа Bot API, с')
+    parser.add_argument('--no-fetch', action='store_true', help='не скачивать видео, переданные ссылкой')
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""
+Пропускная способность приема обновлений через webhook.
+
+Поднимает WebhookServer на свободном порту и отправляет ему
+синтетические обновления с сообщениями со ссылками от нескольких
+клиентов одновременно. Очередь обновлений разбирает отдельная задача,
+имитирующая обработку с заданной задержкой и ограниченной
+параллельностью (как concurrent_updates в боте).
+
+Запуск из корня проекта:
+    python -m benchmarks.webhook_load --updates 5000 --clients 40
+"""
+import argparse
+import asyncio
+import shutil
+import statistics
+import tempfile
+import time
+import aiohttp
+from telegram import Bot
+from benchmarks.bot_load import configure_environment
+
+SECRET = 'benchmark-secret'
+
+
+def synthetic_update(update_id: int, chats: int) -> dict:
+    chat_id = -1000000000000 - update_id % chats
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'supergroup', 'title': 'load'},
+            'from': {'id': update_id % 1000 + 1, 'is_bot': False, 'first_name': 'load'},
+            'text': f'https://www.tiktok.com/@user/video/{7000000000000000000 + update_id}',
+        },
+    }
+
+
+async def consume(queue: asyncio.Queue, concurrency: int, delay: float, processed: list) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def process(update):
+        async with semaphore:
+            await asyncio.sleep(delay)
+            processed.append(update.update_id)
+
+    tasks = set()
+    while True:
+        update = await queue.get()
+        task = asyncio.create_task(process(update))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+
+async def client(session: aiohttp.ClientSession, url: str, ids: list, chats: int, latencies: list, statuses: dict,
+                 headers: dict):
+    for update_id in ids:
+        started = time.perf_counter()
+        async with session.post(url, json=synthetic_update(update_id, chats), headers=headers) as response:
+            await response.read()
+            statuses[response.status] = statuses.get(response.status, 0) + 1
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(args) -> None:
+    from services.webhook import SECRET_HEADER, WebhookServer
+
+    queue: asyncio.Queue = asyncio.Queue()
+    bot = Bot('123456:benchmark')
+    server = WebhookServer(bot, queue, listen='127.0.0.1', port=0, path='/telegram',
+                           secret=SECRET, max_pending=args.max_pending)
+    await server.start()
+    url = f'http://127.0.0.1:{server.bound_port}/telegram'
+
+    processed: list = []
+    consumer = asyncio.create_task(consume(queue, args.concurrency, args.delay, processed))
+    latencies: list = []
+    statuses: dict = {}
+
+    connector = aiohttp.TCPConnector(limit=args.clients)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async with session.post(url, json=synthetic_update(0, 1)) as response:
+            assert response.status == 403, 'запрос без секрета должен отклоняться'
+
+        ids = list(range(1, args.updates + 1))
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            client(session, url, ids[i::args.clients], args.chats, latencies, statuses, {SECRET_HEADER: SECRET})
+            for i in range(args.clients)
+        ))
+        elapsed = time.perf_counter() - started
+
+    while queue.qsize() or len(processed) < server.received:
+        await asyncio.sleep(0.01)
+    drained = time.perf_counter() - started
+    consumer.cancel()
+    await server.stop()
+
+    latencies.sort()
+    print(f'Обновлений: {args.updates}, клиентов: {args.clients}, ответы: {statuses}')
+    print(f'Прием: {args.updates / elapsed:.0f} обновлений/с за {elapsed:.2f} с')
+    print(f'Задержка ответа: p50 {statistics.median(latencies) * 1000:.1f} мс, '
+          f'p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} мс')
+    print(f'Обработано: {len(processed)} за {drained:.2f} с, отклонено (503): {server.rejected}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=40, help='как max_connections у Telegram')
+    parser.add_argument('--chats', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=32, help='параллельная обработка обновлений')
+    parser.add_argument('--delay', type=float, default=0.001, help='время обработки одного обновления, с')
+    parser.add_argument('--max-pending', type=int, default=1000)
+    args = parser.parse_args()
+
+    # Настройки бота читаются при импорте services.webhook
+    data_path = tempfile.mkdtemp(prefix='webhook_load_')
+    configure_environment(data_path)
+    try:
+        asyncio.run(run(args))
+    finally:
+        shutil.rmtree(data_path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
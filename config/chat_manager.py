@@ -1,6 +1,7 @@
 import json
 import os
 from typing import Set
+from services.tracing import log
 
 class ChatManager:
     def __init__(self):
@@ -69,7 +70,7 @@ class ChatManager:
                 data = json.load(file)
                 return set(data.get(key, []))
         except (json.JSONDecodeError, FileNotFoundError) as e:
-            print(f"Ошибка при чтении файла {file_path}: {e}")
+            log("Ошибка при чтении файла", path=file_path, error=str(e))
             return set()
 
     def _save_to_file(self, file_path: str, data: dict) -> None:
@@ -85,7 +86,7 @@ class ChatManager:
             with open(file_path, 'w', encoding='utf-8') as file:
                 json.dump(data, file, ensure_ascii=False, indent=4)
         except Exception as e:
-            print(f"Ошибка при сохранении в файл {file_path}: {e}")
+            log("Ошибка при сохранении в файл", path=file_path, error=str(e))
 
     def is_allowed_chat(self, chat_id: int) -> bool:
         """Проверяет, находится ли чат в списке разрешенных"""
@@ -6,7 +6,23 @@ load_dotenv()
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 AUTH_CHAT_ID = os.getenv('AUTH_CHAT_ID')
 
-MAX_FILE_SIZE = 50 * 1024 * 1024 # 50MB
+# Собственный сервер telegram-bot-api (https://github.com/tdlib/telegram-bot-api),
+# например http://localhost:8081/bot. По умолчанию используется api.telegram.org
+BOT_API_BASE_URL = os.getenv('BOT_API_BASE_URL')
+BOT_API_FILE_URL = os.getenv('BOT_API_FILE_URL')
+# Сервер запущен с --local: файлы до 2GB и отправка по локальному пути file://
+BOT_API_LOCAL_MODE = os.getenv('BOT_API_LOCAL_MODE', '').lower() in ('1', 'true', 'yes')
+# Таймаут записи при отправке больших файлов (секунды)
+BOT_API_MEDIA_WRITE_TIMEOUT = float(os.getenv('BOT_API_MEDIA_WRITE_TIMEOUT', '300'))
+
+if BOT_API_LOCAL_MODE:
+    MAX_FILE_SIZE = 2000 * 1024 * 1024 # 2GB
+else:
+    MAX_FILE_SIZE = 50 * 1024 * 1024 # 50MB
+# Видео не больше этого размера загружаются в память, минуя диск
+STREAM_MAX_SIZE = int(os.getenv('STREAM_MAX_SIZE', str(20 * 1024 * 1024)))  # 20MB
+# Telegram сам скачивает по ссылке файлы не больше 20MB; 0 отключает отправку ссылкой
+DIRECT_URL_MAX_SIZE = int(os.getenv('DIRECT_URL_MAX_SIZE', str(20 * 1024 * 1024)))  # 20MB
 
 INSTAGRAM_CREDENTIALS = {
     'headers': {
@@ -42,9 +58,209 @@ for item in os.getenv('COOKIES').split(';'):
 # Регулярные выражения для URL
 PATTERNS = {
     'tiktok': r"https?://(\w+\.)?tiktok\.com/[^\s]+",
-    "instagram": r"https?://(?:www\.)?instagram\.com(?:/[A-Za-z0-9_.]+)?/reel/[A-Za-z0-9_-]+/?(?:\?[^\s]*)?",
-    'youtube': r"https?://(www\.)?youtube\.com/shorts/[^\s]+"
+    "instagram": r"https?://(?:www\.)?instagram\.com(?:/[A-Za-z0-9_.]+)?/(?:reels?|p)/[A-Za-z0-9_-]+/?(?:\?[^\s]*)?",
+    'youtube': r"https?://(?:(?:www|m)\.)?youtube\.com/shorts/[^\s]+|https?://youtu\.be/[^\s]+"
 }
 
+# Кэш развёрнутых коротких ссылок (vt.tiktok.com и т.п.)
+RESOLVER_MAX_ENTRIES = int(os.getenv('RESOLVER_MAX_ENTRIES', '10000'))
+
 # Настройки загрузки
-DOWNLOAD_PATH = "downloads" 
\ No newline at end of file
+DOWNLOAD_PATH = os.getenv('DOWNLOAD_PATH', 'downloads')
+# Сколько байт могут занимать временные файлы загрузок (0 — без ограничения).
+# Новые загрузки ждут, пока текущие не освободят место. Квота действует на
+# процесс: бот и каждый воркер пишут в свой подкаталог DOWNLOAD_PATH
+SCRATCH_QUOTA = int(os.getenv('SCRATCH_QUOTA', str(2 * 1024 * 1024 * 1024)))  # 2GB
+# Сколько зарезервировать под видео неизвестного размера (не больше MAX_FILE_SIZE);
+# после загрузки резерв уточняется по фактическому размеру файлов
+SCRATCH_UNKNOWN_SIZE = int(os.getenv('SCRATCH_UNKNOWN_SIZE', str(100 * 1024 * 1024)))  # 100MB
+# Файлы старше SCRATCH_ORPHAN_AGE секунд, не принадлежащие текущим загрузкам,
+# удаляются при запуске и затем раз в SCRATCH_SWEEP_INTERVAL секунд
+SCRATCH_ORPHAN_AGE = int(os.getenv('SCRATCH_ORPHAN_AGE', '600'))
+SCRATCH_SWEEP_INTERVAL = int(os.getenv('SCRATCH_SWEEP_INTERVAL', '3600'))
+# Каталог в tmpfs (например, /dev/shm/videobot) для роликов не больше
+# SCRATCH_TMPFS_MAX_SIZE; всего в нем не больше SCRATCH_TMPFS_QUOTA байт
+SCRATCH_TMPFS_PATH = os.getenv('SCRATCH_TMPFS_PATH', '')
+SCRATCH_TMPFS_MAX_SIZE = int(os.getenv('SCRATCH_TMPFS_MAX_SIZE', str(50 * 1024 * 1024)))  # 50MB
+SCRATCH_TMPFS_QUOTA = int(os.getenv('SCRATCH_TMPFS_QUOTA', str(256 * 1024 * 1024)))  # 256MB
+
+# Каталог для постоянных данных бота
+DATA_PATH = os.getenv('DATA_PATH', 'data')
+
+# Постоянный кэш yt-dlp (плееры YouTube, подписи, токены экстракторов)
+YTDLP_CACHE_DIR = os.getenv('YTDLP_CACHE_DIR', os.path.join(DATA_PATH, 'yt-dlp'))
+
+# Общий кэш file_id для всех платформ
+CACHE_DB_PATH = os.path.join(DATA_PATH, 'file_id_cache.sqlite3')
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '5000'))
+CACHE_TTL = int(os.getenv('CACHE_TTL', str(30 * 24 * 3600)))  # 30 дней
+# Доля кэша под видео, к которым обращались повторно (сегментированный LRU)
+CACHE_PROTECTED_RATIO = float(os.getenv('CACHE_PROTECTED_RATIO', '0.8'))
+# Записи в базу копятся и сбрасываются пачками
+CACHE_FLUSH_INTERVAL = float(os.getenv('CACHE_FLUSH_INTERVAL', '5'))
+CACHE_FLUSH_BATCH = int(os.getenv('CACHE_FLUSH_BATCH', '100'))
+# Прогрев кэша при запуске: файл со ссылками (по одной в строке) или журнал /cache_export
+CACHE_PREWARM_FILE = os.getenv('CACHE_PREWARM_FILE', '')
+# Проверка сохраненных file_id: раз в CACHE_VALIDATE_INTERVAL секунд (0 — отключена)
+# проверяется до CACHE_VALIDATE_BATCH самых популярных записей, не проверенных CACHE_VALIDATE_AGE секунд
+CACHE_VALIDATE_INTERVAL = int(os.getenv('CACHE_VALIDATE_INTERVAL', '600'))
+CACHE_VALIDATE_BATCH = int(os.getenv('CACHE_VALIDATE_BATCH', '50'))
+CACHE_VALIDATE_AGE = int(os.getenv('CACHE_VALIDATE_AGE', str(24 * 3600)))
+
+# Индекс отпечатков содержимого: одно видео, пришедшее по разным ссылкам
+# (репост TikTok, Reels, Shorts), отправляется по уже известному file_id
+FINGERPRINT_DB_PATH = os.path.join(DATA_PATH, 'fingerprints.sqlite3')
+FINGERPRINT_MAX_ENTRIES = int(os.getenv('FINGERPRINT_MAX_ENTRIES', '20000'))
+# Сравнение по ключевым кадрам находит перекодированные копии; требует ffmpeg
+FINGERPRINT_PERCEPTUAL = os.getenv('FINGERPRINT_PERCEPTUAL', '').lower() in ('1', 'true', 'yes')
+FINGERPRINT_FRAMES = int(os.getenv('FINGERPRINT_FRAMES', '5'))
+# Допустимое среднее число различающихся бит из 64 на кадр
+FINGERPRINT_THRESHOLD = int(os.getenv('FINGERPRINT_THRESHOLD', '8'))
+# Более длинные видео сравниваются только по хэшу содержимого
+FINGERPRINT_MAX_DURATION = int(os.getenv('FINGERPRINT_MAX_DURATION', '600'))
+
+# Постоянная очередь заданий: незавершенные задания повторяются после
+# перезапуска, пока не исчерпаны попытки и не прошло JOB_MAX_AGE секунд
+JOBS_DB_PATH = os.path.join(DATA_PATH, 'jobs.sqlite3')
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_MAX_AGE = int(os.getenv('JOB_MAX_AGE', str(24 * 3600)))  # 1 день
+# Сколько секунд при остановке ждать завершения текущих доставок
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv('SHUTDOWN_DRAIN_TIMEOUT', '30'))
+
+# Где загружаются видео: 'local' — в процессе бота, 'worker' — отдельными
+# воркерами (python worker.py), которые берут задачи из брокера
+DOWNLOAD_MODE = os.getenv('DOWNLOAD_MODE', 'local')
+BROKER_DB_PATH = os.getenv('BROKER_DB_PATH', os.path.join(DATA_PATH, 'broker.sqlite3'))
+# Сколько хранить завершенные задачи в брокере, секунды (0 — не удалять)
+BROKER_RETENTION = float(os.getenv('BROKER_RETENTION', '3600'))
+# Отдельный служебный чат, в который воркеры, inline-режим и прогрев кэша
+# загружают видео, чтобы получить file_id. Обязателен для режима воркеров;
+# без него inline-режим и прогрев кэша отключены
+STORAGE_CHAT_ID = os.getenv('STORAGE_CHAT_ID', '')
+# Загрузок в служебный чат в секунду из одного процесса. Лимит Telegram
+# (около 20 сообщений в минуту в группу) общий для бота и всех воркеров,
+# поэтому при N воркерах задайте примерно 20 / 60 / (N + 1)
+STORAGE_SEND_RATE = float(os.getenv('STORAGE_SEND_RATE', str(20 / 60)))
+WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', '2'))
+# Платформы, задачи которых берет воркер (пусто — все)
+WORKER_PLATFORMS = [p for p in os.getenv('WORKER_PLATFORMS', '').split(',') if p]
+# Аренда задачи воркером (продлевается, пока он работает), секунды
+WORKER_LEASE = float(os.getenv('WORKER_LEASE', '120'))
+WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', '0.5'))
+# Сколько бот ждет результат воркера
+WORKER_RESULT_TIMEOUT = float(os.getenv('WORKER_RESULT_TIMEOUT', '900'))
+
+# Пул загрузок: 'thread' или 'process'
+DOWNLOAD_EXECUTOR = os.getenv('DOWNLOAD_EXECUTOR', 'thread')
+# Общее ограничение одновременных загрузок
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', '4'))
+# Ограничение одновременных загрузок для каждой платформы
+DOWNLOAD_PLATFORM_LIMITS = {
+    'tiktok': int(os.getenv('TIKTOK_DOWNLOAD_LIMIT', '2')),
+    'instagram': int(os.getenv('INSTAGRAM_DOWNLOAD_LIMIT', '2')),
+    'youtube': int(os.getenv('YOUTUBE_DOWNLOAD_LIMIT', '2')),
+}
+
+# Справедливая очередь загрузок между чатами: одновременные загрузки,
+# новые загрузки в секунду на чат и запас для пачки ссылок
+SCHEDULER_MAX_ACTIVE = int(os.getenv('SCHEDULER_MAX_ACTIVE', str(DOWNLOAD_WORKERS)))
+CHAT_JOB_RATE = float(os.getenv('CHAT_JOB_RATE', '0.5'))
+CHAT_JOB_BURST = float(os.getenv('CHAT_JOB_BURST', '10'))
+# Веса чатов в очереди в формате "chat_id:вес,chat_id:вес" (по умолчанию 1)
+CHAT_WEIGHTS = {}
+for item in filter(None, os.getenv('CHAT_WEIGHTS', '').split(',')):
+    chat_id, weight = item.split(':', maxsplit=1)
+    CHAT_WEIGHTS[int(chat_id)] = float(weight)
+
+# Исходящие сообщения в секунду на чат (лимиты Telegram)
+SEND_RATE_PRIVATE = float(os.getenv('SEND_RATE_PRIVATE', '1'))
+SEND_RATE_GROUP = float(os.getenv('SEND_RATE_GROUP', str(20 / 60)))
+SEND_BURST = float(os.getenv('SEND_BURST', '10'))
+
+# Профили загрузки фрагментированных видео (DASH/HLS) для каждой платформы:
+# число одновременно загружаемых фрагментов, размер HTTP-чанка в байтах
+# (0 — без разбиения) и внешний загрузчик (например, aria2c)
+DOWNLOAD_PROFILES = {
+    'default': {
+        'concurrent_fragment_downloads': int(os.getenv('FRAGMENT_CONCURRENCY', '4')),
+        'http_chunk_size': int(os.getenv('HTTP_CHUNK_SIZE', '0')),
+        'external_downloader': os.getenv('EXTERNAL_DOWNLOADER', ''),
+    },
+    'tiktok': {
+        'concurrent_fragment_downloads': int(os.getenv('TIKTOK_FRAGMENT_CONCURRENCY', '4')),
+        'http_chunk_size': int(os.getenv('TIKTOK_HTTP_CHUNK_SIZE', '0')),
+        'external_downloader': os.getenv('TIKTOK_EXTERNAL_DOWNLOADER', ''),
+    },
+    'instagram': {
+        'concurrent_fragment_downloads': int(os.getenv('INSTAGRAM_FRAGMENT_CONCURRENCY', '4')),
+        'http_chunk_size': int(os.getenv('INSTAGRAM_HTTP_CHUNK_SIZE', '0')),
+        'external_downloader': os.getenv('INSTAGRAM_EXTERNAL_DOWNLOADER', ''),
+    },
+    'youtube': {
+        'concurrent_fragment_downloads': int(os.getenv('YOUTUBE_FRAGMENT_CONCURRENCY', '8')),
+        # YouTube ограничивает скорость длинных запросов без Range
+        'http_chunk_size': int(os.getenv('YOUTUBE_HTTP_CHUNK_SIZE', str(10 * 1024 * 1024))),
+        'external_downloader': os.getenv('YOUTUBE_EXTERNAL_DOWNLOADER', ''),
+    },
+}
+
+# Общий HTTP-клиент (таймауты в секундах)
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '10'))
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv('HTTP_MAX_CONNECTIONS_PER_HOST', '10'))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv('HTTP_KEEPALIVE_TIMEOUT', '60'))
+# Одновременные запросы к API Instagram
+INSTAGRAM_API_CONCURRENCY = int(os.getenv('INSTAGRAM_API_CONCURRENCY', '4'))
+
+# Быстрый путь источника (например, API Instagram) отключается после
+# CIRCUIT_FAILURE_THRESHOLD ошибок подряд на CIRCUIT_RESET_TIMEOUT секунд
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', '60'))
+# Сколько помнить видео, которые окончательно не удалось загрузить
+NEGATIVE_CACHE_TTL = float(os.getenv('NEGATIVE_CACHE_TTL', '3600'))
+NEGATIVE_CACHE_MAX_ENTRIES = int(os.getenv('NEGATIVE_CACHE_MAX_ENTRIES', '10000'))
+
+# Перекодирование видео, не помещающихся в MAX_FILE_SIZE
+FFMPEG_PATH = os.getenv('FFMPEG_PATH', 'ffmpeg')
+TRANSCODE_WORKERS = int(os.getenv('TRANSCODE_WORKERS', '1'))
+FFPROBE_PATH = os.getenv('FFPROBE_PATH', 'ffprobe')
+# Сколько результатов определения размеров и превью хранить в памяти
+PROBE_MAX_ENTRIES = int(os.getenv('PROBE_MAX_ENTRIES', '1000'))
+# Максимальный размер исходника, который имеет смысл скачивать для перекодирования
+TRANSCODE_MAX_INPUT_SIZE = int(os.getenv('TRANSCODE_MAX_INPUT_SIZE', str(500 * 1024 * 1024)))  # 500MB
+
+# Получение обновлений: 'polling' или 'webhook'
+UPDATE_MODE = os.getenv('UPDATE_MODE', 'polling')
+# Публичный адрес бота (https://example.com), к нему добавляется WEBHOOK_PATH;
+# обязателен в режиме webhook
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+# Путь webhook, в том числе за обратным прокси
+WEBHOOK_PATH = '/' + os.getenv('WEBHOOK_PATH', 'telegram').strip('/')
+# Секретный токен в заголовке запросов Telegram; если не задан, генерируется при запуске
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+# Сколько соединений Telegram может открыть к webhook (1-100)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+# Больше необработанных обновлений в очереди не принимаем (ответ 503)
+WEBHOOK_MAX_PENDING = int(os.getenv('WEBHOOK_MAX_PENDING', '1000'))
+
+# Количество обновлений Telegram, обрабатываемых одновременно
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '32'))
+
+# Inline-режим "@бот ссылка": сколько секунд Telegram хранит ответ с видео
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '300'))
+# Сколько ждать загрузки видео, которого нет в кэше, прежде чем ответить заглушкой
+INLINE_FETCH_WAIT = float(os.getenv('INLINE_FETCH_WAIT', '2'))
+# Inline-запросы приходят на каждое нажатие клавиши: загрузка начинается, только
+# если пользователь не изменил запрос за INLINE_DEBOUNCE секунд
+INLINE_DEBOUNCE = float(os.getenv('INLINE_DEBOUNCE', '0.7'))
+
+# Метрики Prometheus на http://METRICS_LISTEN:METRICS_PORT/metrics (0 — отключены)
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+# Порт метрик воркера, чтобы не занимать порт бота на той же машине
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', '0'))
+# Формат логов: 'text' или 'json' (одна запись на строку)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
@@ -1,29 +1,205 @@
+import asyncio
+import signal
 from telegram import Update
 from telegram.ext import ApplicationBuilder, MessageHandler, CommandHandler, filters
-from handlers import TikTokHandler, InstagramHandler, YouTubeHandler
+from handlers import TikTokHandler, InstagramHandler, YouTubeHandler, LinkDispatcher, InlineHandler
 from handlers.commands import BotCommands
-from config.settings import BOT_TOKEN
+from handlers.warmer import CacheWarmer
+from config.settings import (
+    BOT_TOKEN, CACHE_PREWARM_FILE, STORAGE_CHAT_ID, UPDATE_CONCURRENCY, BOT_API_BASE_URL, BOT_API_FILE_URL,
+    BOT_API_LOCAL_MODE, BOT_API_MEDIA_WRITE_TIMEOUT, SHUTDOWN_DRAIN_TIMEOUT, DOWNLOAD_MODE,
+    UPDATE_MODE, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_MAX_CONNECTIONS
+)
 from config.chat_manager import ChatManager
+from services.download_pool import DownloadPool
+from services.downloader import VideoDownloader
+from services.file_manager import FileManager
+from services.http_client import HttpClient
+from services.media_probe import MediaProbe
+from services.metrics import MetricsServer
+from services.rate_limit import ChatThrottle
+from services.remote import RemoteFetcher
+from services.scheduler import FairScheduler
+from services.broker import SqliteBroker
+from services.cache import FileIdCache
+from services.fingerprint import FingerprintIndex
+from services.job_store import JobStore
+from services.singleflight import SingleFlight
+from services.storage import StorageChat
+from services.webhook import WebhookServer
+from services.tracing import log
+from services.resolver import LinkResolver
 
 class VideoDownloaderBot:
-    def __init__(self):
-        self.app = ApplicationBuilder().token(BOT_TOKEN).build()
-        
+    def __init__(self, base_url: str | None = BOT_API_BASE_URL, base_file_url: str | None = BOT_API_FILE_URL):
+        if UPDATE_MODE == 'webhook' and not WEBHOOK_URL:
+            raise ValueError("Для UPDATE_MODE=webhook нужно задать WEBHOOK_URL")
+        if DOWNLOAD_MODE == 'worker' and not STORAGE_CHAT_ID:
+            raise ValueError("Для DOWNLOAD_MODE=worker нужно задать STORAGE_CHAT_ID")
+        if BOT_API_LOCAL_MODE and not base_url:
+            raise ValueError("Для BOT_API_LOCAL_MODE нужно задать BOT_API_BASE_URL собственного сервера Bot API")
+        builder = (
+            ApplicationBuilder()
+            .token(BOT_TOKEN)
+            .concurrent_updates(UPDATE_CONCURRENCY)
+            .media_write_timeout(BOT_API_MEDIA_WRITE_TIMEOUT)
+        )
+        # Собственный сервер Bot API вместо api.telegram.org
+        if base_url:
+            builder = builder.base_url(base_url)
+            builder = builder.base_file_url(base_file_url or base_url.replace('/bot', '/file/bot', 1))
+        if BOT_API_LOCAL_MODE:
+            builder = builder.local_mode(True)
+        self.app = builder.build()
+        self.webhook: WebhookServer | None = None
+        # Метрики Prometheus на локальном порту
+        self.metrics = MetricsServer()
+
         # Создаем единый экземпляр ChatManager
         chat_manager = ChatManager()
 
-        bot_commands = BotCommands(chat_manager)
+        # Общий пул загрузок для всех платформ
+        self.download_pool = DownloadPool()
+        # Общий для всех платформ кэш file_id, переживающий перезапуск
+        self.cache = FileIdCache()
+        # Принятые ссылки, которые нужно доставить даже после перезапуска
+        self.jobs = JobStore()
+        # Отпечатки содержимого отправленных видео для поиска дубликатов по разным ссылкам
+        self.fingerprints = FingerprintIndex()
+        # Таблица выполняющихся загрузок для объединения одинаковых запросов
+        inflight = SingleFlight()
+        # Общая HTTP-сессия с пулом соединений
+        self.http_client = HttpClient()
+        # Разворачивает короткие ссылки для вычисления ключа кэша
+        resolver = LinkResolver(self.http_client)
+        # Временный каталог загрузок с квотой и очисткой брошенных файлов
+        self.file_manager = FileManager()
+        self.downloader = VideoDownloader(self.download_pool, self.http_client, file_manager=self.file_manager)
+        # Размеры, длительность и превью отправляемых видео
+        probe = MediaProbe(self.http_client)
+
+        # Справедливая очередь загрузок и ограничение частоты сообщений по чатам
+        scheduler = FairScheduler()
+        throttle = ChatThrottle()
+
+        # Обработчики платформ
+        backends = [
+            TikTokHandler(resolver, self.downloader, probe),
+            InstagramHandler(resolver, self.downloader, probe, self.http_client),
+            YouTubeHandler(resolver, self.downloader, probe),
+        ]
+
+        # Единый обработчик ссылок на видео для всех платформ
+        # В режиме воркеров загрузки выполняет отдельный процесс worker.py
+        self.broker = SqliteBroker() if DOWNLOAD_MODE == 'worker' else None
+        remote = RemoteFetcher(self.broker) if self.broker is not None else None
+
+        self.dispatcher = LinkDispatcher(
+            chat_manager, self.cache, inflight, scheduler, throttle, self.jobs, self.fingerprints, backends, remote
+        )
+        self.app.add_handler(self.dispatcher.get_handler())
+
+        # Фоновая загрузка в служебный чат, прогрев кэша и проверка file_id
+        storage = StorageChat() if STORAGE_CHAT_ID else None
+        self.warmer = CacheWarmer(self.dispatcher, storage)
+
+        # Inline-режим: видео из кэша, остальные загружаются в служебный чат
+        if storage is not None:
+            inline = InlineHandler(chat_manager, self.dispatcher, self.warmer)
+            self.app.add_handler(inline.get_handler())
+
+        bot_commands = BotCommands(
+            chat_manager, self.download_pool, scheduler, self.file_manager, self.cache, self.warmer
+        )
 
         # Регистрация обработчиков команд управления чатами
         for handler in bot_commands.get_handlers():
             self.app.add_handler(handler)
 
-        # Регистрация обработчиков отправки видео в чаты
-        self.app.add_handler(TikTokHandler(chat_manager).get_handler())
-        self.app.add_handler(InstagramHandler(chat_manager).get_handler())
-        self.app.add_handler(YouTubeHandler(chat_manager).get_handler())
+    async def _post_init(self) -> None:
+        await self.cache.start()
+        await self.fingerprints.start()
+        await self.file_manager.start()
+        await self.metrics.start()
+        if self.broker is not None:
+            self.broker.start()
+
+    async def _post_shutdown(self) -> None:
+        await self.metrics.stop()
+        await self.cache.close()
+        await self.file_manager.close()
+        self.download_pool.shutdown()
+        self.downloader.close()
+        await self.http_client.close()
+        self.jobs.close()
+        self.fingerprints.close()
+        if self.broker is not None:
+            await self.broker.close()
+
+    def _install_stop_signals(self, stop: asyncio.Event) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                # Windows: обработчики сигналов event loop не поддерживаются
+                signal.signal(sig, lambda *_: loop.call_soon_threadsafe(stop.set))
+
+    async def _start_updates(self) -> None:
+        """Начинает получать обновления long polling или через webhook"""
+        if UPDATE_MODE == 'webhook':
+            self.webhook = WebhookServer(self.app.bot, self.app.update_queue)
+            await self.webhook.start()
+            await self.app.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip('/') + WEBHOOK_PATH,
+                secret_token=self.webhook.secret,
+                max_connections=WEBHOOK_MAX_CONNECTIONS,
+                allowed_updates=Update.ALL_TYPES
+            )
+        else:
+            await self.app.updater.start_polling()
+
+    async def _stop_updates(self) -> None:
+        # Webhook не удаляем: пока бот остановлен, Telegram копит обновления
+        if self.webhook is not None:
+            await self.webhook.stop()
+        if self.app.updater.running:
+            await self.app.updater.stop()
+
+    async def _serve(self) -> None:
+        """
+        Запускает бота и останавливает его по SIGINT/SIGTERM: сначала
+        прекращается получение обновлений, затем текущие доставки
+        получают SHUTDOWN_DRAIN_TIMEOUT секунд на завершение.
+        Незавершенные задания повторятся при следующем запуске.
+        """
+        stop = asyncio.Event()
+        self._install_stop_signals(stop)
+
+        replay: asyncio.Task | None = None
+        await self.app.initialize()
+        try:
+            await self._post_init()
+            await self._start_updates()
+            await self.app.start()
+            replay = asyncio.create_task(self.dispatcher.replay(self.app.bot))
+            self.warmer.start(self.app.bot)
+            if CACHE_PREWARM_FILE and self.warmer.storage is not None:
+                self.warmer.spawn(self.warmer.prewarm_file(self.app.bot, CACHE_PREWARM_FILE))
+            await stop.wait()
+        finally:
+            log("Останавливаем бота...")
+            await self._stop_updates()
+            await self.dispatcher.drain(SHUTDOWN_DRAIN_TIMEOUT)
+            if replay is not None and not replay.done():
+                replay.cancel()
+                await asyncio.gather(replay, return_exceptions=True)
+            await self.warmer.close()
+            if self.app.running:
+                await self.app.stop()
+            await self.app.shutdown()
+            await self._post_shutdown()
 
-    
     def run(self):
-        print("Бот запущен. Нажмите Ctrl+C для остановки.")
-        self.app.run_polling() 
\ No newline at end of file
+        log("Бот запущен. Нажмите Ctrl+C для остановки.")
+        asyncio.run(self._serve())
\ No newline at end of file
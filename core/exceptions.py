@@ -2,6 +2,10 @@ class DownloadError(Exception):
     """Ошибка при загрузке видео"""
     pass
 
+class PermanentDownloadError(DownloadError):
+    """Видео нельзя загрузить и повтор не поможет (удалено, приватное, недоступно)"""
+    pass
+
 class FileSizeError(Exception):
     """Ошибка превышения размера файла"""
     pass
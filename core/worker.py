@@ -0,0 +1,202 @@
+import asyncio
+import signal
+from telegram import Bot
+from telegram.request import HTTPXRequest
+from handlers import TikTokHandler, InstagramHandler, YouTubeHandler
+from handlers.base import BaseHandler
+from core.exceptions import FileSizeError, PermanentDownloadError
+from config.settings import (
+    BOT_TOKEN, BOT_API_BASE_URL, BOT_API_FILE_URL, BOT_API_LOCAL_MODE,
+    BOT_API_MEDIA_WRITE_TIMEOUT, SHUTDOWN_DRAIN_TIMEOUT, STORAGE_CHAT_ID,
+    WORKER_CONCURRENCY, WORKER_PLATFORMS, WORKER_METRICS_PORT
+)
+from services.broker import BrokerTask, SqliteBroker, worker_name
+from services.download_pool import DownloadPool
+from services.downloader import VideoDownloader
+from services.file_manager import FileManager
+from services.fingerprint import FingerprintIndex
+from services.http_client import HttpClient
+from services.media import PreparedVideo
+from services.media_probe import MediaProbe
+from services.metrics import LINKS, MetricsServer
+from services.resolver import LinkResolver
+from services.storage import StorageChat
+from services.tracing import log, new_trace
+
+
+class DownloadWorker:
+    """
+    Воркер загрузок: берет задачи из брокера, скачивает видео,
+    загружает его в служебный чат STORAGE_CHAT_ID и возвращает боту
+    file_id. Можно запустить сколько угодно воркеров с общим брокером.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = WORKER_CONCURRENCY,
+        platforms: list = WORKER_PLATFORMS,
+        storage_chat_id: str = STORAGE_CHAT_ID
+    ):
+        self.name = worker_name()
+        self.concurrency = concurrency
+        self.platforms = platforms or None
+
+        if BOT_API_LOCAL_MODE and not BOT_API_BASE_URL:
+            raise ValueError("Для BOT_API_LOCAL_MODE нужно задать BOT_API_BASE_URL собственного сервера Bot API")
+        base_url = BOT_API_BASE_URL or 'https://api.telegram.org/bot'
+        self.bot = Bot(
+            BOT_TOKEN,
+            base_url=base_url,
+            base_file_url=BOT_API_FILE_URL or base_url.replace('/bot', '/file/bot', 1),
+            local_mode=BOT_API_LOCAL_MODE,
+            request=HTTPXRequest(media_write_timeout=BOT_API_MEDIA_WRITE_TIMEOUT)
+        )
+        self.broker = SqliteBroker()
+        self.storage = StorageChat(storage_chat_id)
+
+        self.download_pool = DownloadPool()
+        self.http_client = HttpClient()
+        resolver = LinkResolver(self.http_client)
+        self.file_manager = FileManager()
+        # Видео, уже загруженные воркером по другой ссылке, не загружаются повторно
+        self.fingerprints = FingerprintIndex()
+        self.downloader = VideoDownloader(self.download_pool, self.http_client, file_manager=self.file_manager)
+        probe = MediaProbe(self.http_client)
+        backends = [
+            TikTokHandler(resolver, self.downloader, probe),
+            InstagramHandler(resolver, self.downloader, probe, self.http_client),
+            YouTubeHandler(resolver, self.downloader, probe),
+        ]
+        self.backends = {backend.platform: backend for backend in backends}
+
+        self.metrics = MetricsServer(port=WORKER_METRICS_PORT)
+
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks: set[asyncio.Task] = set()
+
+    async def upload(self, video: PreparedVideo, platform: str) -> str:
+        """
+        Загружает видео в служебный чат
+        Returns: file_id видео
+        """
+        return await self.storage.upload(self.bot, video, platform)
+
+    async def _heartbeat(self, task: BrokerTask) -> None:
+        while True:
+            await asyncio.sleep(self.broker.lease / 3)
+            try:
+                await self.broker.extend(task.task_id, self.name)
+            except Exception as e:
+                # Следующая попытка успеет до истечения аренды
+                log("Не удалось продлить аренду задачи", task=task.task_id, error=str(e))
+
+    async def _report(self, result, task: BrokerTask) -> None:
+        """Сохраняет результат задачи; если брокер недоступен, задачу после аренды возьмет другой воркер"""
+        try:
+            await result
+        except Exception as e:
+            log("Ошибка при завершении задачи", task=task.task_id, error=str(e))
+
+    async def execute(self, task: BrokerTask, backend: BaseHandler) -> None:
+        new_trace()
+        log("Задача получена", task=task.task_id, key=task.key, attempt=task.attempts)
+        heartbeat = asyncio.create_task(self._heartbeat(task))
+        try:
+            video = await backend.fetch(task.url, task.key)
+            try:
+                video = await self.fingerprints.dedupe(video, task.platform)
+                file_id = await self.upload(video, task.platform)
+                await self.fingerprints.remember(video, file_id)
+            finally:
+                video.cleanup()
+        except asyncio.CancelledError:
+            # Воркер останавливается — задачу возьмет другой
+            await asyncio.shield(self.broker.release(task.task_id, self.name))
+            raise
+        except Exception as e:
+            log("Ошибка при выполнении задачи", task=task.task_id, error=str(e))
+            LINKS.inc(platform=task.platform, result='failed')
+            permanent = isinstance(e, (PermanentDownloadError, FileSizeError))
+            await self._report(self.broker.fail(task.task_id, str(e), permanent), task)
+        else:
+            log("Задача выполнена", task=task.task_id)
+            LINKS.inc(platform=task.platform, result='sent')
+            await self._report(self.broker.finish(task.task_id, file_id), task)
+        finally:
+            heartbeat.cancel()
+            self._slots.release()
+
+    async def _loop(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            await self._slots.acquire()
+            # Пока ждали свободного места, воркер могли остановить
+            if stop.is_set():
+                self._slots.release()
+                break
+            task = None
+            try:
+                task = await self.broker.claim(self.name, self.platforms)
+            except Exception as e:
+                log("Ошибка при получении задачи", error=str(e))
+            if task is None:
+                self._slots.release()
+                try:
+                    await asyncio.wait_for(stop.wait(), self.broker.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            backend = self.backends.get(task.platform)
+            if backend is None:
+                try:
+                    await self.broker.fail(task.task_id, f"Неизвестная платформа: {task.platform}", permanent=True)
+                except Exception as e:
+                    log("Ошибка при завершении задачи", task=task.task_id, error=str(e))
+                    await asyncio.sleep(self.broker.poll_interval)
+                finally:
+                    self._slots.release()
+                continue
+
+            running = asyncio.create_task(self.execute(task, backend))
+            self._tasks.add(running)
+            running.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, timeout: float) -> None:
+        if not self._tasks:
+            return
+        log("Ожидаем завершения задач", tasks=len(self._tasks))
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _serve(self) -> None:
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except NotImplementedError:
+                signal.signal(sig, lambda *_: loop.call_soon_threadsafe(stop.set))
+
+        await self.bot.initialize()
+        await self.fingerprints.start()
+        await self.file_manager.start()
+        await self.metrics.start()
+        try:
+            await self._loop(stop)
+        finally:
+            log("Останавливаем воркер...")
+            await self._drain(SHUTDOWN_DRAIN_TIMEOUT)
+            await self.broker.close()
+            self.fingerprints.close()
+            self.download_pool.shutdown()
+            self.downloader.close()
+            await self.http_client.close()
+            await self.file_manager.close()
+            await self.metrics.stop()
+            await self.bot.shutdown()
+
+    def run(self):
+        log("Воркер запущен", worker=self.name, concurrency=self.concurrency)
+        asyncio.run(self._serve())
@@ -1,5 +1,7 @@
 from .tiktok import TikTokHandler
 from .instagram import InstagramHandler
 from .youtube import YouTubeHandler
+from .dispatcher import LinkDispatcher
+from .inline import InlineHandler
 
-__all__ = ['TikTokHandler', 'InstagramHandler', 'YouTubeHandler'] 
\ No newline at end of file
+__all__ = ['TikTokHandler', 'InstagramHandler', 'YouTubeHandler', 'LinkDispatcher', 'InlineHandler'] 
\ No newline at end of file
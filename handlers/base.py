@@ -1,21 +1,125 @@
-from collections import OrderedDict
-from abc import ABC, abstractmethod
-from telegram.ext import MessageHandler, filters
-from config.chat_manager import ChatManager
+import re
+from abc import ABC
+from pathlib import Path
+from config.settings import PATTERNS
+from services.downloader import VideoDownloader
+from services.media import PreparedVideo
+from services.media_probe import MediaInfo, MediaProbe
+from services.metrics import stage
+from services.resolver import LinkResolver
+from services.tracing import log
 
 class BaseHandler(ABC):
-    def __init__(self, chat_manager: ChatManager):
-        self.filter = self._create_filter()
-        self.url_to_file_id = OrderedDict()
-        self.chat_manager = chat_manager  # Используем переданный экземпляр ChatManager
-
-    @abstractmethod
-    def _create_filter(self):
-        pass
-    
-    @abstractmethod
-    async def handle(self, update, context):
-        pass
-    
-    def get_handler(self):
-        return MessageHandler(self.filter, self.handle) 
\ No newline at end of file
+    """
+    Обработчик ссылок одной платформы. Ссылки из сообщений ему
+    передает LinkDispatcher по домену из hosts.
+    """
+    platform: str = ''
+    hosts: tuple = ()  # Домены платформы (поддомены подходят автоматически)
+
+    def __init__(self, resolver: LinkResolver, downloader: VideoDownloader, probe: MediaProbe):
+        self.pattern = re.compile(PATTERNS[self.platform])
+        self.resolver = resolver  # Разворачивает короткие ссылки
+        self.downloader = downloader
+        self.probe = probe  # Размеры, длительность и превью видео
+        self.file_manager = downloader.file_manager
+
+    def match_link(self, candidate: str) -> str | None:
+        """Проверяет ссылку шаблоном платформы, возвращает ссылку на видео"""
+        match = self.pattern.match(candidate)
+        return match.group(0) if match else None
+
+    def get_video_id(self, url: str) -> str | None:
+        """Извлекает идентификатор видео из полной ссылки"""
+        return None
+
+    def is_short_link(self, url: str) -> bool:
+        """Проверяет, нужно ли разворачивать ссылку редиректом"""
+        return False
+
+    async def resolve_key(self, url_no_params: str) -> str:
+        """
+        Ключ кэша file_id вида "платформа:id видео", не зависящий от того,
+        какую форму ссылки прислал пользователь
+        """
+        url = url_no_params
+        if self.is_short_link(url):
+            with stage(self.platform, 'resolve'):
+                url = await self.resolver.expand(url)
+
+        video_id = self.get_video_id(url)
+        if video_id:
+            return f"{self.platform}:{video_id}"
+        # Не удалось распознать id — используем саму ссылку
+        url_no_params = re.sub(r'\?.*$', '', url).rstrip('/')
+        return f"{self.platform}:{url_no_params}"
+
+    async def probe_media(self, key: str | None, info: dict, fmt: dict | None = None, **kwargs) -> MediaInfo:
+        """Размеры, длительность и превью видео с замером этапа probe"""
+        with stage(self.platform, 'probe'):
+            return await self.probe.probe(key, info, fmt, **kwargs)
+
+    async def download(self, url_no_params: str, info: dict | None = None, key: str | None = None) -> PreparedVideo:
+        """
+        Скачивает видео в формате, который помещается в лимит загрузки.
+        Небольшие ролики загружаются в память без записи на диск,
+        остальные — во временный файл.
+
+        Raises:
+            DownloadError: если загрузка не удалась
+        """
+        if info is None:
+            info = await self.downloader.extract_info(url_no_params, self.platform)
+
+        plan = self.downloader.plan(info)
+        if plan is not None and plan.single is not None and not plan.transcode:
+            buffer = await self.downloader.download_to_buffer(info, plan.single, self.platform)
+            if buffer is not None:
+                log("Получено видео в память", platform=self.platform, key=key)
+                media_info = await self.probe_media(key, info, plan.single)
+                return PreparedVideo(buffer, media_info, cleanup=buffer.close)
+
+        # Ждем свободного места, если временный каталог заполнен
+        filename = await self.file_manager.allocate(self.platform, self.downloader.scratch_size(plan))
+        downloaded_file = await self.downloader.download(url_no_params, filename, self.platform, info, plan)
+        log("Получено видео", platform=self.platform, key=key)
+        try:
+            media_info = await self.probe_media(
+                key, info,
+                fmt=plan.formats[0] if plan else None,
+                path=downloaded_file,
+                # Перекодированное видео могло быть уменьшено
+                trust_info=not (plan and plan.transcode)
+            )
+        except BaseException:
+            self.file_manager.release(filename)
+            raise
+        return PreparedVideo(
+            Path(downloaded_file),
+            media_info,
+            cleanup=lambda: self.file_manager.release(filename)
+        )
+
+    async def fetch(self, url_no_params: str, key: str | None = None) -> PreparedVideo:
+        """
+        Готовит видео к отправке. Сначала получаем только метаданные и,
+        если есть подходящий формат, отдаем Telegram прямую ссылку, чтобы
+        он скачал файл сам. Если Telegram ссылку не примет, скачиваем видео.
+        key — ключ видео, по которому кэшируются его размеры и превью.
+
+        Raises:
+            DownloadError: если видео получить не удалось
+        """
+        info = await self.downloader.extract_info(url_no_params, self.platform)
+
+        direct_format = self.downloader.direct_format(info)
+        if direct_format:
+            log("Отправляем видео ссылкой", platform=self.platform, key=key)
+            media_info = await self.probe_media(key, info, direct_format)
+            return PreparedVideo(
+                direct_format['url'],
+                media_info,
+                fallback=lambda: self.download(url_no_params, info, key)
+            )
+
+        return await self.download(url_no_params, info, key)
\ No newline at end of file
@@ -1,22 +1,47 @@
-from telegram import Update
+from telegram import InputFile, Update
 from telegram.ext import CommandHandler, ContextTypes, filters
 from config.settings import AUTH_CHAT_ID
 from config.chat_manager import ChatManager
+from services.cache import FileIdCache
+from services.download_pool import DownloadPool
+from services.file_manager import FileManager
+from services.scheduler import FairScheduler
+from .warmer import CacheWarmer
 
 class BotCommands:
-    def __init__(self, chat_manager: ChatManager):
+    def __init__(
+        self,
+        chat_manager: ChatManager,
+        download_pool: DownloadPool,
+        scheduler: FairScheduler,
+        file_manager: FileManager,
+        cache: FileIdCache,
+        warmer: CacheWarmer
+    ):
         self.chat_manager = chat_manager
+        self.download_pool = download_pool
+        self.scheduler = scheduler
+        self.file_manager = file_manager
+        self.cache = cache
+        self.warmer = warmer
 
     def get_handlers(self):
         """Возвращает список всех обработчиков команд для управления чатами"""
-        auth_chat_filter = filters.Chat(chat_id=AUTH_CHAT_ID)
+        # AUTH_CHAT_ID задается строкой, а фильтр сравнивает числовые id; без него
+        # административные команды отключены: пустой фильтр ничего не пропускает
+        auth_chat_filter = filters.Chat(chat_id=int(AUTH_CHAT_ID)) if AUTH_CHAT_ID else filters.Chat()
         
         return [
             CommandHandler('auth', self.auth),
+            # Кнопка "Авторизоваться" inline-режима открывает чат с /start auth
+            CommandHandler('start', self.auth, filters=filters.Regex(r'^/start auth$')),
             CommandHandler('add_allowed_chat', self.add_allowed_chat),
             CommandHandler('remove_allowed_chat', self.remove_allowed_chat),
             CommandHandler('add_blacklist_chat', self.add_blacklist_chat),
             CommandHandler('remove_blacklist_chat', self.remove_blacklist_chat),
+            CommandHandler('stats', self.stats, filters=auth_chat_filter),
+            CommandHandler('prewarm', self.prewarm, filters=auth_chat_filter),
+            CommandHandler('cache_export', self.cache_export, filters=auth_chat_filter),
         ]
 
     async def auth(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -142,4 +167,78 @@ class BotCommands:
             self.chat_manager.remove_blacklist_chat(chat_id)
             await update.message.reply_text(f'Чат {chat_id} удален из черного списка')
         except ValueError:
-            await update.message.reply_text('Неверный формат ID чата')
\ No newline at end of file
+            await update.message.reply_text('Неверный формат ID чата')
+
+    async def prewarm(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """
+        Загружает в кэш видео по ссылкам из команды или из файла, на
+        который команда отвечает (список ссылок или журнал /cache_export)
+        """
+        if self.warmer.storage is None:
+            await update.message.reply_text('Для прогрева кэша нужно задать STORAGE_CHAT_ID')
+            return
+
+        lines = [update.message.text or '']
+        reply = update.message.reply_to_message
+        if reply is not None and reply.document is not None:
+            file = await reply.document.get_file()
+            data = await file.download_as_bytearray()
+            lines += data.decode('utf-8', errors='replace').splitlines()
+
+        links = self.warmer.parse(lines)
+        if not links:
+            await update.message.reply_text(
+                'Использование: /prewarm <ссылки> или ответ командой на файл со ссылками'
+            )
+            return
+        await update.message.reply_text(f'Прогрев кэша начат: ссылок {len(links)}')
+
+        async def run():
+            counts = await self.warmer.prewarm(context.bot, links)
+            await update.message.reply_text(
+                f'Прогрев кэша завершен: загружено {counts["loaded"]}, '
+                f'уже были в кэше {counts["skipped"]}, ошибок {counts["failed"]}'
+            )
+
+        # Прогрев долгий: не занимаем обработчик обновлений
+        self.warmer.spawn(run())
+
+    async def cache_export(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Отправляет журнал обращений к кэшу для прогрева другого экземпляра"""
+        await update.message.reply_document(
+            document=InputFile(self.warmer.hit_log().encode(), filename='cache_hits.tsv'),
+            caption=f'Записей в кэше: {len(self.cache)}'
+        )
+
+    @staticmethod
+    def _format_scratch(area: dict) -> str:
+        used = f'{area["used"] / 1024 / 1024:.0f}'
+        if area['quota']:
+            used += f' из {area["quota"] / 1024 / 1024:.0f}'
+        return f'{used} MB, загрузок {area["jobs"]}, ждут места {area["waiting"]}'
+
+    async def stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Показывает состояние очередей загрузок"""
+        stats = self.download_pool.stats()
+        waiting = ', '.join(f'{k}: {v}' for k, v in stats['waiting'].items()) or '-'
+        running = ', '.join(f'{k}: {v}' for k, v in stats['running'].items()) or '-'
+        scheduler = self.scheduler.stats()
+        chats = ', '.join(f'{k}: {v}' for k, v in scheduler['waiting'].items()) or '-'
+        cache = self.cache.stats()
+        scratch = '; '.join(
+            f'{name}: {self._format_scratch(area)}' for name, area in self.file_manager.stats().items()
+        )
+        await update.message.reply_text(
+            f'Очередь чатов: выполняется {scheduler["active"]} из {scheduler["max_active"]}, '
+            f'ожидает {scheduler["queue_depth"]} ({chats})\n'
+            f'Пул загрузок: {stats["executor"]}, воркеров: {stats["workers"]}\n'
+            f'В очереди: {stats["queue_depth"]} ({waiting})\n'
+            f'Выполняется: {running}\n'
+            f'Завершено: {stats["completed"]}\n'
+            f'Ожидание: среднее {stats["avg_wait"]:.2f} с, '
+            f'максимальное {stats["max_wait"]:.2f} с, '
+            f'последнее {stats["last_wait"]:.2f} с\n'
+            f'Временные файлы: {scratch}\n'
+            f'Кэш file_id: {cache["entries"]} из {cache["max_entries"]}, '
+            f'повторно запрошенных {cache["protected"]}'
+        )
\ No newline at end of file
@@ -0,0 +1,488 @@
+import re
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Set, Tuple
+from urllib.parse import urlsplit
+from telegram import Bot, Chat, InputMediaVideo, Message, Update
+from telegram.ext import ContextTypes, MessageHandler, filters
+from config.chat_manager import ChatManager
+from core.exceptions import FileSizeError, PermanentDownloadError
+from services.cache import FileIdCache
+from services.fingerprint import FingerprintIndex
+from services.job_store import DONE, FAILED, Job, JobStore, group_by_message
+from services.media import PreparedVideo
+from services.metrics import (
+    BYTES, LINKS, MESSAGES_IN_PROGRESS, STAGE_SECONDS, UPLOADS_IN_PROGRESS, platform_of
+)
+from services.negative_cache import NegativeCache
+from services.rate_limit import ChatThrottle
+from services.remote import RemoteFetcher
+from services.scheduler import FairScheduler
+from services.singleflight import SingleFlight
+from services.tracing import log, new_trace
+from .base import BaseHandler
+
+# Любая http(s)-ссылка; платформа определяется по домену
+URL_PATTERN = re.compile(r"https?://[^\s]+", re.IGNORECASE)
+
+# Ограничение Telegram на количество элементов в альбоме
+MEDIA_GROUP_SIZE = 10
+
+
+def chunks(items: list, size: int = MEDIA_GROUP_SIZE) -> List[list]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+class LinkFilter(filters.MessageFilter):
+    """
+    Фильтр, который за один проход по тексту находит все ссылки
+    поддерживаемых платформ и передает их в context.links
+    """
+
+    def __init__(self, dispatcher: 'LinkDispatcher'):
+        self.dispatcher = dispatcher
+        super().__init__(name='LinkFilter', data_filter=True)
+
+    def filter(self, message: Message) -> Dict[str, List[Tuple[BaseHandler, str]]]:
+        links = self.dispatcher.extract_links(message.text or '')
+        return {'links': links} if links else {}
+
+
+class LinkDispatcher:
+    """
+    Единый обработчик ссылок на видео. Сообщение сканируется одним
+    регулярным выражением, а каждая найденная ссылка передается
+    обработчику платформы по домену, поэтому стоимость фильтрации
+    не растет с добавлением платформ.
+    """
+
+    def __init__(
+        self,
+        chat_manager: ChatManager,
+        cache: FileIdCache,
+        inflight: SingleFlight,
+        scheduler: FairScheduler,
+        throttle: ChatThrottle,
+        jobs: JobStore,
+        fingerprints: FingerprintIndex,
+        backends: List[BaseHandler],
+        remote: RemoteFetcher | None = None
+    ):
+        self.chat_manager = chat_manager
+        self.cache = cache  # Общий для всех платформ кэш file_id
+        self.inflight = inflight  # Общая таблица выполняющихся загрузок
+        self.scheduler = scheduler  # Очередь загрузок между чатами
+        self.throttle = throttle  # Ограничение частоты сообщений в чат
+        self.jobs = jobs  # Постоянная очередь принятых ссылок
+        # Отпечатки содержимого: одно видео по разным ссылкам отправляется по file_id
+        self.fingerprints = fingerprints
+        # В режиме воркеров видео загружают они, бот только отправляет file_id
+        self.remote = remote
+        # Видео, которые недавно не удалось загрузить окончательно
+        self.negative = NegativeCache()
+        # (chat_id, message_id, key) заданий, которые сейчас выполняются
+        self._active_jobs: Set[Tuple[int, int, str]] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.backends = {backend.platform: backend for backend in backends}
+        # Домен -> обработчик платформы
+        self.hosts: Dict[str, BaseHandler] = {
+            host: backend for backend in backends for host in backend.hosts
+        }
+
+    def get_backend(self, candidate: str) -> BaseHandler | None:
+        """Находит обработчик по домену ссылки, учитывая поддомены"""
+        try:
+            host = urlsplit(candidate).hostname
+        except ValueError:
+            return None
+        if not host:
+            return None
+
+        # vt.tiktok.com -> tiktok.com -> com
+        labels = host.split('.')
+        for i in range(len(labels) - 1):
+            backend = self.hosts.get('.'.join(labels[i:]))
+            if backend:
+                return backend
+        return None
+
+    def extract_links(self, text: str) -> List[Tuple[BaseHandler, str]]:
+        """Возвращает все поддерживаемые ссылки сообщения с их обработчиками"""
+        links = []
+        seen = set()
+        for match in URL_PATTERN.finditer(text):
+            candidate = match.group(0)
+            backend = self.get_backend(candidate)
+            if not backend:
+                continue
+            url = backend.match_link(candidate)
+            if url and url not in seen:
+                seen.add(url)
+                links.append((backend, url))
+        return links
+
+    async def handle(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        message = update.message
+
+        if not self.chat_manager.is_allowed_chat(message.chat_id):
+            await self.reply_text(message, "Для загрузки видео необходимо авторизоваться. Используйте команду /auth")
+            return
+
+        await self.process(message, context.links)
+
+    async def process(self, message: Message, links: List[Tuple[BaseHandler, str]]) -> None:
+        """
+        Доставляет видео по ссылкам сообщения. Ссылки сохраняются в
+        очередь заданий до ответа и отмечаются выполненными сразу после
+        него, поэтому прерванная доставка повторится после перезапуска.
+        Каждое сообщение получает trace id, который попадает в логи всех этапов.
+        """
+        new_trace()
+        log("Сообщение со ссылками", chat=message.chat_id, message=message.message_id, links=len(links))
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            with MESSAGES_IN_PROGRESS.track():
+                await self._process(message, links)
+        finally:
+            self._tasks.discard(task)
+
+    async def _process(self, message: Message, links: List[Tuple[BaseHandler, str]]) -> None:
+        # Очищаем URL от GET-параметров, чтобы у нас был базовый ключ для кэша
+        links = [(backend, re.sub(r'\?.*$', '', url)) for backend, url in links]
+        keys = await asyncio.gather(*(backend.resolve_key(url) for backend, url in links))
+
+        # Разные формы ссылки на одно видео обрабатываем один раз
+        items: Dict[str, Tuple[BaseHandler, str]] = {}
+        for key, link in zip(keys, links):
+            items.setdefault(key, link)
+
+        finished = await self.jobs.add([
+            Job(message.chat_id, message.message_id, message.chat.type, key, backend.platform, url)
+            for key, (backend, url) in items.items()
+        ])
+        # Уже доставленные видео (Telegram мог прислать обновление повторно)
+        # и задания, которые выполняются прямо сейчас, пропускаем
+        claimed = set()
+        for key in list(items):
+            job_id = (message.chat_id, message.message_id, key)
+            if key in finished or job_id in self._active_jobs:
+                del items[key]
+            else:
+                claimed.add(job_id)
+        self._active_jobs |= claimed
+        try:
+            await self._deliver_items(message, items)
+        finally:
+            self._active_jobs -= claimed
+
+    async def _deliver_items(self, message: Message, items: Dict[str, Tuple[BaseHandler, str]]) -> None:
+        hits, misses, known_failures = [], [], []
+        for key, (backend, url) in items.items():
+            file_id = self.cache.get(key)
+            if file_id:
+                hits.append((key, file_id))
+            elif self.negative.get(key):
+                known_failures.append(key)
+            else:
+                misses.append((key, backend, url))
+
+        # Приватные и удаленные видео не загружаем повторно
+        for key in known_failures:
+            log("Видео недавно не удалось загрузить, отвечаем сразу", key=key)
+            LINKS.inc(platform=platform_of(key), result='known_failure')
+            await self.reply_text(message, f"Не удалось загрузить видео: {self.negative.get(key)}")
+            await self.complete(message, [key], FAILED)
+
+        # Попадания в кэш отправляем сразу, параллельно с загрузкой остальных
+        stale_keys, _ = await asyncio.gather(
+            self._send_hits(message, hits),
+            self.deliver(message, misses)
+        )
+        sent_keys = [key for key, _ in hits if key not in stale_keys]
+        if sent_keys:
+            log("Видео отправлено из памяти", sent=len(sent_keys))
+        for key in sent_keys:
+            LINKS.inc(platform=platform_of(key), result='cache_hit')
+        await self.complete(message, sent_keys)
+
+        if stale_keys:
+            # Возможно, file_id устарел. Удаляем его и загружаем заново
+            log("Не удалось отправить видео из памяти. Попробую загрузить заново", stale=len(stale_keys))
+            for key in stale_keys:
+                self.cache.delete(key)
+            await self.deliver(message, [(key, *items[key]) for key in stale_keys])
+
+    async def _send_hits(self, message: Message, hits: List[Tuple[str, str]]) -> List[str]:
+        """Отправляет попадания в кэш с замером этапа cache_send"""
+        if not hits:
+            return []
+        started = time.perf_counter()
+        failed = await self.send_file_ids(message, hits)
+        elapsed = time.perf_counter() - started
+        for key, _ in hits:
+            status = 'error' if key in failed else 'ok'
+            STAGE_SECONDS.observe(elapsed, platform=platform_of(key), stage='cache_send', status=status)
+        return failed
+
+    async def deliver(self, message: Message, misses: List[Tuple[str, BaseHandler, str]]) -> None:
+        """
+        Загружает и отправляет видео, которых нет в кэше. Загрузки
+        проходят через справедливую очередь чатов.
+        Одновременные запросы одного видео загружаются один раз:
+        остальные чаты получают видео по file_id первой загрузки.
+        """
+        own, shared = [], []
+        for key, backend, url in misses:
+            future = self.inflight.claim(key)
+            if future is None:
+                own.append((key, backend, url))
+            else:
+                shared.append((key, future))
+
+        # Собственные загрузки не ждут чужих, поэтому взаимных блокировок нет
+        await asyncio.gather(
+            self._deliver_own(message, own),
+            self._deliver_shared(message, shared)
+        )
+
+    async def _deliver_own(self, message: Message, own: List[Tuple[str, BaseHandler, str]]) -> None:
+        prepared: List[Tuple[str, PreparedVideo]] = []
+        urls = {key: url for key, _, url in own}
+        try:
+            results = await asyncio.gather(
+                *(
+                    self.scheduler.run(message.chat_id, self._fetch_queued, backend, url, key, time.perf_counter())
+                    for key, backend, url in own
+                ),
+                return_exceptions=True
+            )
+            for (key, _, _), result in zip(own, results):
+                if isinstance(result, BaseException):
+                    log("Ошибка при загрузке видео", key=key, error=str(result))
+                    LINKS.inc(platform=platform_of(key), result='failed')
+                    if isinstance(result, (PermanentDownloadError, FileSizeError)):
+                        self.negative.add(key, str(result))
+                    self.inflight.resolve(key, None)
+                    await self.reply_text(message, f"Не удалось загрузить видео: {str(result)}")
+                    await self.complete(message, [key], FAILED)
+                else:
+                    prepared.append((key, result))
+
+            for batch in chunks(prepared):
+                file_ids = await self._upload(message, batch)
+                for (key, _), file_id in zip(batch, file_ids):
+                    # Сохраняем file_id в общий кэш
+                    if file_id:
+                        self.cache.set(key, file_id, urls[key])
+                    self.inflight.resolve(key, file_id)
+                    LINKS.inc(platform=platform_of(key), result='sent' if file_id else 'failed')
+                await self.complete(message, [key for key, _ in batch])
+        finally:
+            for _, video in prepared:
+                video.cleanup()
+            # Освобождаем ключи, если отправка прервалась
+            for key, _, _ in own:
+                self.inflight.resolve(key, None)
+
+    async def _upload(self, message: Message, batch: List[Tuple[str, PreparedVideo]]) -> List[str | None]:
+        """
+        Отправляет подготовленные видео с замером этапа upload и объема.
+        Видео, которые уже есть в Telegram под другой ссылкой, уходят по file_id.
+        """
+        videos = await asyncio.gather(
+            *(self.fingerprints.dedupe(video, platform_of(key)) for key, video in batch)
+        )
+        sizes = [video.upload_size() for video in videos]
+        started = time.perf_counter()
+        with UPLOADS_IN_PROGRESS.track():
+            file_ids = await self.send_prepared(message, videos)
+        elapsed = time.perf_counter() - started
+        for video, file_id in zip(videos, file_ids):
+            await self.fingerprints.remember(video, file_id)
+        for (key, _), size, file_id in zip(batch, sizes, file_ids):
+            platform = platform_of(key)
+            STAGE_SECONDS.observe(elapsed, platform=platform, stage='upload', status='ok' if file_id else 'error')
+            if file_id and size:
+                BYTES.inc(size, platform=platform, direction='upload')
+        log("Видео отправлено", keys=','.join(key for key, _ in batch), seconds=round(elapsed, 3))
+        return file_ids
+
+    async def _fetch_queued(self, backend: BaseHandler, url: str, key: str, queued_at: float) -> PreparedVideo:
+        """Вызывается, когда очередь чатов выдала слот; замеряет ожидание в ней"""
+        STAGE_SECONDS.observe(time.perf_counter() - queued_at, platform=backend.platform, stage='queue', status='ok')
+        return await self.fetch(backend, url, key)
+
+    async def fetch(self, backend: BaseHandler, url: str, key: str) -> PreparedVideo:
+        """Готовит видео к отправке локально или через воркеры"""
+        if self.remote is not None:
+            return await self.remote.fetch(backend.platform, url, key)
+        return await backend.fetch(url, key)
+
+    async def _deliver_shared(self, message: Message, shared: List[Tuple[str, asyncio.Future]]) -> None:
+        if not shared:
+            return
+        # shield: отмена ожидающего не должна отменять общий результат
+        results = await asyncio.gather(
+            *(asyncio.shield(future) for _, future in shared),
+            return_exceptions=True
+        )
+        ready = []
+        for (key, _), file_id in zip(shared, results):
+            if isinstance(file_id, str):
+                ready.append((key, file_id))
+            else:
+                LINKS.inc(platform=platform_of(key), result='failed')
+                await self.reply_text(message, "Не удалось загрузить видео")
+
+        failed = await self.send_file_ids(message, ready)
+        for key, _ in ready:
+            LINKS.inc(platform=platform_of(key), result='failed' if key in failed else 'shared')
+        if failed:
+            await self.reply_text(message, "Не удалось отправить видео")
+        elif ready:
+            log("Видео отправлено по результату параллельной загрузки", sent=len(ready))
+        await self.complete(message, [key for key, _ in shared])
+
+    async def send_file_ids(self, message: Message, items: List[Tuple[str, str]]) -> List[str]:
+        """
+        Отправляет видео по file_id альбомами до 10 штук
+        Returns: ключи видео, которые отправить не удалось
+        """
+        failed = []
+        for batch in chunks(items):
+            if len(batch) > 1:
+                try:
+                    await self.throttle.send(
+                        message.chat_id,
+                        lambda: message.reply_media_group(
+                            media=[InputMediaVideo(media=file_id, caption='') for _, file_id in batch]
+                        ),
+                        messages=len(batch)
+                    )
+                    continue
+                except Exception as e:
+                    log("Не удалось отправить альбом, отправляем по одному", error=str(e))
+
+            for key, file_id in batch:
+                try:
+                    await self.throttle.send(
+                        message.chat_id,
+                        lambda: message.reply_video(video=file_id, caption='')
+                    )
+                except Exception as e:
+                    log("Не удалось отправить видео по file_id", key=key, error=str(e))
+                    failed.append(key)
+        return failed
+
+    async def send_prepared(self, message: Message, videos: List[PreparedVideo]) -> List[str | None]:
+        """
+        Отправляет подготовленные видео одним альбомом (до 10 штук)
+        Returns: file_id отправленных видео в том же порядке
+        """
+        if len(videos) > 1:
+            try:
+                sent_messages = await self.throttle.send(
+                    message.chat_id,
+                    lambda: message.reply_media_group(media=[video.input_media() for video in videos]),
+                    messages=len(videos)
+                )
+                return [sent.video.file_id if sent.video else None for sent in sent_messages]
+            except Exception as e:
+                log("Не удалось отправить альбом, отправляем по одному", error=str(e))
+
+        return [await self.send_video(message, video) for video in videos]
+
+    async def send_video(self, message: Message, video: PreparedVideo) -> str | None:
+        """Отправляет одно видео, при отказе Telegram пробует запасной вариант"""
+        try:
+            sent_message = await self.throttle.send(
+                message.chat_id,
+                lambda: message.reply_video(**video.reply_kwargs())
+            )
+            return sent_message.video.file_id
+        except Exception as e:
+            if video.fallback is None:
+                log("Ошибка при отправке видео", error=str(e))
+                await self.reply_text(message, "Не удалось отправить видео")
+                return None
+            log("Telegram не принял видео, пробуем запасной вариант", error=str(e))
+
+        try:
+            fallback_video = await self.scheduler.run(message.chat_id, video.fallback)
+        except Exception as e:
+            log("Ошибка при скачивании/отправке файла", error=str(e))
+            await self.reply_text(message, f"Не удалось загрузить видео: {str(e)}")
+            return None
+        try:
+            return await self.send_video(message, fallback_video)
+        finally:
+            fallback_video.cleanup()
+
+    async def complete(self, message: Message, keys: List[str], status: str = DONE) -> None:
+        """Отмечает задания сообщения выполненными"""
+        await self.jobs.complete(message.chat_id, message.message_id, keys, status)
+
+    async def replay(self, bot: Bot) -> None:
+        """
+        Повторяет задания, не завершенные до перезапуска. Видео
+        отправляются ответом на исходное сообщение.
+        """
+        pending = await self.jobs.take_pending()
+        if not pending:
+            return
+        log("Повторяем незавершенные задания", jobs=len(pending))
+
+        replays = []
+        for (chat_id, message_id, chat_type), jobs in group_by_message(pending):
+            links = [(self.backends[job.platform], job.url) for job in jobs if job.platform in self.backends]
+            if not links or not self.chat_manager.is_allowed_chat(chat_id):
+                await self.jobs.complete(chat_id, message_id, [job.key for job in jobs], FAILED)
+                continue
+
+            message = Message(
+                message_id=message_id,
+                date=datetime.now(timezone.utc),
+                chat=Chat(id=chat_id, type=chat_type)
+            )
+            message.set_bot(bot)
+            replays.append(self.process(message, links))
+
+        results = await asyncio.gather(*replays, return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                log("Ошибка при повторе задания", error=str(result))
+
+    def spawn(self, coro) -> asyncio.Task:
+        """Запускает фоновую доставку, которую drain дождется при остановке"""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def drain(self, timeout: float) -> None:
+        """
+        Ждет завершения текущих доставок не дольше timeout секунд.
+        Оставшиеся отменяются и повторятся при следующем запуске.
+        """
+        tasks = set(self._tasks)
+        if not tasks:
+            return
+        log("Ожидаем завершения доставок", deliveries=len(tasks))
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            log("Не успели завершиться, повторим после перезапуска", deliveries=len(pending))
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def reply_text(self, message: Message, text: str) -> None:
+        """Текстовый ответ с учетом ограничения частоты сообщений"""
+        await self.throttle.send(message.chat_id, lambda: message.reply_text(text))
+
+    def get_handler(self):
+        return MessageHandler(
+            filters.TEXT & ~filters.COMMAND & LinkFilter(self),
+            self.handle
+        )
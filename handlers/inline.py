@@ -0,0 +1,158 @@
+import re
+import asyncio
+import hashlib
+from typing import Dict
+from telegram import (
+    Bot, InlineQueryResultArticle, InlineQueryResultCachedVideo, InlineQueryResultsButton,
+    InputTextMessageContent, Update
+)
+from telegram.ext import ContextTypes, InlineQueryHandler
+from config.chat_manager import ChatManager
+from config.settings import INLINE_CACHE_TIME, INLINE_FETCH_WAIT, INLINE_DEBOUNCE
+from services.metrics import LINKS
+from services.tracing import log, new_trace
+from .base import BaseHandler
+from .dispatcher import LinkDispatcher
+from .warmer import CacheWarmer
+
+
+def result_id(key: str) -> str:
+    """id результата inline-запроса: не длиннее 64 байт"""
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+class InlineHandler:
+    """
+    Inline-режим: "@бот ссылка" в любом чате. Видео из кэша file_id
+    предлагается сразу. Иначе начинается загрузка в служебный чат:
+    если она не успела за fetch_wait секунд, пользователь видит
+    заглушку, а повторный запрос получит видео из кэша.
+    """
+
+    def __init__(
+        self,
+        chat_manager: ChatManager,
+        dispatcher: LinkDispatcher,
+        warmer: CacheWarmer,
+        cache_time: int = INLINE_CACHE_TIME,
+        fetch_wait: float = INLINE_FETCH_WAIT,
+        debounce: float = INLINE_DEBOUNCE
+    ):
+        self.chat_manager = chat_manager
+        # Общие с сообщениями кэш, очередь загрузок и таблица выполняющихся загрузок
+        self.dispatcher = dispatcher
+        self.warmer = warmer  # Фоновая загрузка в служебный чат
+        self.cache_time = cache_time
+        self.fetch_wait = fetch_wait
+        self.debounce = debounce
+        # user_id -> номер последнего inline-запроса пользователя
+        self._latest: Dict[int, int] = {}
+
+    def is_allowed(self, user_id: int) -> bool:
+        """Inline-запрос приходит не из чата: проверяем личный чат пользователя с ботом"""
+        return (
+            self.chat_manager.is_allowed_chat(user_id)
+            and not self.chat_manager.is_blacklisted_chat(user_id)
+        )
+
+    @staticmethod
+    def is_complete(backend: BaseHandler, url: str) -> bool:
+        """Ссылка содержит id видео (или это короткая ссылка), а не набирается"""
+        return backend.is_short_link(url) or backend.get_video_id(url) is not None
+
+    async def settle(self, user_id: int) -> bool:
+        """
+        Ждет debounce секунд
+        Returns: False, если за это время пришел более новый запрос пользователя
+        """
+        number = self._latest[user_id] = self._latest.get(user_id, 0) + 1
+        await asyncio.sleep(self.debounce)
+        if self._latest.get(user_id) != number:
+            return False
+        del self._latest[user_id]
+        return True
+
+    async def handle(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.inline_query
+        user_id = query.from_user.id
+
+        # Ответы личные: Telegram не должен показывать их другим пользователям
+        if not self.is_allowed(user_id):
+            await query.answer(
+                [],
+                cache_time=0,
+                is_personal=True,
+                button=InlineQueryResultsButton(text="Авторизоваться", start_parameter='auth')
+            )
+            return
+
+        links = self.dispatcher.extract_links(query.query)
+        backend, url = links[0] if links else (None, '')
+        url = re.sub(r'\?.*$', '', url)
+        if backend is None or not self.is_complete(backend, url):
+            await query.answer([], cache_time=0, is_personal=True)
+            return
+
+        new_trace()
+        # Ключ полной ссылки вычисляется без сетевых запросов, короткую
+        # разворачиваем только после паузы в наборе
+        key = None if backend.is_short_link(url) else await backend.resolve_key(url)
+        file_id = self.dispatcher.cache.get(key) if key else None
+        if not file_id:
+            if not await self.settle(user_id):
+                # Пользователь продолжает печатать: ответим на следующий запрос
+                return
+            if key is None:
+                key = await backend.resolve_key(url)
+                file_id = self.dispatcher.cache.get(key)
+        log("Inline-запрос", user=user_id, key=key)
+
+        if file_id:
+            LINKS.inc(platform=backend.platform, result='inline_hit')
+        else:
+            error = self.dispatcher.negative.get(key)
+            if error:
+                LINKS.inc(platform=backend.platform, result='known_failure')
+                await self.answer_text(query, key, "Не удалось загрузить видео", error, url)
+                return
+            file_id = await self.wait_fetch(context.bot, user_id, backend, url, key)
+
+        if file_id:
+            await query.answer(
+                [InlineQueryResultCachedVideo(id=result_id(key), video_file_id=file_id, title="Видео", description=url)],
+                cache_time=self.cache_time,
+                is_personal=True
+            )
+        else:
+            await self.answer_text(query, key, "Видео загружается…", "Повторите запрос через несколько секунд", url)
+
+    async def answer_text(self, query, key: str, title: str, description: str, url: str) -> None:
+        """Ответ-заглушка; при выборе в чат отправляется сама ссылка"""
+        await query.answer(
+            [InlineQueryResultArticle(
+                id=result_id(key),
+                title=title,
+                description=description,
+                input_message_content=InputTextMessageContent(url)
+            )],
+            cache_time=0,
+            is_personal=True
+        )
+
+    async def wait_fetch(self, bot: Bot, user_id: int, backend: BaseHandler, url: str, key: str) -> str | None:
+        """
+        Запускает загрузку (или присоединяется к уже идущей) и ждет ее
+        не дольше fetch_wait секунд
+        Returns: file_id или None, если загрузка еще не завершилась или не удалась
+        """
+        future = self.dispatcher.inflight.claim(key)
+        if future is None:
+            future = self.dispatcher.spawn(self.warmer.prefetch(bot, user_id, backend, url, key))
+        try:
+            # shield: загрузка продолжается и после ответа заглушкой
+            return await asyncio.wait_for(asyncio.shield(future), self.fetch_wait)
+        except asyncio.TimeoutError:
+            return None
+
+    def get_handler(self):
+        return InlineQueryHandler(self.handle)
@@ -1,24 +1,34 @@
 import re
-import requests
-from telegram import Update
-from telegram.ext import ContextTypes, filters
-from config.settings import PATTERNS, INSTAGRAM_CREDENTIALS
+import asyncio
+import aiohttp
+from config.settings import INSTAGRAM_CREDENTIALS, INSTAGRAM_API_CONCURRENCY
 from .base import BaseHandler
 from services.downloader import VideoDownloader
-from services.file_manager import FileManager
-from config.chat_manager import ChatManager
+from services.circuit_breaker import CircuitBreaker
+from services.http_client import HttpClient
+from services.media import PreparedVideo
+from services.media_probe import MediaProbe
+from services.metrics import stage
+from services.resolver import LinkResolver
+from services.tracing import log
 
 
 class InstagramHandler(BaseHandler):
-    MAX_ENTRIES = 5000  # Максимальное количество сохранённых связок
+    platform = 'instagram'
+    hosts = ('instagram.com',)
     
-    def __init__(self, chat_manager: ChatManager):
-        self.downloader = VideoDownloader()
-        self.file_manager = FileManager()
-        super().__init__(chat_manager)
-
-    def _create_filter(self):
-        return filters.TEXT & ~filters.COMMAND & filters.Regex(PATTERNS['instagram'])
+    def __init__(
+        self,
+        resolver: LinkResolver,
+        downloader: VideoDownloader,
+        probe: MediaProbe,
+        http_client: HttpClient
+    ):
+        self.http_client = http_client
+        self.api_semaphore = asyncio.Semaphore(INSTAGRAM_API_CONCURRENCY)
+        # Пока API отвечает ошибками или просит войти, сразу идем в yt-dlp
+        self.api_breaker = CircuitBreaker('instagram_api')
+        super().__init__(resolver, downloader, probe)
 
     def get_id(self, url: str) -> str:
         """Извлекает идентификатор (p/reels/reel/stories) из ссылки."""
@@ -27,119 +37,95 @@ class InstagramHandler(BaseHandler):
             url
         )
         return match.group(2) if match else None
+
+    def get_video_id(self, url: str) -> str | None:
+        return self.get_id(url)
     
-    def get_video_url(self, url: str) -> str | None:
+    async def get_video_info(self, url: str) -> dict | None:
         """
         Пытается достать прямую ссылку на видео из Instagram, используя
         внутренние API (подстановка __a=1&__d=dis).
+
+        Returns: словарь в формате info dict yt-dlp (url, размеры,
+        длительность, превью) или None
         """
         ig_id = self.get_id(url)
         if not ig_id:
             return None
+        if not self.api_breaker.allow():
+            log("API Instagram временно отключено")
+            return None
 
         params = {
         "__a": "1",
         "__d": "dis"
         }
+        # aiohttp не распаковывает brotli без дополнительного пакета
+        headers = {**INSTAGRAM_CREDENTIALS['headers'], "Accept-Encoding": "gzip, deflate"}
 
+        # Любой выход без успешного ответа (в том числе отмена задачи) считается
+        # ошибкой, иначе пробный запрос оставил бы выключатель полуоткрытым
+        succeeded = False
         try:
-            response = requests.get(
-                f"https://www.instagram.com/p/{ig_id}",
-                headers=INSTAGRAM_CREDENTIALS['headers'],
-                cookies=INSTAGRAM_CREDENTIALS['cookies'],
-                params=params,
-                timeout=15
-            )
-            response.raise_for_status()
-            
-            json_data = response.json()
+            async with self.api_semaphore:
+                with stage(self.platform, 'api'):
+                    json_data = await self.http_client.get_json(
+                        f"https://www.instagram.com/p/{ig_id}",
+                        headers=headers,
+                        cookies=INSTAGRAM_CREDENTIALS['cookies'],
+                        params=params
+                    )
+            if json_data.get('require_login') or 'items' not in json_data:
+                raise ValueError("API Instagram требует авторизацию")
+            self.api_breaker.record_success()
+            succeeded = True
+
             items = json_data.get('items', [{}])
             if not items:
                 return None
 
-            video_versions = items[0].get('video_versions')
-            if not video_versions:
+            item = items[0]
+            video_versions = item.get('video_versions')
+            if not video_versions or not video_versions[0].get('url'):
                 return None
-            return video_versions[0].get('url')
+            video = video_versions[0]
+            thumbnails = (item.get('image_versions2') or {}).get('candidates') or []
+            return {
+                'url': video['url'],
+                'ext': 'mp4',
+                'width': video.get('width') or item.get('original_width'),
+                'height': video.get('height') or item.get('original_height'),
+                'duration': item.get('video_duration'),
+                'thumbnails': thumbnails,
+                'thumbnail': thumbnails[-1].get('url') if thumbnails else None
+            }
 
-        except (requests.RequestException, ValueError, IndexError) as e:
-            print(f"Ошибка при получении URL видео: {str(e)}")
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            log("Ошибка при получении URL видео", error=str(e))
+            return None
+        except (IndexError, AttributeError) as e:
+            log("Неожиданный ответ API Instagram", error=str(e))
             return None
+        finally:
+            if not succeeded:
+                self.api_breaker.record_failure()
 
-    async def send_and_store_video(self, message, url_no_params: str):
+    async def fetch(self, url_no_params: str, key: str | None = None) -> PreparedVideo:
         """
-        Сначала пытаемся получить прямую ссылку на видео через get_video_url.
-        Если ссылка получена, пытаемся её скачать и отправить. Если не удалось,
-        отсылаем сообщение об ошибке.
+        Сначала пытаемся получить прямую ссылку на видео через get_video_info,
+        чтобы Telegram скачал файл сам. Если ссылки нет, используем
+        метаданные библиотеки, а если Telegram ссылку не примет — скачиваем видео.
         """
-        print('Пробуем получить ссылку на видео из инсты через API')
-        video_url = self.get_video_url(url_no_params)
-        if not video_url:
-            try:
-                # Если ссылка получена, пытаемся скачать файл и отправить
-                print("Не удалось получить ссылку на видео по API. Качаем видео через библиотеку")
-                filename = self.file_manager.generate_filename("instagram")
-                downloaded_file = await self.downloader.download(url_no_params, filename)
-                sent_message = await message.reply_video(
-                    video=downloaded_file,
-                    caption="",
-                    width=1080,
-                    height=1920
-                )
-            except Exception as e:
-                print(f"Ошибка при скачивании/отправке файла: {str(e)}")
-                return
-            finally:
-                # В любом случае чистим временный файл
-                self.file_manager.cleanup_file(filename)
-            
-        else:
-            try:
-                print(f"Ссылка на видео по API получена")
-                sent_message = await message.reply_video(
-                    video=video_url,
-                    caption="",
-                        width=1080,
-                        height=1920
-                    )
-            except Exception as e:
-                print(f"Ошибка при отправке видео: {str(e)}")
-                return
-
-        # Сохраняем file_id для кэширования
-        file_id = sent_message.video.file_id
-        if url_no_params in self.url_to_file_id:
-            del self.url_to_file_id[url_no_params]
-        self.url_to_file_id[url_no_params] = file_id
-        
-        # Если кэш слишком большой — подчищаем
-        if len(self.url_to_file_id) > self.MAX_ENTRIES:
-            self.url_to_file_id.popitem(last=False)
+        log("Пробуем получить ссылку на видео из инсты через API", key=key)
+        video_info = await self.get_video_info(url_no_params)
+        if video_info:
+            log("Ссылка на видео по API получена", key=key)
+            media_info = await self.probe_media(key, video_info)
+            return PreparedVideo(
+                video_info['url'],
+                media_info,
+                fallback=lambda: self.download(url_no_params, key=key)
+            )
 
-    async def handle(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        message = update.message
-        if not self.chat_manager.is_allowed_chat(message.chat_id):
-            await message.reply_text("Для загрузки видео необходимо авторизоваться. Используйте команду /auth")
-            return
-        
-        # Проверяем, есть ли URL из Instagram в тексте
-        url_match = re.search(PATTERNS['instagram'], message.text)
-        if not url_match:
-            return
-        
-        # Очищаем URL от GET-параметров, чтобы у нас был базовый ключ для кэша
-        url_no_params = re.sub(r'\?.*$', '', url_match.group(0))
-        
-        # Если уже загружали видео по этому URL, пробуем сразу отправить по file_id
-        if url_no_params in self.url_to_file_id:
-            file_id = self.url_to_file_id[url_no_params]
-            try:
-                await message.reply_video(video=file_id, caption='')
-                print("Видео отправлено из памяти.")
-            except Exception as e:
-                print(f"Не удалось отправить видео из памяти: {str(e)}. Пробуем загрузить заново.")
-                del self.url_to_file_id[url_no_params]
-                await self.send_and_store_video(message, url_no_params)
-        else:
-            # Если в кэше нет, делаем новую загрузку
-            await self.send_and_store_video(message, url_no_params)
\ No newline at end of file
+        log("Не удалось получить ссылку на видео по API. Качаем видео через библиотеку", key=key)
+        return await super().fetch(url_no_params, key)
@@ -0,0 +1,216 @@
+import re
+import asyncio
+import time
+from typing import Dict, Iterable, List, Set, Tuple
+from telegram import Bot
+from telegram.error import BadRequest, TelegramError
+from config.settings import (
+    AUTH_CHAT_ID, CACHE_VALIDATE_INTERVAL, CACHE_VALIDATE_BATCH, CACHE_VALIDATE_AGE
+)
+from core.exceptions import FileSizeError, PermanentDownloadError
+from services.metrics import FILE_IDS_VALIDATED, LINKS
+from services.storage import StorageChat
+from services.tracing import log, new_trace
+from .base import BaseHandler
+from .dispatcher import LinkDispatcher
+
+# Сколько ссылок прогрева обрабатывать одновременно; загрузки дополнительно
+# ограничены очередью чатов, как сообщения одного чата
+PREWARM_CONCURRENCY = 4
+
+
+class CacheWarmer:
+    """
+    Заполнение и проверка кэша file_id без ответа в чат.
+
+    Видео загружаются в служебный чат (inline-режим и прогрев по списку
+    ссылок или журналу обращений), а сохраненные file_id периодически
+    проверяются, чтобы недействительная запись не стоила неудачной
+    отправки и повторной загрузки в момент запроса. Без служебного чата
+    (storage=None) доступна только проверка.
+    """
+
+    def __init__(
+        self,
+        dispatcher: LinkDispatcher,
+        storage: StorageChat | None,
+        owner_chat_id: str = AUTH_CHAT_ID,
+        validate_interval: int = CACHE_VALIDATE_INTERVAL,
+        validate_batch: int = CACHE_VALIDATE_BATCH,
+        validate_age: int = CACHE_VALIDATE_AGE
+    ):
+        self.dispatcher = dispatcher
+        self.cache = dispatcher.cache
+        self.storage = storage
+        # От имени этого чата прогрев проходит через очередь загрузок
+        # (без AUTH_CHAT_ID — от имени условного чата 0)
+        self.owner_chat_id = int(owner_chat_id) if owner_chat_id else 0
+        self.validate_interval = validate_interval
+        self.validate_batch = validate_batch
+        self.validate_age = validate_age
+        # key -> время последней успешной проверки file_id
+        self._validated: Dict[str, float] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    # Загрузка в кэш
+
+    async def prefetch(self, bot: Bot, chat_id: int, backend: BaseHandler, url: str, key: str) -> str | None:
+        """
+        Загружает видео в служебный чат и сохраняет file_id в кэш.
+        Вызывающий уже занял key в таблице выполняющихся загрузок.
+        """
+        dispatcher = self.dispatcher
+        file_id = None
+        try:
+            video = await dispatcher.scheduler.run(chat_id, dispatcher.fetch, backend, url, key)
+            try:
+                video = await dispatcher.fingerprints.dedupe(video, backend.platform)
+                # Воркер или дедупликация уже дали file_id: загружать нечего
+                file_id = video.file_id or await self.storage.upload(
+                    bot, video, backend.platform, dispatcher.scheduler, chat_id
+                )
+                await dispatcher.fingerprints.remember(video, file_id)
+            finally:
+                video.cleanup()
+        except Exception as e:
+            log("Ошибка при фоновой загрузке видео", key=key, error=str(e))
+            LINKS.inc(platform=backend.platform, result='failed')
+            if isinstance(e, (PermanentDownloadError, FileSizeError)):
+                dispatcher.negative.add(key, str(e))
+        else:
+            self.cache.set(key, file_id, url)
+            LINKS.inc(platform=backend.platform, result='prefetched')
+            log("Видео загружено в кэш", key=key)
+        finally:
+            dispatcher.inflight.resolve(key, file_id)
+        return file_id
+
+    def parse(self, lines: Iterable[str]) -> List[Tuple[BaseHandler, str]]:
+        """
+        Ссылки для прогрева: список ссылок по одной в строке или журнал
+        /cache_export (число обращений, ключ и ссылка через табуляцию)
+        """
+        links, seen = [], set()
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            for backend, url in self.dispatcher.extract_links(line):
+                url = re.sub(r'\?.*$', '', url)
+                if url not in seen:
+                    seen.add(url)
+                    links.append((backend, url))
+        return links
+
+    async def _prewarm_one(self, bot: Bot, backend: BaseHandler, url: str, semaphore: asyncio.Semaphore) -> str:
+        async with semaphore:
+            key = await backend.resolve_key(url)
+            if self.cache.peek(key) or self.dispatcher.negative.get(key):
+                return 'skipped'
+            if self.dispatcher.inflight.claim(key) is not None:
+                # Видео уже загружается для чата или inline-запроса
+                return 'skipped'
+            file_id = await self.prefetch(bot, self.owner_chat_id, backend, url, key)
+            return 'loaded' if file_id else 'failed'
+
+    async def prewarm(self, bot: Bot, links: List[Tuple[BaseHandler, str]]) -> Dict[str, int]:
+        """
+        Загружает в кэш видео по ссылкам, которых там еще нет
+        Returns: {'loaded': n, 'skipped': n, 'failed': n}
+        """
+        new_trace()
+        log("Прогрев кэша", links=len(links))
+        semaphore = asyncio.Semaphore(PREWARM_CONCURRENCY)
+        results = await asyncio.gather(
+            *(self._prewarm_one(bot, backend, url, semaphore) for backend, url in links),
+            return_exceptions=True
+        )
+        counts = {'loaded': 0, 'skipped': 0, 'failed': 0}
+        for result in results:
+            counts[result if isinstance(result, str) else 'failed'] += 1
+        log("Прогрев кэша завершен", **counts)
+        return counts
+
+    async def prewarm_file(self, bot: Bot, path: str) -> None:
+        """Прогрев при запуске из файла CACHE_PREWARM_FILE"""
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                lines = file.readlines()
+        except OSError as e:
+            log("Не удалось прочитать файл прогрева кэша", path=path, error=str(e))
+            return
+        await self.prewarm(bot, self.parse(lines))
+
+    def hit_log(self) -> str:
+        """Журнал обращений к кэшу для переноса и прогрева: hits<TAB>key<TAB>url"""
+        lines = ['# hits\tkey\turl']
+        lines += [f'{hits}\t{key}\t{url or ""}' for key, _, hits, url in self.cache.hot()]
+        return '\n'.join(lines) + '\n'
+
+    def spawn(self, coro) -> asyncio.Task:
+        """Фоновая задача, отменяемая при остановке"""
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    # Проверка file_id
+
+    async def validate(self, bot: Bot) -> Dict[str, int]:
+        """
+        Проверяет file_id самых популярных записей, давно не проверявшихся.
+        getFile не отправляет сообщений; недействительные записи удаляются.
+        Returns: {'valid': n, 'invalid': n, 'error': n}
+        """
+        now = time.time()
+        self._validated = {key: at for key, at in self._validated.items() if key in self.cache}
+        candidates = [
+            (key, file_id) for key, file_id, _, _ in self.cache.hot()
+            if now - self._validated.get(key, 0) >= self.validate_age
+        ][:self.validate_batch]
+
+        counts = {'valid': 0, 'invalid': 0, 'error': 0}
+        for key, file_id in candidates:
+            try:
+                await bot.get_file(file_id)
+                result = 'valid'
+            except BadRequest as e:
+                # Файлы больше 20 МБ getFile не отдает, но file_id при этом действителен
+                result = 'valid' if 'too big' in str(e).lower() else 'invalid'
+                if result == 'invalid':
+                    log("file_id недействителен, запись удалена", key=key, error=str(e))
+            except TelegramError as e:
+                log("Не удалось проверить file_id", key=key, error=str(e))
+                result = 'error'
+
+            if result == 'invalid':
+                # Запись могла обновиться, пока шла проверка
+                if self.cache.peek(key) == file_id:
+                    self.cache.delete(key)
+                self.dispatcher.fingerprints.forget(file_id)
+            if result != 'error':
+                self._validated[key] = now
+            counts[result] += 1
+            FILE_IDS_VALIDATED.inc(result=result)
+        if counts['invalid'] or counts['error']:
+            log("Проверка file_id", **counts)
+        return counts
+
+    async def _validate_periodically(self, bot: Bot) -> None:
+        while True:
+            await asyncio.sleep(self.validate_interval)
+            try:
+                await self.validate(bot)
+            except Exception as e:
+                log("Ошибка при проверке file_id", error=str(e))
+
+    def start(self, bot: Bot) -> None:
+        """Запускает периодическую проверку file_id"""
+        if self.validate_interval > 0:
+            self.spawn(self._validate_periodically(bot))
+
+    async def close(self) -> None:
+        tasks = set(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,314 @@
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+from config.settings import BROKER_DB_PATH, BROKER_RETENTION, WORKER_LEASE, WORKER_POLL_INTERVAL
+from services.tracing import log
+
+# Статусы задач загрузки
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Сколько раз задачу можно забрать после падения воркера
+MAX_ATTEMPTS = 3
+# Как часто удалять завершенные задачи, секунды
+PURGE_INTERVAL = 300
+
+
+class BrokerTask:
+    """Задача загрузки, которую выполняет воркер"""
+
+    def __init__(self, task_id: str, key: str, platform: str, url: str, attempts: int = 0):
+        self.task_id = task_id
+        self.key = key
+        self.platform = platform
+        self.url = url
+        self.attempts = attempts
+
+    def __repr__(self) -> str:
+        return f"BrokerTask({self.task_id}, {self.key}, attempts={self.attempts})"
+
+
+class TaskResult:
+    def __init__(self, status: str, file_id: Optional[str], error: Optional[str], permanent: bool = False):
+        self.status = status
+        self.file_id = file_id
+        self.error = error
+        # Повторная попытка не поможет (видео удалено, приватное и т.п.)
+        self.permanent = permanent
+
+
+class SqliteBroker:
+    """
+    Очередь задач загрузки между ботом и воркерами на SQLite.
+
+    Бот ставит задачу по ключу видео (одинаковые ключи объединяются)
+    и ждет результат — file_id загруженного видео. Воркер забирает
+    задачу с арендой на WORKER_LEASE секунд и продлевает ее, пока
+    работает; задачу упавшего воркера по истечении аренды забирает
+    другой. Интерфейс (submit/wait, claim/extend/finish/fail) можно
+    реализовать поверх Redis или другого брокера.
+    """
+
+    def __init__(
+        self,
+        db_path: str = BROKER_DB_PATH,
+        lease: float = WORKER_LEASE,
+        poll_interval: float = WORKER_POLL_INTERVAL,
+        retention: float = BROKER_RETENTION
+    ):
+        self.db_path = db_path
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._db_lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        # task_id -> ожидающие результат
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._poll_task: asyncio.Task | None = None
+        self._purge_task: asyncio.Task | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Блокировки между процессами разрешает сам SQLite
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                " task_id TEXT PRIMARY KEY,"
+                " key TEXT NOT NULL,"
+                " platform TEXT NOT NULL,"
+                " url TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " file_id TEXT,"
+                " error TEXT,"
+                " permanent INTEGER NOT NULL DEFAULT 0,"
+                " worker TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " lease_until REAL,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_key ON tasks (key, status)")
+            self._conn = conn
+        return self._conn
+
+    def _transaction(self, func, *args):
+        with self._db_lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(conn, *args)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, self._transaction, func, *args)
+
+    # Сторона бота
+
+    @staticmethod
+    def _submit(conn: sqlite3.Connection, key: str, platform: str, url: str) -> str:
+        row = conn.execute(
+            "SELECT task_id FROM tasks WHERE key = ? AND status IN (?, ?)",
+            (key, QUEUED, RUNNING)
+        ).fetchone()
+        if row:
+            return row[0]
+        task_id = uuid.uuid4().hex
+        now = time.time()
+        conn.execute(
+            "INSERT INTO tasks (task_id, key, platform, url, status, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (task_id, key, platform, url, QUEUED, now, now)
+        )
+        return task_id
+
+    async def submit(self, key: str, platform: str, url: str) -> str:
+        """Ставит задачу загрузки; для видео, которое уже в очереди, возвращает ее id"""
+        return await self._run(self._submit, key, platform, url)
+
+    async def wait(self, task_id: str, timeout: float) -> TaskResult:
+        """
+        Ждет завершения задачи. Все ожидающие опрашиваются одним
+        запросом раз в poll_interval секунд.
+
+        Raises:
+            asyncio.TimeoutError: если задача не завершилась за timeout
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(task_id, []).append(future)
+        if self._poll_task is None or self._poll_task.done():
+            self._poll_task = asyncio.create_task(self._poll_results())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        finally:
+            waiters = self._waiters.get(task_id)
+            if waiters and future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self._waiters[task_id]
+
+    @staticmethod
+    def _results(conn: sqlite3.Connection, task_ids: List[str]) -> List[tuple]:
+        placeholders = ','.join('?' * len(task_ids))
+        return conn.execute(
+            f"SELECT task_id, status, file_id, error, permanent FROM tasks"
+            f" WHERE task_id IN ({placeholders}) AND status IN (?, ?)",
+            (*task_ids, DONE, FAILED)
+        ).fetchall()
+
+    async def _poll_results(self) -> None:
+        while self._waiters:
+            await asyncio.sleep(self.poll_interval)
+            task_ids = list(self._waiters)
+            if not task_ids:
+                break
+            try:
+                rows = await self._run(self._results, task_ids)
+            except sqlite3.Error as e:
+                log("Ошибка при опросе брокера", error=str(e))
+                continue
+            for task_id, status, file_id, error, permanent in rows:
+                for future in self._waiters.pop(task_id, []):
+                    if not future.done():
+                        future.set_result(TaskResult(status, file_id, error, bool(permanent)))
+
+    # Сторона воркера
+
+    @staticmethod
+    def _claim(conn: sqlite3.Connection, worker: str, platforms: Optional[List[str]], lease: float) -> Optional[BrokerTask]:
+        now = time.time()
+        # Задачи, на которых воркеры падали несколько раз подряд, не повторяем
+        conn.execute(
+            "UPDATE tasks SET status = ?, error = ?, updated_at = ?"
+            " WHERE status = ? AND lease_until < ? AND attempts >= ?",
+            (FAILED, "Воркер не смог обработать задачу", now, RUNNING, now, MAX_ATTEMPTS)
+        )
+        query = (
+            "SELECT task_id, key, platform, url, attempts FROM tasks"
+            " WHERE (status = ? OR (status = ? AND lease_until < ?))"
+        )
+        params: list = [QUEUED, RUNNING, now]
+        if platforms:
+            query += f" AND platform IN ({','.join('?' * len(platforms))})"
+            params += platforms
+        row = conn.execute(query + " ORDER BY created_at LIMIT 1", params).fetchone()
+        if row is None:
+            return None
+        conn.execute(
+            "UPDATE tasks SET status = ?, worker = ?, attempts = attempts + 1,"
+            " lease_until = ?, updated_at = ? WHERE task_id = ?",
+            (RUNNING, worker, now + lease, now, row[0])
+        )
+        task_id, key, platform, url, attempts = row
+        return BrokerTask(task_id, key, platform, url, attempts + 1)
+
+    async def claim(self, worker: str, platforms: Optional[List[str]] = None) -> Optional[BrokerTask]:
+        """Забирает самую старую свободную задачу (или задачу с истекшей арендой)"""
+        return await self._run(self._claim, worker, platforms, self.lease)
+
+    @staticmethod
+    def _extend(conn: sqlite3.Connection, task_id: str, worker: str, lease: float) -> None:
+        conn.execute(
+            "UPDATE tasks SET lease_until = ? WHERE task_id = ? AND worker = ? AND status = ?",
+            (time.time() + lease, task_id, worker, RUNNING)
+        )
+
+    async def extend(self, task_id: str, worker: str) -> None:
+        """Продлевает аренду задачи, пока воркер с ней работает"""
+        await self._run(self._extend, task_id, worker, self.lease)
+
+    @staticmethod
+    def _finish(
+        conn: sqlite3.Connection,
+        task_id: str,
+        status: str,
+        file_id: Optional[str],
+        error: Optional[str],
+        permanent: bool
+    ) -> None:
+        conn.execute(
+            "UPDATE tasks SET status = ?, file_id = ?, error = ?, permanent = ?,"
+            " lease_until = NULL, updated_at = ? WHERE task_id = ? AND status = ?",
+            (status, file_id, error, int(permanent), time.time(), task_id, RUNNING)
+        )
+
+    async def finish(self, task_id: str, file_id: str) -> None:
+        await self._run(self._finish, task_id, DONE, file_id, None, False)
+
+    async def fail(self, task_id: str, error: str, permanent: bool = False) -> None:
+        await self._run(self._finish, task_id, FAILED, None, error, permanent)
+
+    @staticmethod
+    def _release(conn: sqlite3.Connection, task_id: str, worker: str) -> None:
+        conn.execute(
+            "UPDATE tasks SET status = ?, worker = NULL, lease_until = NULL, updated_at = ?"
+            " WHERE task_id = ? AND worker = ? AND status = ?",
+            (QUEUED, time.time(), task_id, worker, RUNNING)
+        )
+
+    async def release(self, task_id: str, worker: str) -> None:
+        """Возвращает задачу в очередь (воркер останавливается, не закончив ее)"""
+        await self._run(self._release, task_id, worker)
+
+    @staticmethod
+    def _purge(conn: sqlite3.Connection, older_than: float) -> None:
+        conn.execute(
+            "DELETE FROM tasks WHERE status IN (?, ?) AND updated_at < ?",
+            (DONE, FAILED, older_than)
+        )
+
+    async def purge(self, max_age: float) -> None:
+        """Удаляет завершенные задачи старше max_age секунд"""
+        await self._run(self._purge, time.time() - max_age)
+
+    async def _purge_periodically(self) -> None:
+        while True:
+            try:
+                await self.purge(self.retention)
+            except sqlite3.Error as e:
+                log("Ошибка при очистке брокера", error=str(e))
+            await asyncio.sleep(PURGE_INTERVAL)
+
+    def start(self) -> None:
+        """
+        Запускает периодическое удаление завершенных задач, иначе таблица
+        растет и выборка задач замедляется. Вызывается на стороне бота.
+        """
+        if self._purge_task is None and self.retention > 0:
+            self._purge_task = asyncio.create_task(self._purge_periodically())
+
+    def counts(self) -> dict:
+        with self._db_lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        return dict(rows)
+
+    async def close(self) -> None:
+        for task in (self._poll_task, self._purge_task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._poll_task = self._purge_task = None
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def worker_name() -> str:
+    """Имя воркера для отладки: хост и pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
@@ -0,0 +1,345 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+from config.settings import (
+    CACHE_DB_PATH, CACHE_MAX_ENTRIES, CACHE_TTL, CACHE_PROTECTED_RATIO,
+    CACHE_FLUSH_INTERVAL, CACHE_FLUSH_BATCH
+)
+from services.metrics import CACHE_ENTRIES, CACHE_EVICTIONS
+from services.tracing import log
+
+# Запись кэша: (file_id, created_at, hits, url)
+Entry = Tuple[str, float, int, Optional[str]]
+# Строка для базы: (file_id, created_at, accessed_at, hits, url) или None для удаления
+Row = Optional[Tuple[str, float, float, int, Optional[str]]]
+
+
+class FileIdCache:
+    """
+    Общий для всех платформ кэш связок ключ видео -> file_id.
+
+    Записи хранятся в памяти и сохраняются в SQLite, поэтому переживают
+    перезапуск бота. Вытеснение — сегментированный LRU: новая запись
+    попадает в испытательный сегмент, а после повторного обращения
+    переходит в защищенный. Разовые ссылки вытесняются из испытательного
+    сегмента первыми и не вымывают популярные видео. Число обращений
+    к записи сохраняется и используется при загрузке и выгрузке журнала.
+    База читается лениво при первом обращении, а изменения копятся и
+    записываются пачками в фоновом потоке.
+    """
+
+    def __init__(
+        self,
+        db_path: str = CACHE_DB_PATH,
+        max_entries: int = CACHE_MAX_ENTRIES,
+        ttl: int = CACHE_TTL,
+        protected_ratio: float = CACHE_PROTECTED_RATIO,
+        flush_interval: float = CACHE_FLUSH_INTERVAL,
+        flush_batch: int = CACHE_FLUSH_BATCH
+    ):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.protected_max = int(max_entries * protected_ratio)
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+
+        # key -> Entry; в начале каждого сегмента самые давно использованные
+        self._probation: OrderedDict[str, Entry] = OrderedDict()
+        self._protected: OrderedDict[str, Entry] = OrderedDict()
+        self._pending: Dict[str, Row] = {}
+        # Обращения с последнего старения счетчиков
+        self._hits_since_aging = 0
+        self._loaded = False
+        self._schema_ready = False
+        self._load_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._flush_lock: asyncio.Lock | None = None
+        self._flush_task: asyncio.Task | None = None
+        # Разовые сбросы при заполнении пачки; ссылки держим, пока они выполняются
+        self._flush_batches: Set[asyncio.Task] = set()
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        if not self._schema_ready:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS file_ids ("
+                " key TEXT PRIMARY KEY,"
+                " file_id TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL,"
+                " hits INTEGER NOT NULL DEFAULT 0,"
+                " url TEXT)"
+            )
+            # Базы предыдущих версий без счетчика обращений и ссылки
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(file_ids)")}
+            if 'hits' not in columns:
+                conn.execute("ALTER TABLE file_ids ADD COLUMN hits INTEGER NOT NULL DEFAULT 0")
+            if 'url' not in columns:
+                conn.execute("ALTER TABLE file_ids ADD COLUMN url TEXT")
+            conn.commit()
+            self._schema_ready = True
+        return conn
+
+    def load(self) -> None:
+        """Загружает актуальные записи из базы (выполняется один раз)"""
+        with self._load_lock:
+            if self._loaded:
+                return
+            expire_before = time.time() - self.ttl
+            try:
+                with self._db_lock:
+                    conn = self._connect()
+                    try:
+                        with conn:
+                            conn.execute("DELETE FROM file_ids WHERE created_at < ?", (expire_before,))
+                        rows = conn.execute(
+                            "SELECT key, file_id, created_at, hits, url FROM file_ids"
+                            " ORDER BY accessed_at DESC LIMIT ?",
+                            (self.max_entries,)
+                        ).fetchall()
+                    finally:
+                        conn.close()
+            except sqlite3.Error as e:
+                log("Ошибка при чтении кэша", path=self.db_path, error=str(e))
+                rows = []
+
+            # Недавно использованные записи с обращениями — в защищенный сегмент
+            protected = set()
+            for key, _, _, hits, _ in rows:
+                if hits and len(protected) < self.protected_max:
+                    protected.add(key)
+            # Самые давно использованные записи должны оказаться в начале
+            for key, file_id, created_at, hits, url in reversed(rows):
+                segment = self._protected if key in protected else self._probation
+                segment[key] = (file_id, created_at, hits, url)
+            self._loaded = True
+            self._report()
+            log("Кэш file_id загружен", entries=len(self), protected=len(self._protected))
+
+    async def load_async(self) -> None:
+        """Загружает кэш в фоновом потоке, не блокируя event loop"""
+        await asyncio.get_running_loop().run_in_executor(None, self.load)
+
+    def _find(self, key: str) -> Optional[Entry]:
+        if not self._loaded:
+            self.load()
+        entry = self._protected.get(key) or self._probation.get(key)
+        if entry is not None and time.time() - entry[1] > self.ttl:
+            self.delete(key)
+            return None
+        return entry
+
+    def peek(self, key: str) -> Optional[str]:
+        """file_id без учета обращения (для служебных проверок)"""
+        entry = self._find(key)
+        return entry[0] if entry else None
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Возвращает file_id по ключу или None, если записи нет или она
+        устарела. Обращение учитывается: запись испытательного сегмента
+        переходит в защищенный.
+        """
+        entry = self._find(key)
+        if entry is None:
+            return None
+
+        file_id, created_at, hits, url = entry
+        entry = (file_id, created_at, hits + 1, url)
+        if key in self._protected:
+            self._protected[key] = entry
+            self._protected.move_to_end(key)
+        else:
+            del self._probation[key]
+            self._protected[key] = entry
+            # Самая давно использованная защищенная запись получает второй шанс
+            while len(self._protected) > self.protected_max:
+                demoted_key, demoted = self._protected.popitem(last=False)
+                self._probation[demoted_key] = demoted
+            self._report()
+
+        self._pending[key] = (file_id, created_at, time.time(), hits + 1, url)
+        self._hits_since_aging += 1
+        if self._hits_since_aging >= self.max_entries * 10:
+            self._age()
+        return file_id
+
+    def _age(self) -> None:
+        """
+        Делит счетчики обращений пополам, чтобы когда-то популярные
+        видео со временем уступали место новым. В базу новые значения
+        попадают при следующем изменении записи.
+        """
+        for segment in (self._probation, self._protected):
+            for key, (file_id, created_at, hits, url) in segment.items():
+                segment[key] = (file_id, created_at, hits // 2, url)
+        self._hits_since_aging = 0
+
+    def set(self, key: str, file_id: str, url: str | None = None) -> None:
+        """
+        Сохраняет связку ключ -> file_id. url — ссылка, по которой видео
+        можно загрузить снова (для прогрева кэша по журналу обращений).
+        """
+        if not self._loaded:
+            self.load()
+
+        now = time.time()
+        segment = self._protected if key in self._protected else self._probation
+        _, _, hits, old_url = segment.get(key, (None, None, 0, None))
+        segment[key] = (file_id, now, hits, url or old_url)
+        segment.move_to_end(key)
+        self._pending[key] = (file_id, now, now, hits, url or old_url)
+
+        # Если кэш слишком большой — вытесняем давно использованные записи,
+        # начиная с испытательного сегмента
+        while len(self) > self.max_entries:
+            victims, name = (self._probation, 'probation') if self._probation else (self._protected, 'protected')
+            evicted_key, _ = victims.popitem(last=False)
+            self._pending[evicted_key] = None
+            CACHE_EVICTIONS.inc(segment=name)
+        self._report()
+
+        # Пока пачка пишется, новые изменения копятся до следующего сброса
+        if len(self._pending) >= self.flush_batch and not self._flush_batches:
+            self._schedule_flush()
+
+    def delete(self, key: str) -> None:
+        """Удаляет запись из кэша"""
+        if self._probation.pop(key, None) is not None or self._protected.pop(key, None) is not None:
+            self._pending[key] = None
+            self._report()
+
+    def hot(self, limit: int | None = None) -> List[Tuple[str, str, int, Optional[str]]]:
+        """
+        Записи по убыванию числа обращений
+        Returns: [(key, file_id, hits, url)]
+        """
+        if not self._loaded:
+            self.load()
+        entries = [
+            (key, file_id, hits, url)
+            for segment in (self._protected, self._probation)
+            for key, (file_id, _, hits, url) in segment.items()
+        ]
+        entries.sort(key=lambda entry: entry[2], reverse=True)
+        return entries[:limit] if limit is not None else entries
+
+    def _report(self) -> None:
+        CACHE_ENTRIES.set(len(self._probation), segment='probation')
+        CACHE_ENTRIES.set(len(self._protected), segment='protected')
+
+    def stats(self) -> dict:
+        return {
+            'entries': len(self),
+            'max_entries': self.max_entries,
+            'protected': len(self._protected),
+        }
+
+    def __contains__(self, key: str) -> bool:
+        return self.peek(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._probation) + len(self._protected)
+
+    def _schedule_flush(self) -> None:
+        try:
+            task = asyncio.get_running_loop().create_task(self.flush())
+        except RuntimeError:
+            # Нет работающего event loop — пишем синхронно
+            batch = self._take_pending()
+            if not self._write_batch(batch):
+                self._restore_pending(batch)
+            return
+        self._flush_batches.add(task)
+        task.add_done_callback(self._flush_batches.discard)
+
+    def _take_pending(self) -> Dict[str, Row]:
+        batch, self._pending = self._pending, {}
+        return batch
+
+    def _restore_pending(self, batch: Dict[str, Row]) -> None:
+        """Возвращает незаписанную пачку; более новые изменения тех же ключей важнее"""
+        batch.update(self._pending)
+        self._pending = batch
+
+    def _write_batch(self, batch: Dict[str, Row]) -> bool:
+        """Returns: False, если записать не удалось"""
+        if not batch:
+            return True
+        upserts = [(key, *row) for key, row in batch.items() if row is not None]
+        deletes = [(key,) for key, row in batch.items() if row is None]
+        try:
+            with self._db_lock:
+                conn = self._connect()
+                try:
+                    with conn:
+                        if deletes:
+                            conn.executemany("DELETE FROM file_ids WHERE key = ?", deletes)
+                        if upserts:
+                            conn.executemany(
+                                "INSERT INTO file_ids (key, file_id, created_at, accessed_at, hits, url)"
+                                " VALUES (?, ?, ?, ?, ?, ?)"
+                                " ON CONFLICT(key) DO UPDATE SET"
+                                " file_id = excluded.file_id,"
+                                " created_at = excluded.created_at,"
+                                " accessed_at = excluded.accessed_at,"
+                                " hits = excluded.hits,"
+                                " url = excluded.url",
+                                upserts
+                            )
+                finally:
+                    conn.close()
+        except (sqlite3.Error, OSError) as e:
+            log("Ошибка при сохранении кэша", path=self.db_path, error=str(e))
+            return False
+        return True
+
+    async def flush(self) -> None:
+        """Записывает накопленные изменения в базу в фоновом потоке"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            batch = self._take_pending()
+            if not batch:
+                return
+            try:
+                written = await asyncio.get_running_loop().run_in_executor(None, self._write_batch, batch)
+            except BaseException:
+                self._restore_pending(batch)
+                raise
+            if not written:
+                self._restore_pending(batch)
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                log("Ошибка при сбросе кэша", error=str(e))
+
+    async def start(self) -> None:
+        """Загружает кэш и запускает периодический сброс изменений"""
+        await self.load_async()
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def close(self) -> None:
+        """Останавливает фоновый сброс и записывает оставшиеся изменения"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await asyncio.gather(*self._flush_batches, return_exceptions=True)
+        await self.flush()
@@ -0,0 +1,66 @@
+import time
+from config.settings import CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT
+from services.tracing import log
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель для ненадежного источника.
+
+    После failure_threshold ошибок подряд выключатель размыкается, и
+    источник reset_timeout секунд не используется. Затем пропускается
+    один пробный запрос: успех замыкает выключатель, ошибка снова
+    размыкает его. Если пробный запрос не завершился ни успехом, ни
+    ошибкой за reset_timeout секунд, пропускается следующий.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_RESET_TIMEOUT
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.probe_started_at = 0.0
+
+    def allow(self) -> bool:
+        """Можно ли сейчас обращаться к источнику"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = HALF_OPEN
+            self._probing = False
+        if self.state == HALF_OPEN:
+            now = time.monotonic()
+            # Пробный запрос только один, но его право истекает
+            if not self._probing or now - self.probe_started_at >= self.reset_timeout:
+                self._probing = True
+                self.probe_started_at = now
+                return True
+        return False
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            log("Источник снова доступен", source=self.name)
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                log("Источник отключен", source=self.name, seconds=round(self.reset_timeout), failures=self.failures)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self._probing = False
@@ -0,0 +1,107 @@
+import asyncio
+import time
+from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+from config.settings import DOWNLOAD_EXECUTOR, DOWNLOAD_WORKERS, DOWNLOAD_PLATFORM_LIMITS
+
+
+class DownloadPool:
+    """
+    Пул для выполнения блокирующих загрузок вне event loop.
+
+    Ограничивает общее число одновременных загрузок и число загрузок
+    для каждой платформы, а также собирает статистику очереди.
+    """
+
+    def __init__(
+        self,
+        executor_type: str = DOWNLOAD_EXECUTOR,
+        max_workers: int = DOWNLOAD_WORKERS,
+        platform_limits: Dict[str, int] = DOWNLOAD_PLATFORM_LIMITS
+    ):
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        self.platform_limits = platform_limits
+        self._executor: Executor = self._create_executor()
+        self._global_semaphore = asyncio.Semaphore(max_workers)
+        self._platform_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        # Статистика очереди
+        self.waiting: Dict[str, int] = defaultdict(int)
+        self.running: Dict[str, int] = defaultdict(int)
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    def _create_executor(self) -> Executor:
+        if self.executor_type == 'process':
+            return ProcessPoolExecutor(max_workers=self.max_workers)
+        if self.executor_type == 'thread':
+            return ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='download'
+            )
+        raise ValueError(f"Неизвестный тип пула загрузок: {self.executor_type}")
+
+    def _get_platform_semaphore(self, platform: str) -> asyncio.Semaphore:
+        if platform not in self._platform_semaphores:
+            limit = self.platform_limits.get(platform, self.max_workers)
+            self._platform_semaphores[platform] = asyncio.Semaphore(limit)
+        return self._platform_semaphores[platform]
+
+    async def run(self, platform: str, func: Callable[..., Any], *args) -> Any:
+        """
+        Выполняет func(*args) в пуле, дождавшись свободного слота
+        для платформы и общего слота пула.
+
+        Для пула процессов func и аргументы должны сериализоваться pickle.
+        """
+        enqueued_at = time.monotonic()
+        self.waiting[platform] += 1
+        started = False
+        try:
+            async with self._get_platform_semaphore(platform), self._global_semaphore:
+                started = True
+                self.waiting[platform] -= 1
+                self._record_wait(time.monotonic() - enqueued_at)
+                self.running[platform] += 1
+                try:
+                    loop = asyncio.get_running_loop()
+                    return await loop.run_in_executor(self._executor, func, *args)
+                finally:
+                    self.running[platform] -= 1
+                    self.completed += 1
+        finally:
+            # Задача, отменённая в очереди, так и не стартовала
+            if not started:
+                self.waiting[platform] -= 1
+
+    def _record_wait(self, wait: float) -> None:
+        self.last_wait = wait
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def queue_depth(self) -> int:
+        """Количество загрузок, ожидающих свободного слота"""
+        return sum(self.waiting.values())
+
+    def stats(self) -> dict:
+        """Возвращает текущую статистику пула"""
+        started = self.completed + sum(self.running.values())
+        return {
+            'executor': self.executor_type,
+            'workers': self.max_workers,
+            'queue_depth': self.queue_depth(),
+            'waiting': {k: v for k, v in self.waiting.items() if v},
+            'running': {k: v for k, v in self.running.items() if v},
+            'completed': self.completed,
+            'avg_wait': self.total_wait / started if started else 0.0,
+            'max_wait': self.max_wait,
+            'last_wait': self.last_wait,
+        }
+
+    def shutdown(self) -> None:
+        """Останавливает пул, не дожидаясь завершения загрузок"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
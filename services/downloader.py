@@ -1,34 +1,371 @@
+import asyncio
+import io
+import os
+import shutil
+import threading
+from http.cookies import CookieError, SimpleCookie
+from typing import BinaryIO
+import aiohttp
 import yt_dlp
-from config.settings import MAX_FILE_SIZE
-from core.exceptions import DownloadError, FileSizeError
+from config.settings import (
+    MAX_FILE_SIZE, SCRATCH_UNKNOWN_SIZE, STREAM_MAX_SIZE, DIRECT_URL_MAX_SIZE, TRANSCODE_MAX_INPUT_SIZE, YTDLP_CACHE_DIR,
+    DOWNLOAD_PROFILES
+)
+from core.exceptions import DownloadError, FileSizeError, PermanentDownloadError
+from services.download_pool import DownloadPool
+from services.file_manager import FileManager
+from services.format_planner import FormatPlan, FormatPlanner
+from services.http_client import HttpClient
+from services.metrics import BYTES, DOWNLOADS_IN_PROGRESS, stage
+from services.tracing import log
+from services.transcoder import Transcoder
+
+# Размер блока при потоковой загрузке в память
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def profile_options(profile: dict) -> dict:
+    """Переводит профиль загрузки из DOWNLOAD_PROFILES в опции yt-dlp"""
+    concurrency = max(1, profile.get('concurrent_fragment_downloads') or 1)
+    opts = {'concurrent_fragment_downloads': concurrency}
+    if profile.get('http_chunk_size'):
+        opts['http_chunk_size'] = profile['http_chunk_size']
+
+    external = profile.get('external_downloader')
+    if external:
+        if shutil.which(external):
+            # Неподдерживаемые загрузчиком протоколы yt-dlp качает сам
+            opts['external_downloader'] = {'default': external}
+            if os.path.basename(external) == 'aria2c':
+                # Несколько соединений на файл и фрагментов одновременно
+                opts['external_downloader_args'] = {
+                    'aria2c': ['-x', str(concurrency), '-s', str(concurrency), '-j', str(concurrency), '-k', '1M']
+                }
+        else:
+            log("Внешний загрузчик не найден, используется встроенный", downloader=external)
+    return opts
+
+
+# Долгоживущие экземпляры YoutubeDL текущего потока (или процесса) пула
+_local = threading.local()
+# Экземпляры всех потоков, чтобы закрыть их при остановке
+_instances = set()
+_instances_lock = threading.Lock()
+
+
+def _get_ydl(platform: str, opts: dict) -> yt_dlp.YoutubeDL:
+    """
+    Возвращает экземпляр YoutubeDL платформы, созданный в этом потоке
+    пула загрузок. Он только извлекает метаданные, поэтому опции у него
+    одни и те же для всех запросов.
+
+    Инициализация экстракторов, загрузка cookies и получение плеера
+    YouTube выполняются один раз на поток, а не на каждый запрос.
+    YoutubeDL не потокобезопасен, поэтому у каждого потока свои экземпляры.
+    """
+    instances = getattr(_local, 'instances', None)
+    if instances is None:
+        instances = _local.instances = {}
+
+    ydl = instances.get(platform)
+    if ydl is None:
+        ydl = yt_dlp.YoutubeDL({**opts, 'cachedir': YTDLP_CACHE_DIR})
+        instances[platform] = ydl
+        with _instances_lock:
+            _instances.add(ydl)
+    return ydl
+
+
+def close_ydl() -> None:
+    """
+    Закрывает долгоживущие экземпляры YoutubeDL: сохраняет cookies
+    и закрывает их HTTP-соединения. В пуле процессов экземпляры
+    живут в дочерних процессах и закрываются вместе с ними.
+    """
+    with _instances_lock:
+        instances = list(_instances)
+        _instances.clear()
+    for ydl in instances:
+        try:
+            ydl.close()
+        except Exception as e:
+            log("Не удалось закрыть YoutubeDL", error=str(e))
+
+
+# Ошибки yt-dlp, после которых повторять загрузку бессмысленно
+PERMANENT_ERROR_MARKERS = (
+    'private video',
+    'this video is private',
+    'account is private',
+    'video unavailable',
+    'this post is unavailable',
+    'has been removed',
+    'has been deleted',
+    'no longer available',
+    'does not exist',
+    'http error 404',
+    'http error 410',
+    'unsupported url',
+    'not available in your country',
+)
+
+
+def _download_error(e: Exception) -> DownloadError:
+    """Переводит ошибку yt-dlp в DownloadError или PermanentDownloadError"""
+    message = str(e)
+    if any(marker in message.lower() for marker in PERMANENT_ERROR_MARKERS):
+        return PermanentDownloadError(f"Видео недоступно: {message}")
+    return DownloadError(f"Ошибка загрузки: {message}")
+
+
+def _drop_ydl(platform: str) -> None:
+    """Пересоздать экземпляр после неожиданной ошибки: его состояние неизвестно"""
+    instances = getattr(_local, 'instances', None)
+    ydl = instances.pop(platform, None) if instances is not None else None
+    if ydl is not None:
+        with _instances_lock:
+            _instances.discard(ydl)
+        ydl.close()
+
+
+def _download_sync(platform: str, url: str, opts: dict, base_opts: dict, info: dict | None = None) -> None:
+    """
+    Блокирующая загрузка через yt-dlp. Выполняется в пуле загрузок,
+    поэтому наружу пробрасываются только сериализуемые исключения.
+
+    Метаданные извлекает долгоживущий экземпляр потока (с опциями
+    base_opts), а скачивает отдельный экземпляр с опциями запроса opts
+    (имя файла, формат, предельный размер). Загрузке по готовому info
+    экстракторы не нужны, поэтому он создается без них (auto_init=False),
+    и это почти ничего не стоит. Если передан info, уже полученный
+    через _extract_info_sync, повторное извлечение не выполняется.
+    """
+    try:
+        if info is None:
+            info = _get_ydl(platform, base_opts).extract_info(url, download=False)
+        with yt_dlp.YoutubeDL({**opts, 'cachedir': YTDLP_CACHE_DIR}, auto_init=False) as ydl:
+            ydl.process_ie_result(info, download=True)
+    except yt_dlp.utils.DownloadError as e:
+        raise _download_error(e)
+    except Exception as e:
+        _drop_ydl(platform)
+        raise DownloadError(f"Неожиданная ошибка: {str(e)}")
+
+
+def _extract_info_sync(platform: str, url: str, opts: dict) -> dict:
+    """Получает метаданные видео и выбранный формат без скачивания"""
+    try:
+        ydl = _get_ydl(platform, opts)
+        info = ydl.extract_info(url, download=False)
+        return ydl.sanitize_info(info)
+    except yt_dlp.utils.DownloadError as e:
+        raise _download_error(e)
+    except Exception as e:
+        _drop_ydl(platform)
+        raise DownloadError(f"Неожиданная ошибка: {str(e)}")
+
 
 class VideoDownloader:
-    def __init__(self):
+    def __init__(
+        self,
+        pool: DownloadPool,
+        http_client: HttpClient,
+        stream_max_size: int = STREAM_MAX_SIZE,
+        file_manager: FileManager | None = None
+    ):
+        self.pool = pool
+        self.http_client = http_client
+        self.stream_max_size = stream_max_size
+        self.planner = FormatPlanner()
+        self.transcoder = Transcoder()
+        # Общий временный каталог с квотой для всех платформ
+        self.file_manager = file_manager or FileManager()
         self.ydl_opts = {
-            'format': 'mp4',
-            'max_filesize': MAX_FILE_SIZE
+            'format': 'mp4/b/bv*+ba',
+            'max_filesize': MAX_FILE_SIZE,
+            'merge_output_format': 'mp4'
         }
+        # Опции загрузки фрагментов для каждой платформы
+        self.platform_opts = {
+            platform: {**self.ydl_opts, **profile_options(profile)}
+            for platform, profile in DOWNLOAD_PROFILES.items()
+        }
+
+    def _options(self, platform: str) -> dict:
+        return dict(self.platform_opts.get(platform) or self.platform_opts['default'])
+
+    async def extract_info(self, url: str, platform: str = 'default') -> dict:
+        """
+        Получает метаданные видео в пуле загрузок
+        Returns: info dict yt-dlp со списком форматов
+        """
+        with stage(platform, 'extract'):
+            return await self.pool.run(platform, _extract_info_sync, platform, url, self._options(platform))
 
-    async def download(self, url: str, output_path: str) -> str:
+    def plan(self, info: dict) -> FormatPlan | None:
         """
-        Загружает видео по URL
+        Выбирает по info формат, который поместится в MAX_FILE_SIZE
+
+        Raises:
+            FileSizeError: если видео нужно перекодировать, а ffmpeg
+            недоступен, — загружать его незачем
+        """
+        plan = self.planner.plan(info, MAX_FILE_SIZE, allow_merge=self.transcoder.available)
+        if plan is not None and plan.transcode and not self.transcoder.available:
+            raise FileSizeError("Видео превышает допустимый размер")
+        return plan
+
+    def scratch_size(self, plan: FormatPlan | None) -> int:
+        """
+        Сколько места на диске зарезервировать под загрузку по плану.
+        Это оценка: после загрузки и перекодирования file_manager.track
+        уточняет резерв по фактическому размеру файлов.
+        """
+        if plan is None or not plan.estimated_size:
+            return min(SCRATCH_UNKNOWN_SIZE, MAX_FILE_SIZE)
+        if plan.transcode:
+            # Исходник и результат перекодирования, который не больше исходника
+            source = min(plan.estimated_size, TRANSCODE_MAX_INPUT_SIZE)
+            return source + min(source, MAX_FILE_SIZE)
+        # При слиянии видео и звука на диске одновременно обе части и результат
+        return plan.estimated_size * (2 if len(plan.formats) > 1 else 1)
+
+    async def download(
+        self,
+        url: str,
+        output_path: str,
+        platform: str = 'default',
+        info: dict | None = None,
+        plan: FormatPlan | None = None
+    ) -> str:
+        """
+        Загружает видео по URL в пуле загрузок, не блокируя event loop.
+        Видео больше MAX_FILE_SIZE перекодируется, а файлы не в mp4
+        перепаковываются, если доступен ffmpeg.
+
+        output_path — имя, выданное file_manager.allocate; при ошибке
+        файлы загрузки удаляются и место освобождается.
+
         Returns: путь к загруженному файлу
         """
-        final_path = f"{output_path}.mp4"
+        opts = {
+            **self._options(platform),
+            'outtmpl': f'{output_path}.%(ext)s'
+        }
+        if plan is not None:
+            opts['format'] = plan.format_spec
+            if plan.transcode:
+                opts['max_filesize'] = TRANSCODE_MAX_INPUT_SIZE
+
         try:
-            opts = {
-                **self.ydl_opts,
-                'format': 'mp4',
-                'max_filesize': MAX_FILE_SIZE,
-                'outtmpl': f'{output_path}.%(ext)s'
-            }
-            
-            with yt_dlp.YoutubeDL(opts) as ydl:
-                ydl.download([url]) 
-            
+            with stage(platform, 'download'), DOWNLOADS_IN_PROGRESS.track(platform=platform):
+                await self.pool.run(platform, _download_sync, platform, url, opts, self._options(platform), info)
+
+            downloaded_file = self.file_manager.get_file_path(output_path)
+            if downloaded_file is None:
+                # yt-dlp молча пропускает файлы больше max_filesize
+                raise FileSizeError("Видео превышает допустимый размер")
+            BYTES.inc(os.path.getsize(downloaded_file), platform=platform, direction='download')
+            self.file_manager.track(output_path)
+
+            oversized = os.path.getsize(downloaded_file) > MAX_FILE_SIZE
+            if not oversized and (downloaded_file.endswith('.mp4') or not self.transcoder.available):
+                return downloaded_file
+
+            final_path = f"{output_path}_final.mp4"
+            try:
+                with stage(platform, 'transcode'):
+                    if oversized:
+                        log("Видео больше допустимого размера, перекодируем", platform=platform)
+                        duration = (info or {}).get('duration')
+                        await self.transcoder.fit_to_size(downloaded_file, final_path, MAX_FILE_SIZE, duration)
+                    else:
+                        await self.transcoder.remux(downloaded_file, final_path)
+            except BaseException:
+                self.file_manager.cleanup_file(final_path)
+                raise
+            self.file_manager.cleanup_file(downloaded_file)
+            self.file_manager.track(output_path)
             return final_path
-            
-        except yt_dlp.utils.DownloadError as e:
-            raise DownloadError(f"Ошибка загрузки: {str(e)}")
-        except Exception as e:
-            raise DownloadError(f"Неожиданная ошибка: {str(e)}")
\ No newline at end of file
+        except BaseException:
+            self.file_manager.release(output_path)
+            raise
+
+    def close(self) -> None:
+        """Закрывает экземпляры YoutubeDL после остановки пула загрузок"""
+        close_ydl()
+
+    def direct_format(self, info: dict, max_size: int = DIRECT_URL_MAX_SIZE) -> dict | None:
+        """
+        Формат, который Telegram может скачать сам по прямой ссылке,
+        или None, если подходящего формата нет
+        """
+        return self.planner.direct_format(info, max_size)
+
+    def is_streamable(self, fmt: dict) -> bool:
+        """
+        Можно ли загрузить формат в память: один файл по http(s)
+        размером не больше stream_max_size (или неизвестного размера)
+        """
+        if not fmt.get('url') or fmt.get('protocol') not in ('http', 'https'):
+            return False
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        return not size or size <= self.stream_max_size
+
+    def _request_headers(self, info: dict, fmt: dict) -> dict:
+        headers = dict(fmt.get('http_headers') or info.get('http_headers') or {})
+        # yt-dlp передает нужные для загрузки cookies отдельным полем
+        if info.get('cookies'):
+            try:
+                cookies = SimpleCookie(info['cookies'])
+                headers['Cookie'] = '; '.join(f'{name}={morsel.value}' for name, morsel in cookies.items())
+            except CookieError:
+                pass
+        return headers
+
+    async def download_to_buffer(
+        self,
+        info: dict,
+        fmt: dict | None = None,
+        platform: str = 'default'
+    ) -> BinaryIO | None:
+        """
+        Загружает небольшое видео в буфер в памяти без записи на диск.
+        Если сервер отдает больше stream_max_size, загрузка прерывается:
+        большое видео скачивается во временный каталог с его квотой.
+
+        fmt — формат из info['formats'], по умолчанию выбранный yt-dlp;
+        platform — метка платформы в метриках.
+
+        Returns: буфер, перемотанный в начало, или None, если видео
+        нельзя загрузить таким способом
+        """
+        fmt = fmt or info
+        if not self.is_streamable(fmt):
+            return None
+
+        buffer = io.BytesIO()
+        total = 0
+        try:
+            with stage(platform, 'download'), DOWNLOADS_IN_PROGRESS.track(platform=platform):
+                async with self.http_client.session.get(fmt['url'], headers=self._request_headers(info, fmt)) as response:
+                    response.raise_for_status()
+                    if response.content_length and response.content_length > self.stream_max_size:
+                        raise FileSizeError("Видео больше порога загрузки в память")
+                    async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                        total += len(chunk)
+                        if total > self.stream_max_size:
+                            raise FileSizeError("Видео больше порога загрузки в память")
+                        buffer.write(chunk)
+        except (aiohttp.ClientError, asyncio.TimeoutError, FileSizeError) as e:
+            log("Не удалось загрузить видео в память", platform=platform, error=str(e))
+            buffer.close()
+            return None
+        except BaseException:
+            buffer.close()
+            raise
+        finally:
+            BYTES.inc(total, platform=platform, direction='download')
+
+        buffer.seek(0)
+        return buffer
@@ -1,22 +1,348 @@
+import asyncio
+import glob
 import os
+import re
+import socket
+import time
 import uuid
+from collections import deque
 from datetime import datetime
-from config.settings import DOWNLOAD_PATH
+from typing import Deque, Dict, Tuple
+from config.settings import (
+    DOWNLOAD_PATH, SCRATCH_QUOTA, SCRATCH_ORPHAN_AGE, SCRATCH_SWEEP_INTERVAL,
+    SCRATCH_TMPFS_PATH, SCRATCH_TMPFS_MAX_SIZE, SCRATCH_TMPFS_QUOTA
+)
+from services.metrics import (
+    ORPHANS_REMOVED, SCRATCH_BYTES, SCRATCH_JOBS, SCRATCH_WAITING, TEMP_BYTES_REMOVED, TEMP_FILES_REMOVED, stage
+)
+from services.tracing import log
+
+# Подкаталоги процессов бота и воркеров: <хост>_<pid>
+PROCESS_DIR = re.compile(r'.+_\d+$')
+
+
+def process_dir_name() -> str:
+    """
+    Подкаталог текущего процесса. Бот и воркеры могут использовать один
+    DOWNLOAD_PATH (в том числе из разных контейнеров), поэтому в имени
+    есть и хост, и pid.
+    """
+    return f"{socket.gethostname()}_{os.getpid()}"
+
+
+class ScratchArea:
+    """
+    Каталог для временных файлов с ограничением занятого места:
+    подкаталог процесса в общем каталоге root
+    """
+
+    def __init__(self, name: str, root: str, quota: int):
+        self.name = name
+        self.root = root
+        self.path = os.path.join(root, process_dir_name())
+        self.quota = quota  # 0 — без ограничения
+        self.used = 0  # Зарезервировано текущими загрузками, байт
+        self.jobs = 0
+        self.waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    def fits(self, size: int) -> bool:
+        # Загрузка больше квоты выполняется, когда каталог пуст
+        return not self.quota or not self.used or self.used + size <= self.quota
+
+
+class ScratchJob:
+    """Временные файлы одной загрузки: все файлы с именем base_name*"""
+
+    def __init__(self, base_name: str, area: ScratchArea, reserved: int):
+        self.base_name = base_name
+        self.area = area
+        self.reserved = reserved
+        self.created_at = time.time()
+
+    def __repr__(self) -> str:
+        return f"ScratchJob({self.base_name}, {self.reserved} байт)"
+
 
 class FileManager:
-    def __init__(self):
-        os.makedirs(DOWNLOAD_PATH, exist_ok=True)
+    """
+    Временный каталог загрузок.
+
+    Каждая загрузка получает имя файла через allocate() и резервирует
+    место под ожидаемый размер; если квота занята, загрузка ждет, пока
+    другие освободят место (release). Небольшие ролики при заданном
+    SCRATCH_TMPFS_PATH пишутся в tmpfs, минуя диск. Файлы, оставшиеся
+    после падения, удаляются при запуске и периодически.
+
+    Квота и очистка действуют в пределах процесса: каждый процесс пишет
+    в свой подкаталог и удаляет подкаталоги других процессов, только
+    когда все их файлы старше orphan_age.
+    """
+
+    def __init__(
+        self,
+        path: str = DOWNLOAD_PATH,
+        quota: int = SCRATCH_QUOTA,
+        tmpfs_path: str = SCRATCH_TMPFS_PATH,
+        tmpfs_max_size: int = SCRATCH_TMPFS_MAX_SIZE,
+        tmpfs_quota: int = SCRATCH_TMPFS_QUOTA,
+        orphan_age: int = SCRATCH_ORPHAN_AGE,
+        sweep_interval: int = SCRATCH_SWEEP_INTERVAL
+    ):
+        self.disk = ScratchArea('disk', path, quota)
+        self.tmpfs = ScratchArea('tmpfs', tmpfs_path, tmpfs_quota) if tmpfs_path else None
+        self.tmpfs_max_size = tmpfs_max_size
+        self.orphan_age = orphan_age
+        self.sweep_interval = sweep_interval
+        self._jobs: Dict[str, ScratchJob] = {}
+        self._sweep_task: asyncio.Task | None = None
+        for area in self._areas():
+            os.makedirs(area.path, exist_ok=True)
 
-    def generate_filename(self, prefix: str) -> str:
+    def _areas(self) -> list:
+        return [area for area in (self.tmpfs, self.disk) if area is not None]
+
+    def generate_filename(self, prefix: str, directory: str | None = None) -> str:
         """Генерирует уникальное имя файла"""
+        directory = directory or self.disk.path
         unique_id = uuid.uuid4().hex[:8]
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        return os.path.join(DOWNLOAD_PATH, f"{prefix}_{timestamp}_{unique_id}")
+        return os.path.join(directory, f"{prefix}_{timestamp}_{unique_id}")
+
+    # Квота
+
+    def _choose_area(self, size: int) -> ScratchArea:
+        tmpfs = self.tmpfs
+        if tmpfs is not None and size <= self.tmpfs_max_size and not tmpfs.waiters and tmpfs.fits(size):
+            return tmpfs
+        return self.disk
+
+    def _wake(self, area: ScratchArea) -> None:
+        """Выдает место ожидающим загрузкам по порядку, пока оно есть"""
+        while area.waiters:
+            size, future = area.waiters[0]
+            if future.done():
+                area.waiters.popleft()
+                continue
+            if not area.fits(size):
+                break
+            area.waiters.popleft()
+            area.used += size
+            future.set_result(None)
+
+    async def _reserve(self, area: ScratchArea, size: int) -> None:
+        if not area.waiters and area.fits(size):
+            area.used += size
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        area.waiters.append((size, future))
+        SCRATCH_WAITING.inc()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Место уже выдано, но загрузку отменили
+                area.used -= size
+                self._wake(area)
+            elif (size, future) in area.waiters:
+                # Запись могла уже убрать _wake, увидев отмененное ожидание
+                area.waiters.remove((size, future))
+            raise
+        finally:
+            SCRATCH_WAITING.dec()
+
+    async def allocate(self, prefix: str, expected_size: int) -> str:
+        """
+        Резервирует место под загрузку и возвращает имя файла без
+        расширения. Ждет, если квота занята другими загрузками.
+        Место освобождается вызовом release с этим именем.
+        """
+        area = self._choose_area(expected_size)
+        with stage(prefix, 'scratch_wait'):
+            await self._reserve(area, expected_size)
+
+        # Очистка другого процесса могла удалить пустой подкаталог
+        os.makedirs(area.path, exist_ok=True)
+        base_name = self.generate_filename(prefix, area.path)
+        self._jobs[base_name] = ScratchJob(base_name, area, expected_size)
+        area.jobs += 1
+        self._report(area)
+        return base_name
+
+    def _files(self, base_name: str) -> list:
+        # Промежуточные файлы yt-dlp (.part, .f137.mp4, .ytdl) и результат перекодирования
+        return glob.glob(glob.escape(base_name) + '*')
+
+    def track(self, base_name: str) -> int:
+        """
+        Сверяет резерв загрузки с фактическим размером ее файлов
+        Returns: занятое место, байт
+        """
+        job = self._jobs.get(base_name)
+        used = 0
+        for path in self._files(base_name):
+            try:
+                used += os.path.getsize(path)
+            except OSError:
+                pass
+        if job is not None and used != job.reserved:
+            job.area.used += used - job.reserved
+            job.reserved = used
+            self._wake(job.area)
+            self._report(job.area)
+        return used
+
+    def release(self, base_name: str) -> None:
+        """Удаляет все файлы загрузки и освобождает ее место"""
+        self.cleanup_files(base_name)
+        job = self._jobs.pop(base_name, None)
+        if job is None:
+            return
+        job.area.used -= job.reserved
+        job.area.jobs -= 1
+        self._wake(job.area)
+        self._report(job.area)
+
+    def _report(self, area: ScratchArea) -> None:
+        SCRATCH_BYTES.set(area.used, area=area.name)
+        SCRATCH_JOBS.set(area.jobs, area=area.name)
+
+    def stats(self) -> dict:
+        return {
+            area.name: {
+                'used': area.used,
+                'quota': area.quota,
+                'jobs': area.jobs,
+                'waiting': len(area.waiters),
+            }
+            for area in self._areas()
+        }
+
+    # Брошенные файлы
+
+    def sweep(self, active: Tuple[str, ...] = ()) -> Tuple[int, int]:
+        """
+        Удаляет файлы старше orphan_age, которые не принадлежат текущим
+        загрузкам (остались после падения или ошибки). Выполняется в
+        потоке, поэтому текущие загрузки active передаются снимком,
+        снятым в event loop.
+        Returns: (количество файлов, байт)
+        """
+        expire_before = time.time() - self.orphan_age
+        removed = removed_bytes = 0
+        for area in self._areas():
+            try:
+                entries = list(os.scandir(area.path))
+                # Файлы в корне остались от версий без подкаталогов процессов
+                entries += [entry for entry in os.scandir(area.root) if entry.is_file()]
+            except OSError as e:
+                log("Не удалось прочитать каталог загрузок", path=area.path, error=str(e))
+                continue
+            for entry in entries:
+                if not entry.is_file() or any(entry.path.startswith(base) for base in active):
+                    continue
+                try:
+                    stat = entry.stat()
+                    if stat.st_mtime >= expire_before:
+                        continue
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                removed += 1
+                removed_bytes += stat.st_size
+
+            # Подкаталоги других процессов, в которых давно ничего не менялось
+            try:
+                others = [
+                    entry for entry in os.scandir(area.root)
+                    if entry.is_dir() and entry.path != area.path and PROCESS_DIR.match(entry.name)
+                ]
+            except OSError:
+                others = []
+            for entry in others:
+                count, size = self._remove_abandoned(entry.path, expire_before)
+                removed += count
+                removed_bytes += size
+        if removed:
+            ORPHANS_REMOVED.inc(removed)
+            TEMP_BYTES_REMOVED.inc(removed_bytes)
+            log("Удалены брошенные файлы загрузок", files=removed, mb=round(removed_bytes / 1024 / 1024, 1))
+        return removed, removed_bytes
+
+    def _remove_abandoned(self, path: str, expire_before: float) -> Tuple[int, int]:
+        """
+        Удаляет подкаталог другого процесса, если и он, и все его файлы
+        старше expire_before: процесс завершился или давно ничего не загружает
+        Returns: (количество файлов, байт)
+        """
+        try:
+            if os.stat(path).st_mtime >= expire_before:
+                return 0, 0
+            entries = list(os.scandir(path))
+            stats = [entry.stat() for entry in entries]
+        except OSError:
+            return 0, 0
+        if any(not entry.is_file() or stat.st_mtime >= expire_before for entry, stat in zip(entries, stats)):
+            return 0, 0
+
+        removed = removed_bytes = 0
+        for entry, stat in zip(entries, stats):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                continue
+            removed += 1
+            removed_bytes += stat.st_size
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass
+        return removed, removed_bytes
+
+    async def sweep_async(self) -> Tuple[int, int]:
+        """Очистка брошенных файлов в фоновом потоке"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.sweep, tuple(self._jobs))
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            await self.sweep_async()
+
+    async def start(self) -> None:
+        """Удаляет файлы, оставшиеся после прошлого запуска, и запускает периодическую очистку"""
+        await self.sweep_async()
+        if self._sweep_task is None and self.sweep_interval > 0:
+            self._sweep_task = asyncio.create_task(self._sweep_periodically())
+
+    async def close(self) -> None:
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            await asyncio.gather(self._sweep_task, return_exceptions=True)
+            self._sweep_task = None
+        # Пустой подкаталог процесса больше не нужен
+        for area in self._areas():
+            try:
+                os.rmdir(area.path)
+            except OSError:
+                pass
+
+    # Отдельные файлы
 
     def cleanup_file(self, filepath: str) -> None:
         """Удаляет файл если он существует"""
         if os.path.exists(filepath):
+            size = os.path.getsize(filepath)
             os.remove(filepath)
+            TEMP_FILES_REMOVED.inc()
+            TEMP_BYTES_REMOVED.inc(size)
+
+    def cleanup_files(self, base_name: str) -> None:
+        """Удаляет все файлы загрузки base_name с любым расширением"""
+        for path in self._files(base_name):
+            try:
+                self.cleanup_file(path)
+            except OSError as e:
+                log("Не удалось удалить файл", path=path, error=str(e))
 
     def get_file_path(self, base_name: str) -> str | None:
         """Ищет файл с разными расширениями"""
@@ -24,4 +350,4 @@ class FileManager:
             path = f"{base_name}.{ext}"
             if os.path.exists(path):
                 return path
-        return None 
\ No newline at end of file
+        return None
@@ -0,0 +1,363 @@
+import asyncio
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+from config.settings import (
+    FFMPEG_PATH, FINGERPRINT_DB_PATH, FINGERPRINT_MAX_ENTRIES, FINGERPRINT_PERCEPTUAL,
+    FINGERPRINT_FRAMES, FINGERPRINT_THRESHOLD, FINGERPRINT_MAX_DURATION
+)
+from services.media import PreparedVideo
+from services.metrics import BYTES, DEDUP_HITS, stage
+from services.tracing import log
+
+HASH_CHUNK = 1024 * 1024
+# Кадр уменьшается до 9x8 в оттенках серого: 8 сравнений соседних пикселей в 8 строках
+FRAME_WIDTH = 9
+FRAME_HEIGHT = 8
+FRAME_BYTES = FRAME_WIDTH * FRAME_HEIGHT
+# Однотонные кадры (затемнения, заставки) одинаковы у разных видео
+MIN_FRAME_BITS = 8
+MAX_FRAME_BITS = 56
+# Сколько содержательных кадров нужно для сравнения по кадрам
+MIN_COMPARED_FRAMES = 3
+
+
+class Fingerprint:
+    """
+    Отпечаток содержимого видео: sha256 байтов и, если включено,
+    dHash нескольких ключевых кадров для поиска перекодированных копий
+    """
+
+    def __init__(self, content_hash: str, size: int, frames: Tuple[int, ...] = (), duration: int | None = None):
+        self.content_hash = content_hash
+        self.size = size
+        self.frames = frames
+        self.duration = duration
+
+    def __repr__(self) -> str:
+        return f"Fingerprint({self.content_hash[:12]}, {len(self.frames)} кадров)"
+
+
+def _informative(frame: int) -> bool:
+    return MIN_FRAME_BITS <= frame.bit_count() <= MAX_FRAME_BITS
+
+
+def frame_distance(a: Tuple[int, ...], b: Tuple[int, ...]) -> float | None:
+    """
+    Среднее число различающихся бит на кадр. Ключевые кадры разных
+    кодировок не совпадают по времени, поэтому кадр сравнивается и с
+    соседними. None, если содержательных кадров слишком мало.
+    """
+    total = compared = 0
+    for i, frame in enumerate(a):
+        if not _informative(frame):
+            continue
+        neighbours = [other for other in b[max(0, i - 1):i + 2] if _informative(other)]
+        if not neighbours:
+            continue
+        total += min((frame ^ other).bit_count() for other in neighbours)
+        compared += 1
+    if compared < MIN_COMPARED_FRAMES:
+        return None
+    return total / compared
+
+
+def _dhash(pixels: bytes) -> int:
+    """Разностный хэш кадра 9x8: бит на каждую пару соседних пикселей строки"""
+    value = 0
+    for row in range(FRAME_HEIGHT):
+        line = pixels[row * FRAME_WIDTH:(row + 1) * FRAME_WIDTH]
+        for col in range(FRAME_WIDTH - 1):
+            value = (value << 1) | (line[col] < line[col + 1])
+    return value
+
+
+class FingerprintIndex:
+    """
+    Индекс отпечаток содержимого -> file_id.
+
+    Кэш file_id привязан к ссылке, а одно и то же видео часто приходит
+    по разным ссылкам: репост в TikTok, Reels, Shorts. Перед отправкой
+    скачанного видео считается его отпечаток; если такое видео уже
+    есть в Telegram, оно отправляется по file_id без передачи байтов.
+    Записи хранятся в памяти и в SQLite.
+    """
+
+    def __init__(
+        self,
+        db_path: str = FINGERPRINT_DB_PATH,
+        max_entries: int = FINGERPRINT_MAX_ENTRIES,
+        perceptual: bool = FINGERPRINT_PERCEPTUAL,
+        frames: int = FINGERPRINT_FRAMES,
+        threshold: int = FINGERPRINT_THRESHOLD,
+        max_duration: int = FINGERPRINT_MAX_DURATION,
+        ffmpeg_path: str = FFMPEG_PATH
+    ):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.frames = frames
+        self.threshold = threshold
+        self.max_duration = max_duration
+        # Без ffmpeg сравниваем только хэш содержимого
+        self.ffmpeg_path = shutil.which(ffmpeg_path) if perceptual else None
+
+        # content_hash -> (file_id, кадры, длительность)
+        self._entries: OrderedDict[str, Tuple[str, Tuple[int, ...], int | None]] = OrderedDict()
+        # Длительность -> хэши видео с кадрами: кандидаты для сравнения по кадрам
+        self._by_duration: Dict[int, Set[str]] = {}
+        self._db_lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._ffmpeg = asyncio.Semaphore(1)
+
+    @property
+    def perceptual(self) -> bool:
+        return self.ffmpeg_path is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # Хранение
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                " content_hash TEXT PRIMARY KEY,"
+                " file_id TEXT NOT NULL,"
+                " frames TEXT NOT NULL,"
+                " duration INTEGER,"
+                " created_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _load(self) -> list:
+        with self._db_lock:
+            conn = self._connect()
+            rows = conn.execute(
+                "SELECT content_hash, file_id, frames, duration FROM fingerprints"
+                " ORDER BY created_at DESC LIMIT ?",
+                (self.max_entries,)
+            ).fetchall()
+            if len(rows) == self.max_entries:
+                with conn:
+                    conn.execute(
+                        "DELETE FROM fingerprints WHERE content_hash NOT IN"
+                        " (SELECT content_hash FROM fingerprints ORDER BY created_at DESC LIMIT ?)",
+                        (self.max_entries,)
+                    )
+        return rows
+
+    async def start(self) -> None:
+        """Загружает сохраненные отпечатки"""
+        try:
+            rows = await self._run(self._load)
+        except sqlite3.Error as e:
+            log("Не удалось загрузить индекс отпечатков", path=self.db_path, error=str(e))
+            return
+        for content_hash, file_id, frames, duration in reversed(rows):
+            self._add(content_hash, file_id, tuple(int(frame, 16) for frame in frames.split(',') if frame), duration)
+        if rows:
+            log("Загружены отпечатки видео", entries=len(rows))
+
+    def _save(self, fingerprint: Fingerprint, file_id: str) -> None:
+        with self._db_lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO fingerprints (content_hash, file_id, frames, duration, created_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (
+                        fingerprint.content_hash, file_id,
+                        ','.join(f'{frame:016x}' for frame in fingerprint.frames),
+                        fingerprint.duration, time.time()
+                    )
+                )
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # Память
+
+    def _add(self, content_hash: str, file_id: str, frames: Tuple[int, ...], duration: int | None) -> None:
+        self._discard(content_hash)
+        self._entries[content_hash] = (file_id, frames, duration)
+        if frames and duration is not None:
+            self._by_duration.setdefault(duration, set()).add(content_hash)
+        while len(self._entries) > self.max_entries:
+            self._discard(next(iter(self._entries)))
+
+    def _discard(self, content_hash: str) -> None:
+        entry = self._entries.pop(content_hash, None)
+        if entry is None or entry[2] is None:
+            return
+        candidates = self._by_duration.get(entry[2])
+        if candidates is not None:
+            candidates.discard(content_hash)
+            if not candidates:
+                del self._by_duration[entry[2]]
+
+    def match(self, fingerprint: Fingerprint) -> Tuple[str, str] | None:
+        """
+        Ищет уже отправленное видео с тем же содержимым
+        Returns: (file_id, 'content' или 'perceptual') или None
+        """
+        entry = self._entries.get(fingerprint.content_hash)
+        if entry is not None:
+            self._entries.move_to_end(fingerprint.content_hash)
+            return entry[0], 'content'
+        if not fingerprint.frames or fingerprint.duration is None:
+            return None
+
+        best = None
+        # Длительность копий на разных платформах отличается на доли секунды
+        for duration in range(fingerprint.duration - 1, fingerprint.duration + 2):
+            for content_hash in self._by_duration.get(duration, ()):
+                file_id, frames, _ = self._entries[content_hash]
+                distance = frame_distance(fingerprint.frames, frames)
+                if distance is not None and distance <= self.threshold and (best is None or distance < best[0]):
+                    best = (distance, file_id)
+        return (best[1], 'perceptual') if best else None
+
+    def forget(self, file_id: str) -> None:
+        """Удаляет из памяти записи с недействительным file_id"""
+        for content_hash in [h for h, entry in self._entries.items() if entry[0] == file_id]:
+            self._discard(content_hash)
+
+    # Отпечатки
+
+    @staticmethod
+    def _hash(media) -> Tuple[str, int]:
+        digest = hashlib.sha256()
+        size = 0
+        if isinstance(media, Path):
+            with open(media, 'rb') as file:
+                for chunk in iter(lambda: file.read(HASH_CHUNK), b''):
+                    digest.update(chunk)
+                    size += len(chunk)
+        else:
+            position = media.tell()
+            media.seek(0)
+            for chunk in iter(lambda: media.read(HASH_CHUNK), b''):
+                digest.update(chunk)
+                size += len(chunk)
+            media.seek(position)
+        return digest.hexdigest(), size
+
+    @staticmethod
+    def _read_buffer(media) -> bytes:
+        position = media.tell()
+        media.seek(0)
+        data = media.read()
+        media.seek(position)
+        return data
+
+    async def _frames(self, media, duration: int) -> Tuple[int, ...]:
+        """
+        dHash ключевых кадров, равномерно распределенных по видео.
+        Декодируются только ключевые кадры, поэтому это дешевле
+        перекодирования. Пустой результат, если ffmpeg не справился
+        (например, mp4 из буфера с индексом в конце файла).
+        """
+        step = duration / self.frames
+        if isinstance(media, Path):
+            # Первый кадр берется из середины первого отрезка, а не с заставки
+            source, data = ['-ss', f'{step / 2:.3f}', '-i', str(media)], None
+        else:
+            # Канал не поддерживает перемотку
+            source, data = ['-i', 'pipe:0'], await self._run(self._read_buffer, media)
+        async with self._ffmpeg:
+            process = await asyncio.create_subprocess_exec(
+                self.ffmpeg_path, '-hide_banner', '-loglevel', 'error',
+                '-skip_frame', 'nokey', *source,
+                '-an', '-vf', f'fps={1 / step:.6f},scale={FRAME_WIDTH}:{FRAME_HEIGHT}:flags=area,format=gray',
+                '-frames:v', str(self.frames), '-f', 'rawvideo', 'pipe:1',
+                stdin=asyncio.subprocess.PIPE if data is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            try:
+                stdout, _ = await process.communicate(data)
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                raise
+        if process.returncode != 0:
+            return ()
+        return tuple(
+            _dhash(stdout[i:i + FRAME_BYTES])
+            for i in range(0, len(stdout) - FRAME_BYTES + 1, FRAME_BYTES)
+        )
+
+    async def fingerprint(self, video: PreparedVideo) -> Fingerprint:
+        """Считает отпечаток файла или буфера видео"""
+        content_hash, size = await self._run(self._hash, video.media)
+        duration = video.media_info.duration
+        frames = ()
+        if self.perceptual and duration and duration <= self.max_duration:
+            frames = await self._frames(video.media, duration)
+        return Fingerprint(content_hash, size, frames, duration if frames else None)
+
+    async def dedupe(self, video: PreparedVideo, platform: str) -> PreparedVideo:
+        """
+        Возвращает видео для отправки: если такое содержимое уже есть в
+        Telegram — его file_id (с отправкой байтов как запасным вариантом),
+        иначе само видео. Отпечаток сохраняется в video.fingerprint.
+        """
+        # Ссылку и file_id Telegram получает без передачи байтов
+        if not isinstance(video.media, Path) and not hasattr(video.media, 'read'):
+            return video
+        try:
+            with stage(platform, 'fingerprint'):
+                fingerprint = await self.fingerprint(video)
+        except OSError as e:
+            log("Не удалось посчитать отпечаток видео", error=str(e))
+            return video
+        video.fingerprint = fingerprint
+
+        match = self.match(fingerprint)
+        if match is None:
+            return video
+        file_id, kind = match
+        log("Такое видео уже есть в Telegram, отправляем по file_id", match=kind, hash=fingerprint.content_hash[:12])
+        DEDUP_HITS.inc(platform=platform, match=kind)
+        BYTES.inc(fingerprint.size, platform=platform, direction='deduplicated')
+
+        async def upload_bytes() -> PreparedVideo:
+            # file_id больше не действует: отправляем само видео
+            self.forget(file_id)
+            return video
+
+        deduplicated = PreparedVideo(file_id, fallback=upload_bytes, cleanup=video.cleanup)
+        deduplicated.fingerprint = fingerprint
+        return deduplicated
+
+    async def remember(self, video: PreparedVideo, file_id: str | None) -> None:
+        """Запоминает file_id отправленного видео, у которого есть отпечаток"""
+        fingerprint: Optional[Fingerprint] = video.fingerprint
+        if fingerprint is None or not file_id:
+            return
+        entry = self._entries.get(fingerprint.content_hash)
+        if entry is not None and entry[0] == file_id:
+            return
+        self._add(fingerprint.content_hash, file_id, fingerprint.frames, fingerprint.duration)
+        try:
+            await self._run(self._save, fingerprint, file_id)
+        except sqlite3.Error as e:
+            log("Не удалось сохранить отпечаток видео", error=str(e))
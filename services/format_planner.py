@@ -0,0 +1,147 @@
+from typing import List, Optional
+
+# Запас на погрешность оценки размера и контейнер
+SIZE_MARGIN = 0.95
+# При перекодировании стараемся не опускаться ниже этого разрешения
+MIN_TRANSCODE_HEIGHT = 360
+
+
+class FormatPlan:
+    """Выбранный для загрузки формат (или пара видео+аудио)"""
+
+    def __init__(self, formats: List[dict], estimated_size: Optional[int], transcode: bool = False):
+        self.formats = formats
+        self.estimated_size = estimated_size
+        # Ни один формат не помещается в лимит — нужно перекодирование
+        self.transcode = transcode
+
+    @property
+    def format_spec(self) -> str:
+        """Строка формата для опции 'format' yt-dlp"""
+        return '+'.join(str(fmt['format_id']) for fmt in self.formats)
+
+    @property
+    def single(self) -> Optional[dict]:
+        """Формат, если видео и звук идут одним файлом"""
+        return self.formats[0] if len(self.formats) == 1 else None
+
+    def __repr__(self) -> str:
+        return f"FormatPlan({self.format_spec}, size={self.estimated_size}, transcode={self.transcode})"
+
+
+class FormatPlanner:
+    """
+    Выбирает формат по списку форматов из info dict yt-dlp: лучший
+    из тех, чей оценочный размер помещается в лимит загрузки
+    """
+
+    def estimate_size(self, fmt: dict, duration: Optional[float]) -> Optional[int]:
+        """Размер формата в байтах: точный, приблизительный или по битрейту"""
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if size:
+            return int(size)
+        if fmt.get('tbr') and duration:
+            return int(fmt['tbr'] * 1000 / 8 * duration)
+        return None
+
+    def _is_compatible(self, fmt: dict) -> bool:
+        """H.264 в mp4 проигрывается во всех клиентах Telegram"""
+        vcodec = fmt.get('vcodec') or ''
+        return vcodec.startswith(('avc1', 'h264')) or (not vcodec and fmt.get('ext') == 'mp4')
+
+    def _rank(self, candidate: FormatPlan) -> tuple:
+        video = candidate.formats[0]
+        return (
+            self._is_compatible(video),
+            video.get('height') or 0,
+            sum(fmt.get('tbr') or 0 for fmt in candidate.formats)
+        )
+
+    def _candidates(self, info: dict, allow_merge: bool) -> List[FormatPlan]:
+        duration = info.get('duration')
+        formats = info.get('formats') or [info]
+
+        progressive, video_only, audio_only = [], [], []
+        for fmt in formats:
+            if not fmt.get('format_id'):
+                continue
+            vcodec, acodec = fmt.get('vcodec'), fmt.get('acodec')
+            if vcodec == 'none' and acodec not in (None, 'none'):
+                audio_only.append(fmt)
+            elif vcodec != 'none' and acodec == 'none':
+                video_only.append(fmt)
+            elif vcodec != 'none':
+                progressive.append(fmt)
+
+        candidates = [
+            FormatPlan([fmt], self.estimate_size(fmt, duration))
+            for fmt in progressive
+        ]
+
+        if allow_merge and video_only and audio_only:
+            # Для склейки берем самую легкую дорожку звука, предпочитая m4a
+            audio = min(
+                audio_only,
+                key=lambda fmt: (fmt.get('ext') != 'm4a', self.estimate_size(fmt, duration) or 0)
+            )
+            audio_size = self.estimate_size(audio, duration)
+            for video in video_only:
+                video_size = self.estimate_size(video, duration)
+                size = video_size + audio_size if video_size and audio_size else None
+                candidates.append(FormatPlan([video, audio], size))
+
+        return candidates
+
+    def plan(self, info: dict, max_size: int, allow_merge: bool = True) -> FormatPlan | None:
+        """
+        Лучший формат с оценочным размером не больше max_size. Если
+        такого нет, возвращает самый легкий формат с пометкой transcode.
+
+        Returns: план загрузки или None, если список форматов пуст
+        """
+        candidates = self._candidates(info, allow_merge)
+        if not candidates:
+            return None
+
+        limit = max_size * SIZE_MARGIN
+        fitting = [c for c in candidates if c.estimated_size and c.estimated_size <= limit]
+        if fitting:
+            return max(fitting, key=self._rank)
+
+        # Размер неизвестен — пробуем, загрузку ограничит max_filesize
+        unknown = [c for c in candidates if not c.estimated_size]
+        if unknown:
+            return max(unknown, key=self._rank)
+
+        # Ничего не помещается: берем самый легкий формат приемлемого качества
+        watchable = [
+            c for c in candidates
+            if (c.formats[0].get('height') or 0) >= MIN_TRANSCODE_HEIGHT
+        ] or candidates
+        smallest = min(watchable, key=lambda c: c.estimated_size)
+        return FormatPlan(smallest.formats, smallest.estimated_size, transcode=True)
+
+    def direct_format(self, info: dict, max_size: int) -> dict | None:
+        """
+        Формат, который Telegram может скачать сам: один файл mp4 со звуком
+        по http(s) известного размера не больше max_size
+        """
+        if max_size <= 0:
+            return None
+
+        candidates = []
+        for fmt in info.get('formats') or [info]:
+            size = fmt.get('filesize') or fmt.get('filesize_approx')
+            if (
+                fmt.get('url')
+                and fmt.get('protocol') in ('http', 'https')
+                and fmt.get('ext') == 'mp4'
+                and fmt.get('vcodec') != 'none'
+                and fmt.get('acodec') != 'none'
+                and size and size <= max_size
+            ):
+                candidates.append(fmt)
+
+        if not candidates:
+            return None
+        return max(candidates, key=lambda fmt: (fmt.get('height') or 0, fmt.get('tbr') or 0))
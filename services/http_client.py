@@ -0,0 +1,71 @@
+import aiohttp
+from config.settings import (
+    HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_CONNECTIONS_PER_HOST, HTTP_KEEPALIVE_TIMEOUT
+)
+
+
+class HttpClient:
+    """
+    Общая асинхронная HTTP-сессия с пулом keep-alive соединений.
+
+    Сессия создаётся лениво внутри работающего event loop и
+    переиспользуется всеми запросами до вызова close().
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT,
+        read_timeout: float = HTTP_READ_TIMEOUT,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_connections_per_host: int = HTTP_MAX_CONNECTIONS_PER_HOST,
+        keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT
+    ):
+        self.timeout = aiohttp.ClientTimeout(
+            connect=connect_timeout,
+            sock_connect=connect_timeout,
+            sock_read=read_timeout
+        )
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self._session: aiohttp.ClientSession | None = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout
+            )
+        return self._session
+
+    async def get_json(self, url: str, **kwargs) -> dict:
+        """
+        Выполняет GET-запрос и возвращает тело ответа как JSON
+
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError, ValueError
+        """
+        async with self.session.get(url, **kwargs) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def resolve_redirect(self, url: str, **kwargs) -> str:
+        """
+        Проходит по цепочке редиректов и возвращает итоговый URL,
+        не читая тело ответа
+        """
+        async with self.session.get(url, allow_redirects=True, **kwargs) as response:
+            return str(response.url)
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -0,0 +1,201 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, List, Set, Tuple
+from config.settings import JOBS_DB_PATH, JOB_MAX_ATTEMPTS, JOB_MAX_AGE
+from services.tracing import log
+
+# Статусы заданий
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class Job:
+    """Принятая ссылка из сообщения, которую нужно доставить в чат"""
+
+    def __init__(
+        self,
+        chat_id: int,
+        message_id: int,
+        chat_type: str,
+        key: str,
+        platform: str,
+        url: str,
+        attempts: int = 0
+    ):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.chat_type = chat_type
+        self.key = key
+        self.platform = platform
+        self.url = url
+        self.attempts = attempts
+
+    def __repr__(self) -> str:
+        return f"Job({self.chat_id}/{self.message_id}, {self.key}, attempts={self.attempts})"
+
+
+class JobStore:
+    """
+    Постоянная очередь заданий на доставку видео.
+
+    Задание создается, когда бот принимает ссылку, и отмечается
+    выполненным сразу после ответа в чат. Незавершенные задания
+    (бот перезапустился или упал) повторяются при следующем запуске.
+    Выполненные задания хранятся JOB_MAX_AGE секунд, чтобы повторно
+    полученное от Telegram обновление не доставило видео второй раз.
+    """
+
+    def __init__(
+        self,
+        db_path: str = JOBS_DB_PATH,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+        max_age: int = JOB_MAX_AGE
+    ):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.max_age = max_age
+        self._db_lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " chat_id INTEGER NOT NULL,"
+                " message_id INTEGER NOT NULL,"
+                " key TEXT NOT NULL,"
+                " chat_type TEXT NOT NULL,"
+                " platform TEXT NOT NULL,"
+                " url TEXT NOT NULL,"
+                " status TEXT NOT NULL,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL,"
+                " PRIMARY KEY (chat_id, message_id, key))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+            self._conn = conn
+        return self._conn
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def _add(self, jobs: List[Job]) -> Set[str]:
+        now = time.time()
+        with self._db_lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO jobs"
+                    " (chat_id, message_id, key, chat_type, platform, url, status, created_at, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (job.chat_id, job.message_id, job.key, job.chat_type,
+                         job.platform, job.url, PENDING, now, now)
+                        for job in jobs
+                    ]
+                )
+            finished = set()
+            for job in jobs:
+                row = conn.execute(
+                    "SELECT status FROM jobs WHERE chat_id = ? AND message_id = ? AND key = ?",
+                    (job.chat_id, job.message_id, job.key)
+                ).fetchone()
+                if row and row[0] != PENDING:
+                    finished.add(job.key)
+            return finished
+
+    async def add(self, jobs: List[Job]) -> Set[str]:
+        """
+        Сохраняет задания, если их еще нет
+        Returns: ключи заданий этого сообщения, которые уже выполнены
+        """
+        if not jobs:
+            return set()
+        try:
+            return await self._run(self._add, jobs)
+        except sqlite3.Error as e:
+            log("Ошибка при сохранении заданий", error=str(e))
+            return set()
+
+    def _complete(self, chat_id: int, message_id: int, keys: List[str], status: str) -> None:
+        with self._db_lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    "UPDATE jobs SET status = ?, updated_at = ?"
+                    " WHERE chat_id = ? AND message_id = ? AND key = ? AND status = ?",
+                    [(status, time.time(), chat_id, message_id, key, PENDING) for key in keys]
+                )
+
+    async def complete(self, chat_id: int, message_id: int, keys: Iterable[str], status: str = DONE) -> None:
+        """Отмечает задания завершенными; повторный вызов ничего не меняет"""
+        keys = list(keys)
+        if not keys:
+            return
+        try:
+            await self._run(self._complete, chat_id, message_id, keys, status)
+        except sqlite3.Error as e:
+            log("Ошибка при завершении заданий", error=str(e))
+
+    def _take_pending(self) -> List[Job]:
+        now = time.time()
+        expire_before = now - self.max_age
+        with self._db_lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM jobs WHERE created_at < ?", (expire_before,))
+                # Задания, на которых бот падал слишком часто, больше не повторяем
+                conn.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND attempts >= ?",
+                    (FAILED, now, PENDING, self.max_attempts)
+                )
+                conn.execute(
+                    "UPDATE jobs SET attempts = attempts + 1, updated_at = ? WHERE status = ?",
+                    (now, PENDING)
+                )
+                rows = conn.execute(
+                    "SELECT chat_id, message_id, chat_type, key, platform, url, attempts"
+                    " FROM jobs WHERE status = ? ORDER BY created_at",
+                    (PENDING,)
+                ).fetchall()
+        return [Job(*row) for row in rows]
+
+    async def take_pending(self) -> List[Job]:
+        """
+        Возвращает незавершенные задания для повтора, увеличивая
+        счетчик попыток; устаревшие задания удаляются
+        """
+        try:
+            return await self._run(self._take_pending)
+        except sqlite3.Error as e:
+            log("Ошибка при чтении заданий", path=self.db_path, error=str(e))
+            return []
+
+    def counts(self) -> dict:
+        with self._db_lock:
+            rows = self._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def group_by_message(jobs: List[Job]) -> List[Tuple[Tuple[int, int, str], List[Job]]]:
+    """Группирует задания по исходному сообщению, сохраняя порядок"""
+    groups = {}
+    for job in jobs:
+        groups.setdefault((job.chat_id, job.message_id, job.chat_type), []).append(job)
+    return list(groups.items())
@@ -0,0 +1,107 @@
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+from telegram import InputFile, InputMediaVideo
+from config.settings import BOT_API_LOCAL_MODE
+from services.media_probe import MediaInfo
+
+
+class PreparedVideo:
+    """
+    Видео, подготовленное к отправке в Telegram.
+
+    media — прямая ссылка, путь к файлу (Path) или буфер с байтами. Если
+    Telegram не примет media, вызывается fallback, который готовит другой
+    вариант (например, скачивает файл вместо передачи ссылки).
+    media_info — размеры, длительность и превью, если они известны.
+    fingerprint — отпечаток содержимого, если видео проверялось на дубликаты.
+    """
+
+    def __init__(
+        self,
+        media,
+        media_info: Optional[MediaInfo] = None,
+        fallback: Optional[Callable[[], Awaitable['PreparedVideo']]] = None,
+        cleanup: Optional[Callable[[], None]] = None
+    ):
+        self.media = media
+        self.media_info = media_info or MediaInfo()
+        self.fallback = fallback
+        self._cleanup = cleanup
+        self.fingerprint = None
+
+    @property
+    def file_id(self) -> Optional[str]:
+        """file_id, если видео уже загружено в Telegram (а не ссылка, файл или буфер)"""
+        if isinstance(self.media, str) and not self.media.startswith(('http://', 'https://')):
+            return self.media
+        return None
+
+    def _input(self):
+        """
+        Файл или буфер читается в InputFile целиком, а дескриптор файла
+        закрывается сразу, не дожидаясь сборщика мусора. Локальный сервер
+        Bot API забирает файл сам по пути file://, без передачи по HTTP.
+        """
+        if isinstance(self.media, Path):
+            if BOT_API_LOCAL_MODE:
+                return self.media.absolute().as_uri()
+            with open(self.media, 'rb') as file:
+                return InputFile(file, filename=self.media.name)
+        if hasattr(self.media, 'read'):
+            # Байты, а не сам буфер: у буфера в памяти нет имени,
+            # и InputFile не может угадать по нему имя файла
+            self.media.seek(0)
+            return InputFile(self.media.read(), filename='video.mp4')
+        return self.media
+
+    def _media_kwargs(self) -> dict:
+        """Известные параметры видео; неизвестные Telegram определит сам"""
+        info = self.media_info
+        kwargs = {'supports_streaming': info.supports_streaming}
+        if info.has_dimensions:
+            kwargs['width'] = info.width
+            kwargs['height'] = info.height
+        if info.duration:
+            kwargs['duration'] = info.duration
+        if info.thumbnail:
+            kwargs['thumbnail'] = InputFile(info.thumbnail, filename='thumbnail.jpg')
+        return kwargs
+
+    def reply_kwargs(self) -> dict:
+        """Аргументы для message.reply_video"""
+        return {
+            'video': self._input(),
+            'caption': '',
+            **self._media_kwargs()
+        }
+
+    def input_media(self) -> InputMediaVideo:
+        """Элемент для message.reply_media_group"""
+        return InputMediaVideo(
+            media=self._input(),
+            caption='',
+            **self._media_kwargs()
+        )
+
+    def upload_size(self) -> int:
+        """
+        Сколько байт передается в Telegram: размер файла или буфера;
+        ссылку и file_id Telegram получает без передачи видео
+        """
+        if isinstance(self.media, Path):
+            try:
+                return self.media.stat().st_size
+            except OSError:
+                return 0
+        if hasattr(self.media, 'seek'):
+            position = self.media.tell()
+            size = self.media.seek(0, 2)
+            self.media.seek(position)
+            return size
+        return 0
+
+    def cleanup(self) -> None:
+        """Освобождает ресурсы (временные файлы, буферы) после отправки"""
+        if self._cleanup is not None:
+            cleanup, self._cleanup = self._cleanup, None
+            cleanup()
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import shutil
+from collections import OrderedDict
+import aiohttp
+from config.settings import FFPROBE_PATH, PROBE_MAX_ENTRIES
+from services.http_client import HttpClient
+from services.tracing import log
+
+# Ограничения Telegram на превью видео: JPEG до 200 KB
+THUMBNAIL_MAX_SIZE = 200 * 1024
+THUMBNAIL_MAX_WIDTH = 320
+
+
+class MediaInfo:
+    """Параметры видео, которые передаются Telegram вместе с файлом"""
+
+    def __init__(
+        self,
+        width: int | None = None,
+        height: int | None = None,
+        duration: int | None = None,
+        thumbnail: bytes | None = None,
+        supports_streaming: bool = False
+    ):
+        self.width = width
+        self.height = height
+        self.duration = duration
+        self.thumbnail = thumbnail
+        self.supports_streaming = supports_streaming
+
+    @property
+    def has_dimensions(self) -> bool:
+        return bool(self.width and self.height)
+
+    def without_thumbnail(self) -> 'MediaInfo':
+        return MediaInfo(self.width, self.height, self.duration, supports_streaming=self.supports_streaming)
+
+    def __repr__(self) -> str:
+        return (
+            f"MediaInfo({self.width}x{self.height}, duration={self.duration}, "
+            f"thumbnail={len(self.thumbnail) if self.thumbnail else None}, "
+            f"streaming={self.supports_streaming})"
+        )
+
+
+class MediaProbe:
+    """
+    Определяет размеры, длительность и превью видео.
+
+    Основной источник — info dict yt-dlp, который уже получен при
+    извлечении метаданных; ffprobe запускается только для скачанных
+    файлов, о которых info ничего не сообщает (или которые были
+    перекодированы). Размеры и длительность кэшируются по ключу видео;
+    превью в кэш не попадает (до 200 KB на запись) и скачивается заново.
+    """
+
+    def __init__(
+        self,
+        http_client: HttpClient,
+        ffprobe_path: str = FFPROBE_PATH,
+        max_entries: int = PROBE_MAX_ENTRIES
+    ):
+        self.http_client = http_client
+        self.ffprobe_path = shutil.which(ffprobe_path)
+        self.max_entries = max_entries
+        self._probed: OrderedDict[str, MediaInfo] = OrderedDict()
+
+    def get(self, key: str | None) -> MediaInfo | None:
+        """Копия записи кэша без превью"""
+        if key is None or key not in self._probed:
+            return None
+        self._probed.move_to_end(key)
+        return self._probed[key].without_thumbnail()
+
+    def set(self, key: str | None, media_info: MediaInfo) -> None:
+        if key is None:
+            return
+        self._probed[key] = media_info.without_thumbnail()
+        self._probed.move_to_end(key)
+        if len(self._probed) > self.max_entries:
+            self._probed.popitem(last=False)
+
+    def from_info(self, info: dict, fmt: dict | None = None) -> MediaInfo:
+        """Параметры из info dict yt-dlp и выбранного формата"""
+        fmt = fmt or info
+        duration = info.get('duration') or fmt.get('duration')
+        return MediaInfo(
+            width=fmt.get('width') or info.get('width'),
+            height=fmt.get('height') or info.get('height'),
+            duration=int(round(duration)) if duration else None,
+            supports_streaming=(fmt.get('ext') or info.get('ext')) == 'mp4'
+        )
+
+    def thumbnail_url(self, info: dict) -> str | None:
+        """Выбирает превью в JPEG шириной не больше 320 точек, если есть"""
+        thumbnails = [
+            thumb for thumb in info.get('thumbnails') or []
+            if thumb.get('url') and '.jpg' in thumb['url']
+        ]
+        small = [thumb for thumb in thumbnails if (thumb.get('width') or 0) <= THUMBNAIL_MAX_WIDTH]
+        if small:
+            return max(small, key=lambda thumb: thumb.get('width') or 0)['url']
+        return info.get('thumbnail')
+
+    async def fetch_thumbnail(self, url: str | None) -> bytes | None:
+        """Скачивает превью, если оно подходит под ограничения Telegram"""
+        if not url:
+            return None
+        try:
+            async with self.http_client.session.get(url) as response:
+                response.raise_for_status()
+                if response.content_type != 'image/jpeg':
+                    return None
+                if response.content_length and response.content_length > THUMBNAIL_MAX_SIZE:
+                    return None
+                data = await response.content.read(THUMBNAIL_MAX_SIZE + 1)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            log("Не удалось загрузить превью", error=str(e))
+            return None
+        return data if len(data) <= THUMBNAIL_MAX_SIZE else None
+
+    async def probe_file(self, path: str) -> MediaInfo | None:
+        """Читает параметры скачанного файла через ffprobe"""
+        if self.ffprobe_path is None:
+            return None
+
+        process = await asyncio.create_subprocess_exec(
+            self.ffprobe_path, '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'stream=width,height:format=duration,format_name',
+            '-of', 'json', path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        try:
+            stdout, _ = await process.communicate()
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        if process.returncode != 0:
+            return None
+
+        try:
+            data = json.loads(stdout)
+            stream = (data.get('streams') or [{}])[0]
+            container = data.get('format') or {}
+            duration = float(container['duration']) if container.get('duration') else None
+        except (ValueError, TypeError):
+            return None
+        return MediaInfo(
+            width=stream.get('width'),
+            height=stream.get('height'),
+            duration=int(round(duration)) if duration else None,
+            supports_streaming='mp4' in (container.get('format_name') or '')
+        )
+
+    async def probe(
+        self,
+        key: str | None,
+        info: dict | None = None,
+        fmt: dict | None = None,
+        path: str | None = None,
+        trust_info: bool = True
+    ) -> MediaInfo:
+        """
+        Возвращает параметры видео: из кэша, из info dict или, если
+        размеры неизвестны, из скачанного файла через ffprobe.
+        trust_info=False — файл отличается от исходного формата
+        (например, перекодирован), и его нужно проверить ffprobe.
+        """
+        media_info = self.get(key) if trust_info else None
+        if media_info is None:
+            media_info = self.from_info(info, fmt) if info else MediaInfo()
+            if path and (not trust_info or not media_info.has_dimensions):
+                media_info = await self.probe_file(path) or media_info
+            if media_info.has_dimensions:
+                self.set(key, media_info)
+        if info:
+            media_info.thumbnail = await self.fetch_thumbnail(self.thumbnail_url(info))
+        return media_info
@@ -0,0 +1,289 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Tuple
+from aiohttp import web
+from config.settings import METRICS_LISTEN, METRICS_PORT
+from services.tracing import log
+
+# Границы корзин гистограмм длительности этапов, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    """
+    Метрика с набором меток. Значения хранятся по кортежу значений
+    меток; обновлять метрику можно из любого потока.
+    """
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple:
+        return tuple(labels.get(name, '') for name in self.labels)
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        pass
+
+    def render(self) -> List[str]:
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.kind}',
+            *self._samples()
+        ]
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик"""
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labels:
+            items = [((), 0)]
+        return [f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}' for key, value in items]
+
+
+class Gauge(Counter):
+    """Текущее значение, которое может уменьшаться (например, задачи в работе)"""
+    kind = 'gauge'
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track(self, **labels) -> Iterator[None]:
+        """Увеличивает значение на время выполнения блока"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Распределение значений по корзинам (накопительно, как в Prometheus)"""
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str, ...] = (),
+        buckets: Tuple[float, ...] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # Значения меток -> (счетчики корзин, сумма, количество)
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, le)} {bucket_count}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.labels, key)} {count}')
+        return lines
+
+
+class Registry:
+    """Набор метрик процесса, отдаваемый в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Tuple[str, ...] = (), **kwargs) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, **kwargs))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Ссылки по платформам и результату: cache_hit, sent, shared, failed, known_failure,
+# inline_hit (inline-запрос из кэша), prefetched (загружено в кэш для inline-запроса или прогрева)
+LINKS = REGISTRY.counter(
+    'videobot_links_total', 'Обработанные ссылки на видео', ('platform', 'result')
+)
+# Этапы: resolve, queue, extract, api, scratch_wait, download, transcode, probe, fingerprint, upload, cache_send
+STAGE_SECONDS = REGISTRY.histogram(
+    'videobot_stage_seconds', 'Длительность этапов обработки ссылки', ('platform', 'stage', 'status')
+)
+# direction: download — получено от источника, upload — отправлено в Telegram,
+# deduplicated — не отправлено, потому что такое видео уже есть в Telegram
+BYTES = REGISTRY.counter(
+    'videobot_bytes_total', 'Переданные байты видео', ('platform', 'direction')
+)
+MESSAGES_IN_PROGRESS = REGISTRY.gauge(
+    'videobot_messages_in_progress', 'Сообщения со ссылками в обработке'
+)
+DOWNLOADS_IN_PROGRESS = REGISTRY.gauge(
+    'videobot_downloads_in_progress', 'Загрузки видео в процессе', ('platform',)
+)
+UPLOADS_IN_PROGRESS = REGISTRY.gauge(
+    'videobot_uploads_in_progress', 'Отправки видео в Telegram в процессе'
+)
+TEMP_FILES_REMOVED = REGISTRY.counter(
+    'videobot_temp_files_removed_total', 'Удаленные временные файлы загрузок'
+)
+TEMP_BYTES_REMOVED = REGISTRY.counter(
+    'videobot_temp_bytes_removed_total', 'Размер удаленных временных файлов загрузок'
+)
+
+SCRATCH_BYTES = REGISTRY.gauge(
+    'videobot_scratch_bytes', 'Место, занятое временными файлами текущих загрузок', ('area',)
+)
+SCRATCH_JOBS = REGISTRY.gauge(
+    'videobot_scratch_jobs', 'Загрузки с временными файлами', ('area',)
+)
+SCRATCH_WAITING = REGISTRY.gauge(
+    'videobot_scratch_waiting', 'Загрузки, ожидающие свободного места'
+)
+ORPHANS_REMOVED = REGISTRY.counter(
+    'videobot_orphan_files_removed_total', 'Удаленные брошенные временные файлы'
+)
+CACHE_ENTRIES = REGISTRY.gauge(
+    'videobot_cache_entries', 'Записи кэша file_id по сегментам', ('segment',)
+)
+CACHE_EVICTIONS = REGISTRY.counter(
+    'videobot_cache_evictions_total', 'Вытесненные записи кэша file_id', ('segment',)
+)
+# result: valid, invalid (запись удалена), error (проверить не удалось)
+FILE_IDS_VALIDATED = REGISTRY.counter(
+    'videobot_file_ids_validated_total', 'Проверенные file_id из кэша', ('result',)
+)
+# match: content — те же байты, perceptual — похожие ключевые кадры
+DEDUP_HITS = REGISTRY.counter(
+    'videobot_dedup_hits_total', 'Видео, отправленные по file_id совпавшего содержимого', ('platform', 'match')
+)
+
+
+@contextmanager
+def stage(platform: str, name: str) -> Iterator[None]:
+    """Замеряет длительность этапа; этап, завершившийся исключением, помечается error"""
+    started = time.perf_counter()
+    status = 'error'
+    try:
+        yield
+        status = 'ok'
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, platform=platform, stage=name, status=status)
+
+
+def platform_of(key: str) -> str:
+    """Платформа из ключа кэша вида "платформа:id видео" """
+    return key.split(':', 1)[0]
+
+
+class MetricsServer:
+    """
+    HTTP-сервер с метриками для Prometheus на /metrics.
+    По умолчанию слушает только локальный интерфейс.
+    """
+
+    def __init__(self, registry: Registry = REGISTRY, listen: str = METRICS_LISTEN, port: int = METRICS_PORT):
+        self.registry = registry
+        self.listen = listen
+        self.port = port
+        self._runner: web.AppRunner | None = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.registry.render().encode(), headers={'Content-Type': CONTENT_TYPE})
+
+    async def start(self) -> None:
+        if not self.port:
+            return
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, self.listen, self.port).start()
+        except OSError as e:
+            # Метрики не должны мешать работе бота
+            log("Не удалось запустить сервер метрик", address=f"{self.listen}:{self.port}", error=str(e))
+            await self.stop()
+            return
+        log("Метрики доступны", url=f"http://{self.listen}:{self.port}/metrics")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
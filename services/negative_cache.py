@@ -0,0 +1,38 @@
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+from config.settings import NEGATIVE_CACHE_TTL, NEGATIVE_CACHE_MAX_ENTRIES
+
+
+class NegativeCache:
+    """
+    Видео, которые недавно не удалось загрузить окончательно
+    (приватные, удаленные, слишком большие). Повторные ссылки на них
+    получают ответ сразу, без новой попытки загрузки.
+    """
+
+    def __init__(self, ttl: float = NEGATIVE_CACHE_TTL, max_entries: int = NEGATIVE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (текст ошибки, когда запись устареет)
+        self._entries: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        """Возвращает текст ошибки, если видео недавно не удалось загрузить"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        error, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        return error
+
+    def add(self, key: str, error: str) -> None:
+        self._entries[key] = (error, time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, TypeVar
+from telegram.error import RetryAfter
+from config.settings import SEND_RATE_PRIVATE, SEND_RATE_GROUP, SEND_BURST
+from services.tracing import log
+
+T = TypeVar('T')
+
+# Сколько чатов держать в памяти
+MAX_TRACKED_CHATS = 10000
+
+
+class TokenBucket:
+    """
+    Ведро токенов: rate токенов в секунду, не больше capacity подряд
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        # Не выдавать токены до этого момента (например, после 429)
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self, tokens: float = 1) -> float:
+        """Сколько секунд ждать, пока накопится tokens токенов"""
+        now = time.monotonic()
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        missing = min(tokens, self.capacity) - self.tokens
+        if missing > 0:
+            wait = max(wait, missing / self.rate)
+        return wait
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        if self.delay(tokens) > 0:
+            return False
+        self.tokens -= min(tokens, self.capacity)
+        return True
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """Ждет и забирает tokens токенов (не больше capacity за раз)"""
+        while True:
+            wait = self.delay(tokens)
+            if wait <= 0:
+                self.tokens -= min(tokens, self.capacity)
+                return
+            await asyncio.sleep(wait)
+
+    def block(self, seconds: float) -> None:
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class ChatThrottle:
+    """
+    Ограничивает частоту исходящих сообщений в каждый чат, чтобы не
+    упираться в лимиты Telegram (около 1 сообщения в секунду в личный
+    чат и 20 в минуту в группу) и не получать ответы 429, которые
+    задерживают всех.
+    """
+
+    def __init__(
+        self,
+        private_rate: float = SEND_RATE_PRIVATE,
+        group_rate: float = SEND_RATE_GROUP,
+        burst: float = SEND_BURST
+    ):
+        self.private_rate = private_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self._buckets: OrderedDict[int, TokenBucket] = OrderedDict()
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            # У групп и каналов отрицательные id
+            rate = self.group_rate if chat_id < 0 else self.private_rate
+            bucket = self._buckets[chat_id] = TokenBucket(rate, self.burst)
+            if len(self._buckets) > MAX_TRACKED_CHATS:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(chat_id)
+        return bucket
+
+    async def send(self, chat_id: int, send: Callable[[], Awaitable[T]], messages: int = 1) -> T:
+        """
+        Выполняет send(), дождавшись очереди чата. Альбом из N видео
+        Telegram считает N сообщениями. При 429 чат блокируется на
+        указанное Telegram время и отправка повторяется один раз.
+        """
+        bucket = self._bucket(chat_id)
+        await bucket.acquire(messages)
+        try:
+            return await send()
+        except RetryAfter as e:
+            retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else e.retry_after
+            log("Telegram просит подождать перед отправкой", chat=chat_id, seconds=retry_after)
+            bucket.block(retry_after)
+            await bucket.acquire(messages)
+            return await send()
@@ -0,0 +1,34 @@
+import asyncio
+from config.settings import WORKER_RESULT_TIMEOUT
+from core.exceptions import DownloadError, PermanentDownloadError
+from services.broker import DONE, SqliteBroker
+from services.media import PreparedVideo
+
+
+class RemoteFetcher:
+    """
+    Получает видео от воркеров через брокер. Воркер загружает видео
+    в служебный чат, а бот отправляет пользователю готовый file_id.
+    """
+
+    def __init__(self, broker: SqliteBroker, timeout: float = WORKER_RESULT_TIMEOUT):
+        self.broker = broker
+        self.timeout = timeout
+
+    async def fetch(self, platform: str, url_no_params: str, key: str) -> PreparedVideo:
+        """
+        Raises:
+            DownloadError: если воркер не смог загрузить видео или не успел
+            PermanentDownloadError: если видео недоступно
+        """
+        task_id = await self.broker.submit(key, platform, url_no_params)
+        try:
+            result = await self.broker.wait(task_id, self.timeout)
+        except asyncio.TimeoutError:
+            raise DownloadError("Превышено время ожидания загрузки")
+
+        if result.permanent:
+            raise PermanentDownloadError(result.error or "Видео недоступно")
+        if result.status != DONE or not result.file_id:
+            raise DownloadError(result.error or "Воркер не смог загрузить видео")
+        return PreparedVideo(result.file_id)
@@ -0,0 +1,37 @@
+import asyncio
+from collections import OrderedDict
+import aiohttp
+from config.settings import RESOLVER_MAX_ENTRIES
+from services.http_client import HttpClient
+from services.tracing import log
+
+
+class LinkResolver:
+    """
+    Разворачивает короткие ссылки (vt.tiktok.com и т.п.) в полные.
+
+    Результаты редиректов кэшируются, поэтому повторная короткая
+    ссылка не требует сетевого запроса.
+    """
+
+    def __init__(self, http_client: HttpClient, max_entries: int = RESOLVER_MAX_ENTRIES):
+        self.http_client = http_client
+        self.max_entries = max_entries
+        self._expanded: OrderedDict[str, str] = OrderedDict()
+
+    async def expand(self, url: str) -> str:
+        """Возвращает конечный URL после редиректов или исходный при ошибке"""
+        if url in self._expanded:
+            self._expanded.move_to_end(url)
+            return self._expanded[url]
+
+        try:
+            expanded = await self.http_client.resolve_redirect(url)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            log("Не удалось развернуть ссылку", url=url, error=str(e))
+            return url
+
+        self._expanded[url] = expanded
+        if len(self._expanded) > self.max_entries:
+            self._expanded.popitem(last=False)
+        return expanded
@@ -0,0 +1,112 @@
+import asyncio
+import heapq
+import itertools
+from collections import OrderedDict, defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from config.settings import SCHEDULER_MAX_ACTIVE, CHAT_JOB_RATE, CHAT_JOB_BURST, CHAT_WEIGHTS
+from services.rate_limit import MAX_TRACKED_CHATS, TokenBucket
+
+
+class FairScheduler:
+    """
+    Справедливая очередь загрузок между чатами.
+
+    Каждый чат получает токены на новые загрузки (ведро токенов), а
+    свободные слоты распределяются взвешенной справедливой очередью:
+    у задачи есть виртуальное время завершения, которое растет с каждой
+    задачей чата на 1/вес. Поэтому группа с десятками ссылок не
+    занимает все слоты — задачи других чатов встают между ее задачами.
+    Попадания в кэш file_id через очередь не проходят.
+    """
+
+    def __init__(
+        self,
+        max_active: int = SCHEDULER_MAX_ACTIVE,
+        chat_rate: float = CHAT_JOB_RATE,
+        chat_burst: float = CHAT_JOB_BURST,
+        weights: Dict[int, float] = CHAT_WEIGHTS
+    ):
+        self.max_active = max_active
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.weights = weights
+        self.active = 0
+        self._queue: List[Tuple[float, int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        # Виртуальное время завершения последней задачи чата
+        self._finish_tags: Dict[int, float] = {}
+        self._buckets: OrderedDict[int, TokenBucket] = OrderedDict()
+        self.waiting: Dict[int, int] = defaultdict(int)
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+            if len(self._buckets) > MAX_TRACKED_CHATS:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(chat_id)
+        return bucket
+
+    def _enqueue(self, chat_id: int) -> asyncio.Future:
+        weight = self.weights.get(chat_id, 1.0)
+        start = max(self._virtual_time, self._finish_tags.get(chat_id, 0.0))
+        finish = start + 1.0 / weight
+        self._finish_tags[chat_id] = finish
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (finish, next(self._sequence), chat_id, future))
+        self.waiting[chat_id] += 1
+        self._dispatch()
+        return future
+
+    def _dispatch(self) -> None:
+        """Отдает свободные слоты задачам с наименьшим временем завершения"""
+        while self.active < self.max_active and self._queue:
+            finish, _, chat_id, future = heapq.heappop(self._queue)
+            self.waiting[chat_id] -= 1
+            if not self.waiting[chat_id]:
+                del self.waiting[chat_id]
+            if future.done():
+                # Задачу отменили, пока она ждала
+                continue
+            self._virtual_time = finish
+            self.active += 1
+            future.set_result(None)
+
+        if not self._queue:
+            # Очередь пуста — старые отметки чатов больше не нужны
+            self._finish_tags.clear()
+
+    def _release(self) -> None:
+        self.active -= 1
+        self._dispatch()
+
+    async def run(self, chat_id: int, func: Callable[..., Awaitable[Any]], *args) -> Any:
+        """Выполняет await func(*args) в очереди чата chat_id"""
+        await self._bucket(chat_id).acquire()
+
+        future = self._enqueue(chat_id)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но задача отменена до старта
+                self._release()
+            raise
+
+        try:
+            return await func(*args)
+        finally:
+            self._release()
+
+    def queue_depth(self) -> int:
+        return sum(self.waiting.values())
+
+    def stats(self) -> dict:
+        return {
+            'active': self.active,
+            'max_active': self.max_active,
+            'queue_depth': self.queue_depth(),
+            'waiting': dict(self.waiting),
+        }
@@ -0,0 +1,40 @@
+import asyncio
+from typing import Any, Dict, Optional
+
+
+class SingleFlight:
+    """
+    Таблица выполняющихся запросов.
+
+    Первый вызов с ключом занимает его (claim) и выполняет работу, а все
+    последующие вызовы с тем же ключом дожидаются её результата (resolve).
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._calls
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def claim(self, key: str) -> Optional[asyncio.Future]:
+        """
+        Занимает ключ за текущим вызовом.
+
+        Returns:
+            None, если работу выполняет текущий вызов (он обязан вызвать
+            resolve), иначе future чужого вызова
+        """
+        future = self._calls.get(key)
+        if future is not None:
+            return future
+        self._calls[key] = asyncio.get_running_loop().create_future()
+        return None
+
+    def resolve(self, key: str, result: Any = None) -> None:
+        """Передает результат ожидающим и освобождает ключ"""
+        future = self._calls.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(result)
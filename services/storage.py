@@ -0,0 +1,68 @@
+from telegram import Bot
+from config.settings import STORAGE_CHAT_ID, STORAGE_SEND_RATE
+from services.media import PreparedVideo
+from services.metrics import BYTES, UPLOADS_IN_PROGRESS, stage
+from services.rate_limit import ChatThrottle
+from services.scheduler import FairScheduler
+from services.tracing import log
+
+
+class StorageChat:
+    """
+    Служебный чат STORAGE_CHAT_ID для получения file_id без ответа
+    пользователю: видео загружается туда, а сообщение сразу удаляется.
+    Используется воркерами и inline-режимом.
+
+    Каждая загрузка — сообщение в чат, поэтому все процессы вместе
+    загружают не больше ~20 видео в минуту в группу (лимит Telegram).
+    Частота ограничивается в каждом процессе отдельно (rate).
+    """
+
+    def __init__(self, chat_id: str = STORAGE_CHAT_ID, rate: float = STORAGE_SEND_RATE):
+        if not chat_id:
+            raise ValueError("Не задан STORAGE_CHAT_ID — служебный чат для загрузки видео")
+        self.chat_id = int(chat_id)
+        # Свой лимит частоты: служебный чат не делит очередь с чатами пользователей
+        self.throttle = ChatThrottle(private_rate=rate, group_rate=rate)
+
+    async def upload(
+        self,
+        bot: Bot,
+        video: PreparedVideo,
+        platform: str,
+        scheduler: FairScheduler | None = None,
+        chat_id: int | None = None
+    ) -> str:
+        """
+        Загружает видео в служебный чат и удаляет сообщение.
+        Запасной вариант (например, скачивание файла) готовится в очереди
+        scheduler от имени chat_id, как загрузки для этого чата; без
+        scheduler (в воркере) — сразу.
+        Returns: file_id видео
+        """
+        size = video.upload_size()
+        try:
+            with stage(platform, 'upload'), UPLOADS_IN_PROGRESS.track():
+                sent = await self.throttle.send(
+                    self.chat_id,
+                    lambda: bot.send_video(chat_id=self.chat_id, **video.reply_kwargs())
+                )
+        except Exception as e:
+            if video.fallback is None:
+                raise
+            log("Telegram не принял видео, пробуем запасной вариант", error=str(e))
+            if scheduler is not None:
+                fallback_video = await scheduler.run(chat_id, video.fallback)
+            else:
+                fallback_video = await video.fallback()
+            try:
+                return await self.upload(bot, fallback_video, platform, scheduler, chat_id)
+            finally:
+                fallback_video.cleanup()
+        BYTES.inc(size, platform=platform, direction='upload')
+
+        try:
+            await bot.delete_message(chat_id=self.chat_id, message_id=sent.message_id)
+        except Exception as e:
+            log("Не удалось удалить сообщение из служебного чата", error=str(e))
+        return sent.video.file_id
@@ -0,0 +1,34 @@
+import json
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from config.settings import LOG_FORMAT
+
+# Идентификатор обработки текущего сообщения. Задачи asyncio
+# наследуют контекст, поэтому он виден во всех этапах доставки
+trace_id: ContextVar[str] = ContextVar('trace_id', default='')
+
+
+def new_trace() -> str:
+    """Назначает текущей задаче новый trace id"""
+    value = uuid.uuid4().hex[:12]
+    trace_id.set(value)
+    return value
+
+
+def log(message: str, /, **fields) -> None:
+    """
+    Печатает сообщение с trace id и дополнительными полями:
+    строкой "[trace] сообщение ключ=значение" или, при LOG_FORMAT=json,
+    JSON-объектом на строку для сборщиков логов.
+    """
+    trace = trace_id.get()
+    if LOG_FORMAT == 'json':
+        record = {'time': datetime.now(timezone.utc).isoformat(), 'trace': trace or None, 'msg': message, **fields}
+        print(json.dumps(record, ensure_ascii=False, default=str), flush=True)
+        return
+
+    text = f"[{trace}] {message}" if trace else message
+    if fields:
+        text += ' ' + ' '.join(f'{name}={value}' for name, value in fields.items())
+    print(text)
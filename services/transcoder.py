@@ -0,0 +1,93 @@
+import asyncio
+import os
+import shutil
+from config.settings import FFMPEG_PATH, TRANSCODE_WORKERS
+from core.exceptions import FileSizeError
+
+# Битрейт звука при перекодировании (бит/с)
+AUDIO_BITRATE = 96_000
+# Ниже этого битрейта видео смотреть невозможно (бит/с)
+MIN_VIDEO_BITRATE = 150_000
+# Запас на контейнер и неточность управления битрейтом
+BITRATE_MARGIN = 0.9
+
+
+class Transcoder:
+    """
+    Перекодирование и перепаковка видео через ffmpeg.
+
+    ffmpeg работает отдельным процессом, поэтому event loop не
+    блокируется; число одновременных процессов ограничено.
+    """
+
+    def __init__(self, ffmpeg_path: str = FFMPEG_PATH, max_workers: int = TRANSCODE_WORKERS):
+        self.ffmpeg_path = shutil.which(ffmpeg_path)
+        self._semaphore = asyncio.Semaphore(max_workers)
+
+    @property
+    def available(self) -> bool:
+        return self.ffmpeg_path is not None
+
+    async def _run(self, args: list) -> None:
+        if not self.available:
+            raise FileSizeError("ffmpeg недоступен")
+
+        async with self._semaphore:
+            process = await asyncio.create_subprocess_exec(
+                self.ffmpeg_path, '-hide_banner', '-loglevel', 'error', '-y', *args,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                _, stderr = await process.communicate()
+            except asyncio.CancelledError:
+                process.kill()
+                await process.wait()
+                raise
+        if process.returncode != 0:
+            raise FileSizeError(f"Ошибка ffmpeg: {stderr.decode(errors='replace').strip()[-300:]}")
+
+    async def remux(self, input_path: str, output_path: str) -> str:
+        """Перепаковывает видео в mp4 без перекодирования"""
+        await self._run([
+            '-i', input_path,
+            '-c', 'copy',
+            '-movflags', '+faststart',
+            output_path
+        ])
+        return output_path
+
+    async def fit_to_size(self, input_path: str, output_path: str, max_size: int, duration: float | None) -> str:
+        """
+        Перекодирует видео в H.264/AAC так, чтобы файл поместился в max_size
+
+        Raises:
+            FileSizeError: если видео слишком длинное для лимита или
+            ffmpeg завершился с ошибкой
+        """
+        if not duration:
+            raise FileSizeError("Неизвестна длительность видео, перекодирование невозможно")
+
+        total_bitrate = max_size * 8 / duration * BITRATE_MARGIN
+        video_bitrate = int(total_bitrate - AUDIO_BITRATE)
+        if video_bitrate < MIN_VIDEO_BITRATE:
+            raise FileSizeError("Видео слишком длинное, чтобы уместить его в допустимый размер")
+
+        await self._run([
+            '-i', input_path,
+            '-c:v', 'libx264',
+            '-preset', 'veryfast',
+            '-b:v', str(video_bitrate),
+            '-maxrate', str(video_bitrate),
+            '-bufsize', str(video_bitrate * 2),
+            '-vf', "scale=-2:'min(720,ih)'",
+            '-c:a', 'aac',
+            '-b:a', str(AUDIO_BITRATE),
+            '-movflags', '+faststart',
+            output_path
+        ])
+
+        if os.path.getsize(output_path) > max_size:
+            os.remove(output_path)
+            raise FileSizeError("Не удалось уместить видео в допустимый размер")
+        return output_path
@@ -0,0 +1,95 @@
+import asyncio
+import hmac
+import json
+import secrets
+from aiohttp import web
+from telegram import Bot, Update
+from config.settings import (
+    WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_MAX_PENDING
+)
+from services.tracing import log
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    """
+    Принимает обновления от Telegram по HTTP и кладет их в очередь
+    обновлений приложения. Сам запрос не ждет обработки обновления,
+    поэтому Telegram получает ответ сразу.
+
+    Если в очереди больше max_pending обновлений, сервер отвечает 503
+    и Telegram повторит доставку позже — так очередь не растет без
+    ограничений под нагрузкой.
+
+    Обновления без секретного токена отклоняются. Если WEBHOOK_SECRET
+    не задан, токен генерируется при запуске и передается Telegram в
+    set_webhook.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        update_queue: asyncio.Queue,
+        listen: str = WEBHOOK_LISTEN,
+        port: int = WEBHOOK_PORT,
+        path: str = WEBHOOK_PATH,
+        secret: str = WEBHOOK_SECRET,
+        max_pending: int = WEBHOOK_MAX_PENDING
+    ):
+        self.bot = bot
+        self.update_queue = update_queue
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret = secret or secrets.token_urlsafe(32)
+        self.max_pending = max_pending
+        self.received = 0
+        self.rejected = 0
+        self._runner: web.AppRunner | None = None
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ''), self.secret
+        ):
+            return web.Response(status=403)
+
+        if self.update_queue.qsize() >= self.max_pending:
+            self.rejected += 1
+            return web.Response(status=503)
+
+        try:
+            data = await request.json(loads=json.loads)
+            update = Update.de_json(data, self.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            log("Некорректное обновление от Telegram", error=str(e))
+            return web.Response(status=400)
+
+        if update is not None:
+            self.received += 1
+            await self.update_queue.put(update)
+        return web.Response()
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+        return app
+
+    @property
+    def bound_port(self) -> int:
+        """Фактический порт (если port=0, его выбирает система)"""
+        if self._runner is None or not self._runner.addresses:
+            return self.port
+        return self._runner.addresses[0][1]
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.create_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.listen, self.port)
+        await site.start()
+        log("Webhook принимает обновления", address=f"{self.listen}:{self.bound_port}{self.path}")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
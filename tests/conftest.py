@@ -0,0 +1,19 @@
+"""
+Настройки читаются при импорте config.settings, поэтому окружение для
+тестов задается до импорта модулей бота
+"""
+import os
+import tempfile
+
+os.environ['DATA_PATH'] = tempfile.mkdtemp(prefix='tests-data-')
+os.environ['DOWNLOAD_PATH'] = tempfile.mkdtemp(prefix='tests-downloads-')
+os.environ['METRICS_PORT'] = '0'
+os.environ['UPDATE_MODE'] = 'polling'
+os.environ['DOWNLOAD_MODE'] = 'local'
+os.environ.pop('BOT_API_LOCAL_MODE', None)
+os.environ.pop('BOT_API_BASE_URL', None)
+os.environ.setdefault('BOT_TOKEN', '123456:tests')
+os.environ.setdefault('AUTH_CHAT_ID', '1')
+os.environ.setdefault('COOKIES', '')
+os.environ.setdefault('USER_AGENT', 'tests')
+os.environ.setdefault('X_IG_APP_ID', '0')
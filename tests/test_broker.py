@@ -0,0 +1,86 @@
+import asyncio
+import time
+from services.broker import DONE, FAILED, MAX_ATTEMPTS, QUEUED, SqliteBroker
+
+
+def make_broker(tmp_path, lease: float = 60) -> SqliteBroker:
+    return SqliteBroker(db_path=str(tmp_path / 'broker.sqlite3'), lease=lease, poll_interval=0.01)
+
+
+def test_same_key_is_submitted_once(tmp_path):
+    async def main():
+        broker = make_broker(tmp_path)
+        first = await broker.submit('tiktok:1', 'tiktok', 'https://t/1')
+        assert await broker.submit('tiktok:1', 'tiktok', 'https://t/1') == first
+        assert await broker.submit('tiktok:2', 'tiktok', 'https://t/2') != first
+        await broker.close()
+
+    asyncio.run(main())
+
+
+def test_finished_task_wakes_waiter(tmp_path):
+    async def main():
+        broker = make_broker(tmp_path)
+        task_id = await broker.submit('tiktok:1', 'tiktok', 'https://t/1')
+        waiter = asyncio.create_task(broker.wait(task_id, timeout=5))
+
+        task = await broker.claim('worker-1')
+        assert task.task_id == task_id and task.attempts == 1
+        assert await broker.claim('worker-2') is None
+        await broker.finish(task_id, 'file-1')
+
+        result = await waiter
+        assert (result.status, result.file_id) == (DONE, 'file-1')
+        await broker.close()
+
+    asyncio.run(main())
+
+
+def test_expired_lease_is_replayed(tmp_path):
+    async def main():
+        broker = make_broker(tmp_path, lease=0)
+        task_id = await broker.submit('tiktok:1', 'tiktok', 'https://t/1')
+        await broker.claim('worker-1')
+        time.sleep(0.01)
+
+        # Воркер упал, не продлив аренду: задачу забирает другой
+        task = await broker.claim('worker-2')
+        assert task.task_id == task_id and task.attempts == 2
+        for _ in range(MAX_ATTEMPTS - 2):
+            time.sleep(0.01)
+            assert await broker.claim('worker-3') is not None
+        # Задача, на которой воркеры падали MAX_ATTEMPTS раз, не повторяется
+        time.sleep(0.01)
+        assert await broker.claim('worker-4') is None
+        assert broker.counts() == {FAILED: 1}
+        await broker.close()
+
+    asyncio.run(main())
+
+
+def test_released_task_is_queued_again(tmp_path):
+    async def main():
+        broker = make_broker(tmp_path)
+        task_id = await broker.submit('tiktok:1', 'tiktok', 'https://t/1')
+        await broker.claim('worker-1')
+        await broker.release(task_id, 'worker-1')
+        assert broker.counts() == {QUEUED: 1}
+        assert (await broker.claim('worker-2')).task_id == task_id
+        await broker.close()
+
+    asyncio.run(main())
+
+
+def test_purge_keeps_unfinished_tasks(tmp_path):
+    async def main():
+        broker = make_broker(tmp_path)
+        done_id = await broker.submit('tiktok:1', 'tiktok', 'https://t/1')
+        await broker.claim('worker-1')
+        await broker.fail(done_id, 'error', permanent=True)
+        await broker.submit('tiktok:2', 'tiktok', 'https://t/2')
+        time.sleep(0.01)
+        await broker.purge(0)
+        assert broker.counts() == {QUEUED: 1}
+        await broker.close()
+
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+import asyncio
+from services.cache import FileIdCache
+
+
+def make_cache(tmp_path, max_entries=4, protected_ratio=0.5) -> FileIdCache:
+    return FileIdCache(
+        db_path=str(tmp_path / 'cache.sqlite3'),
+        max_entries=max_entries,
+        protected_ratio=protected_ratio,
+        flush_batch=1000
+    )
+
+
+def test_second_hit_promotes_to_protected(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set('a', 'file-a')
+    assert 'a' in cache._probation
+
+    assert cache.get('a') == 'file-a'
+    assert 'a' in cache._protected
+    assert 'a' not in cache._probation
+
+
+def test_eviction_starts_with_probation(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set('popular', 'file-popular')
+    cache.get('popular')
+    for key in ('b', 'c', 'd', 'e', 'f'):
+        cache.set(key, f'file-{key}')
+
+    assert len(cache) == 4
+    # Разовые ссылки вытеснены раньше популярной
+    assert cache.peek('popular') == 'file-popular'
+    assert cache.peek('b') is None
+    assert cache.peek('c') is None
+
+
+def test_protected_overflow_demotes_least_recent(tmp_path):
+    cache = make_cache(tmp_path)
+    for key in ('a', 'b', 'c'):
+        cache.set(key, f'file-{key}')
+        cache.get(key)
+
+    # В защищенном сегменте два места: самая давняя запись получает второй шанс
+    assert list(cache._protected) == ['b', 'c']
+    assert list(cache._probation) == ['a']
+
+
+def test_hits_survive_restart(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set('hot', 'file-hot', 'https://example.com/hot')
+    cache.get('hot')
+    cache.set('cold', 'file-cold')
+    asyncio.run(cache.flush())
+
+    restored = make_cache(tmp_path)
+    restored.load()
+    assert 'hot' in restored._protected
+    assert 'cold' in restored._probation
+    assert restored.hot()[0] == ('hot', 'file-hot', 1, 'https://example.com/hot')
+
+
+def test_delete_is_persisted(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set('a', 'file-a')
+    asyncio.run(cache.flush())
+    cache.delete('a')
+    asyncio.run(cache.flush())
+
+    restored = make_cache(tmp_path)
+    assert restored.peek('a') is None
@@ -0,0 +1,126 @@
+import asyncio
+import os
+from services.file_manager import FileManager
+
+
+def make_manager(tmp_path, quota: int = 100) -> FileManager:
+    return FileManager(path=str(tmp_path), quota=quota, tmpfs_path='')
+
+
+def test_waiter_gets_space_after_release(tmp_path):
+    async def main():
+        manager = make_manager(tmp_path)
+        first = await manager.allocate('tiktok', 60)
+        waiting = asyncio.create_task(manager.allocate('tiktok', 60))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        assert len(manager.disk.waiters) == 1
+
+        manager.release(first)
+        second = await waiting
+        assert manager.disk.used == 60
+        manager.release(second)
+        assert manager.disk.used == 0
+
+    asyncio.run(main())
+
+
+def test_waiters_are_served_in_order(tmp_path):
+    async def main():
+        manager = make_manager(tmp_path)
+        first = await manager.allocate('youtube', 90)
+        large = asyncio.create_task(manager.allocate('youtube', 80))
+        await asyncio.sleep(0)
+        # Маленькая загрузка не обгоняет ожидающую большую
+        small = asyncio.create_task(manager.allocate('tiktok', 5))
+        await asyncio.sleep(0)
+        assert not small.done()
+
+        manager.release(first)
+        await asyncio.gather(large, small)
+        assert manager.disk.used == 85
+
+    asyncio.run(main())
+
+
+def test_oversized_download_runs_alone(tmp_path):
+    async def main():
+        manager = make_manager(tmp_path)
+        name = await manager.allocate('youtube', 500)
+        assert manager.disk.used == 500
+        manager.release(name)
+
+    asyncio.run(main())
+
+
+def test_track_corrects_reservation(tmp_path):
+    async def main():
+        manager = make_manager(tmp_path)
+        name = await manager.allocate('youtube', 90)
+        waiting = asyncio.create_task(manager.allocate('tiktok', 50))
+        await asyncio.sleep(0)
+
+        # Файл оказался меньше оценки: освободившееся место выдается ожидающим
+        with open(f'{name}.mp4', 'wb') as file:
+            file.write(b'\0' * 30)
+        assert manager.track(name) == 30
+        await waiting
+        assert manager.disk.used == 80
+
+        manager.release(name)
+        assert not os.path.exists(f'{name}.mp4')
+        assert manager.disk.used == 50
+
+    asyncio.run(main())
+
+
+def test_cancelled_waiter_leaves_queue(tmp_path):
+    async def main():
+        manager = make_manager(tmp_path)
+        first = await manager.allocate('youtube', 90)
+        waiting = asyncio.create_task(manager.allocate('tiktok', 50))
+        await asyncio.sleep(0)
+
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert not manager.disk.waiters
+        manager.release(first)
+        assert manager.disk.used == 0
+
+    asyncio.run(main())
+
+
+def test_cancel_after_grant_returns_space(tmp_path):
+    async def main():
+        manager = make_manager(tmp_path)
+        first = await manager.allocate('youtube', 90)
+        waiting = asyncio.create_task(manager.allocate('tiktok', 50))
+        await asyncio.sleep(0)
+
+        # Место выдано, но загрузку отменили раньше, чем она продолжилась
+        manager.release(first)
+        assert manager.disk.used == 50
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert manager.disk.used == 0
+        assert manager.disk.jobs == 0
+
+    asyncio.run(main())
+
+
+def test_wake_skips_cancelled_waiters(tmp_path):
+    async def main():
+        manager = make_manager(tmp_path)
+        first = await manager.allocate('youtube', 90)
+        cancelled = asyncio.create_task(manager.allocate('youtube', 80))
+        waiting = asyncio.create_task(manager.allocate('tiktok', 20))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        manager.release(first)
+        await asyncio.gather(cancelled, return_exceptions=True)
+        await waiting
+        assert manager.disk.used == 20
+        assert not manager.disk.waiters
+
+    asyncio.run(main())
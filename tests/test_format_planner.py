@@ -0,0 +1,62 @@
+from services.format_planner import FormatPlanner
+
+MB = 1024 * 1024
+
+
+def fmt(format_id, height, size=None, vcodec='avc1.64001F', acodec='mp4a.40.2', **fields):
+    return {
+        'format_id': format_id, 'height': height, 'filesize': size,
+        'vcodec': vcodec, 'acodec': acodec, 'ext': 'mp4', **fields
+    }
+
+
+def test_best_format_that_fits():
+    info = {'formats': [fmt('360', 360, 5 * MB), fmt('720', 720, 30 * MB), fmt('1080', 1080, 80 * MB)]}
+    plan = FormatPlanner().plan(info, 50 * MB)
+    assert plan.format_spec == '720'
+    assert plan.estimated_size == 30 * MB
+    assert not plan.transcode
+
+
+def test_size_margin_applies():
+    info = {'formats': [fmt('360', 360, 5 * MB), fmt('720', 720, 49 * MB)]}
+    # 49 MB не проходит с запасом 5% от лимита 50 MB
+    assert FormatPlanner().plan(info, 50 * MB).format_spec == '360'
+
+
+def test_compatible_codec_preferred():
+    info = {'formats': [fmt('vp9', 1080, 20 * MB, vcodec='vp9'), fmt('h264', 720, 20 * MB)]}
+    assert FormatPlanner().plan(info, 50 * MB).format_spec == 'h264'
+
+
+def test_size_estimated_from_bitrate():
+    info = {'duration': 100, 'formats': [fmt('720', 720, tbr=2000)]}
+    plan = FormatPlanner().plan(info, 50 * MB)
+    assert plan.estimated_size == 2000 * 1000 // 8 * 100
+
+
+def test_merge_video_and_audio():
+    info = {'formats': [
+        fmt('360', 360, 5 * MB),
+        fmt('v720', 720, 20 * MB, acodec='none'),
+        fmt('a', None, 2 * MB, vcodec='none', ext='m4a'),
+    ]}
+    planner = FormatPlanner()
+    assert planner.plan(info, 50 * MB).format_spec == 'v720+a'
+    assert planner.plan(info, 50 * MB, allow_merge=False).format_spec == '360'
+
+
+def test_nothing_fits_needs_transcode():
+    info = {'formats': [fmt('240', 240, 60 * MB), fmt('720', 720, 120 * MB), fmt('1080', 1080, 300 * MB)]}
+    plan = FormatPlanner().plan(info, 50 * MB)
+    # Самый легкий формат не ниже 360p
+    assert plan.transcode
+    assert plan.format_spec == '720'
+
+
+def test_unknown_size_is_tried():
+    info = {'formats': [fmt('720', 720), fmt('1080', 1080, 300 * MB)]}
+    plan = FormatPlanner().plan(info, 50 * MB)
+    assert plan.format_spec == '720'
+    assert plan.estimated_size is None
+    assert not plan.transcode
@@ -0,0 +1,64 @@
+import asyncio
+from services.job_store import DONE, FAILED, Job, JobStore, group_by_message
+
+
+def make_job(message_id: int, key: str) -> Job:
+    return Job(-100, message_id, 'supergroup', key, 'tiktok', f'https://www.tiktok.com/@u/video/{key}')
+
+
+def test_pending_jobs_are_replayed(tmp_path):
+    async def main():
+        store = JobStore(db_path=str(tmp_path / 'jobs.sqlite3'), max_attempts=3)
+        await store.add([make_job(1, 'a'), make_job(1, 'b'), make_job(2, 'c')])
+        await store.complete(-100, 1, ['a'])
+
+        # Перезапуск: невыполненные задания повторяются по порядку
+        jobs = await store.take_pending()
+        assert [job.key for job in jobs] == ['b', 'c']
+        assert all(job.attempts == 1 for job in jobs)
+        assert [(message, [job.key for job in group]) for message, group in group_by_message(jobs)] == [
+            ((-100, 1, 'supergroup'), ['b']),
+            ((-100, 2, 'supergroup'), ['c']),
+        ]
+        store.close()
+
+    asyncio.run(main())
+
+
+def test_redelivered_update_sees_finished_jobs(tmp_path):
+    async def main():
+        store = JobStore(db_path=str(tmp_path / 'jobs.sqlite3'))
+        assert await store.add([make_job(1, 'a'), make_job(1, 'b')]) == set()
+        await store.complete(-100, 1, ['a'])
+        assert await store.add([make_job(1, 'a'), make_job(1, 'b')]) == {'a'}
+        store.close()
+
+    asyncio.run(main())
+
+
+def test_job_fails_after_max_attempts(tmp_path):
+    async def main():
+        store = JobStore(db_path=str(tmp_path / 'jobs.sqlite3'), max_attempts=2)
+        await store.add([make_job(1, 'a')])
+        assert len(await store.take_pending()) == 1
+        assert len(await store.take_pending()) == 1
+        # Бот дважды падал на этом задании
+        assert await store.take_pending() == []
+        assert store.counts() == {FAILED: 1}
+        await store.complete(-100, 1, ['a'])
+        assert store.counts() == {FAILED: 1}
+        store.close()
+
+    asyncio.run(main())
+
+
+def test_complete_is_idempotent(tmp_path):
+    async def main():
+        store = JobStore(db_path=str(tmp_path / 'jobs.sqlite3'))
+        await store.add([make_job(1, 'a')])
+        await store.complete(-100, 1, ['a'])
+        await store.complete(-100, 1, ['a'], FAILED)
+        assert store.counts() == {DONE: 1}
+        store.close()
+
+    asyncio.run(main())
@@ -0,0 +1,36 @@
+import asyncio
+from pathlib import Path
+import pytest
+from telegram import Bot
+import core.bot
+import services.media
+from benchmarks.stub_bot_api import StubBotApi
+from services.media import PreparedVideo
+
+
+def test_local_mode_requires_base_url(monkeypatch):
+    monkeypatch.setattr(core.bot, 'BOT_API_LOCAL_MODE', True)
+    with pytest.raises(ValueError, match='BOT_API_BASE_URL'):
+        core.bot.VideoDownloaderBot(base_url=None)
+
+
+def test_local_mode_sends_file_uri(tmp_path, monkeypatch):
+    monkeypatch.setattr(services.media, 'BOT_API_LOCAL_MODE', True)
+    path = tmp_path / 'video.mp4'
+    path.write_bytes(b'\0' * 4096)
+
+    async def send():
+        stub = StubBotApi()
+        await stub.start()
+        try:
+            bot = Bot('123456:tests', base_url=stub.base_url, local_mode=True)
+            async with bot:
+                await bot.send_video(chat_id=1, **PreparedVideo(Path(path)).reply_kwargs())
+        finally:
+            await stub.stop()
+        return stub
+
+    stub = asyncio.run(send())
+    # Сервер прочитал файл по пути, а байты по HTTP не передавались
+    assert stub.bytes_local == 4096
+    assert stub.bytes_uploaded == 0
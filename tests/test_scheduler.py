@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+import services.rate_limit
+from services.rate_limit import ChatThrottle, TokenBucket
+from services.scheduler import FairScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(services.rate_limit, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def test_token_bucket_refills_at_rate(clock):
+    bucket = TokenBucket(rate=10, capacity=2)
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+    assert bucket.delay() == pytest.approx(0.1)
+
+    clock.now += 0.1
+    assert bucket.try_acquire()
+    # Больше capacity не накапливается
+    clock.now += 60
+    bucket.delay()
+    assert bucket.tokens == 2
+
+
+def test_token_bucket_block(clock):
+    bucket = TokenBucket(rate=10, capacity=2)
+    bucket.block(5)
+    assert not bucket.try_acquire()
+    assert bucket.delay() == pytest.approx(5)
+    clock.now += 5
+    assert bucket.try_acquire()
+
+
+def test_throttle_rates_by_chat_type():
+    throttle = ChatThrottle(private_rate=1, group_rate=0.3, burst=1)
+    assert throttle._bucket(42).rate == 1
+    assert throttle._bucket(-100123).rate == 0.3
+
+
+def run_jobs(scheduler: FairScheduler, chats: list) -> list:
+    """Запускает по задаче на каждый чат из списка и возвращает порядок их выполнения"""
+    order = []
+
+    async def job(chat_id):
+        order.append(chat_id)
+        await asyncio.sleep(0)
+
+    async def main():
+        await asyncio.gather(*(scheduler.run(chat_id, job, chat_id) for chat_id in chats))
+
+    asyncio.run(main())
+    return order
+
+
+def test_busy_chat_does_not_starve_others():
+    scheduler = FairScheduler(max_active=1, chat_rate=1000, chat_burst=100, weights={})
+    order = run_jobs(scheduler, [1, 1, 1, 1, 2, 3])
+    # Задачи чатов 2 и 3 встают между задачами чата 1
+    assert order.index(2) < 3
+    assert order.index(3) < 4
+    assert order[-1] == 1
+
+
+def test_weight_moves_chat_ahead():
+    scheduler = FairScheduler(max_active=1, chat_rate=1000, chat_burst=100, weights={2: 4.0})
+    assert run_jobs(scheduler, [1, 1, 1, 2]) == [1, 2, 1, 1]
+
+
+def test_cancelled_waiter_does_not_take_slot():
+    scheduler = FairScheduler(max_active=1, chat_rate=1000, chat_burst=100, weights={})
+
+    async def main():
+        release = asyncio.Event()
+        first = asyncio.create_task(scheduler.run(1, release.wait))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(scheduler.run(2, asyncio.sleep, 0))
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth() == 1
+
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        release.set()
+        await first
+        assert scheduler.active == 0
+        assert await scheduler.run(3, asyncio.sleep, 0, 'done') == 'done'
+
+    asyncio.run(main())
@@ -0,0 +1,8 @@
+from core.worker import DownloadWorker
+
+def main():
+    worker = DownloadWorker()
+    worker.run()
+
+if __name__ == "__main__":
+    main()